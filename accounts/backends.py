@@ -1,16 +1,34 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
 
 User = get_user_model()
 
+USER_CACHE_TIMEOUT = getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def user_cache_key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
 
 class EmailBackend(ModelBackend):
     """Custom authentication backend that allows login with email"""
     
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(email=username)
-        except User.DoesNotExist:
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if not username or password is None:
+            return None
+
+        user = User.objects.get_by_email(username)
+        if user is None:
+            # Run the hasher anyway so response time does not reveal whether the email exists
+            User().set_password(password)
             return None
         
         if user.check_password(password) and self.user_can_authenticate(user):
@@ -18,7 +36,16 @@ class EmailBackend(ModelBackend):
         return None
     
     def get_user(self, user_id):
-        try:
-            return User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return None
+        """Load the session user from cache, falling back to a primary key lookup"""
+        if not getattr(settings, 'SHARED_CACHE', False):
+            # Saves in another worker could not invalidate a per-process copy
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = User.objects.get(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
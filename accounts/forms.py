@@ -37,7 +37,7 @@ class CustomUserCreationForm(UserCreationForm):
         fields = ('email', 'first_name', 'last_name', 'phone_number', 'user_type', 'password1', 'password2')
 
     def clean_email(self):
-        email = self.cleaned_data.get('email')
+        email = CustomUser.objects.normalize_email(self.cleaned_data.get('email'))
         if CustomUser.objects.filter(email=email).exists():
             raise forms.ValidationError('Email already exists')
         return email
@@ -110,7 +110,7 @@ class SellerProfileForm(forms.ModelForm):
 class CustomUserProfileForm(forms.ModelForm):
     class Meta:
         model = CustomUser
-        fields = ('email', 'first_name', 'last_name', 'phone_number', 'profile_image')
+        fields = ('email', 'first_name', 'last_name', 'phone_number', 'profile_image', 'email_notifications')
         widgets = {
             'email': forms.EmailInput(attrs={
                 'class': 'form-control'
@@ -127,4 +127,7 @@ class CustomUserProfileForm(forms.ModelForm):
             'profile_image': forms.FileInput(attrs={
                 'class': 'form-control'
             }),
+            'email_notifications': forms.CheckboxInput(attrs={
+                'class': 'form-check-input'
+            }),
         }
@@ -0,0 +1,50 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions in small batches without locking the session table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of sessions deleted per batch (default: 1000)')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches (default: 0)')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pause = options['sleep']
+        max_batches = options['max_batches']
+        now = timezone.now()
+
+        # Each batch selects a slice of keys through the expire_date index and
+        # deletes them by primary key in its own short transaction, so other
+        # requests never wait on one long-running DELETE.
+        expired = Session.objects.filter(expire_date__lt=now).order_by('expire_date')
+
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                break
+
+            with transaction.atomic():
+                deleted, _ = Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()
+
+            total += deleted
+            batches += 1
+            self.stdout.write(f'  Batch {batches}: deleted {deleted} sessions')
+
+            if len(keys) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Purged {total} expired sessions'))
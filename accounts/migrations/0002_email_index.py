@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:33
+
+import accounts.models
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+
+
+def normalize_emails(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    # Accounts whose emails differ only by case or spacing would end up
+    # sharing one login email; stop so they can be merged by hand first.
+    duplicates = list(
+        CustomUser.objects.annotate(normalized=Lower(Trim('email')))
+        .exclude(normalized='')
+        .values('normalized')
+        .annotate(users=Count('pk'))
+        .filter(users__gt=1)
+        .order_by('normalized')
+        .values_list('normalized', flat=True)
+    )
+    if duplicates:
+        raise RuntimeError(
+            'These emails belong to more than one account once lower-cased and trimmed; '
+            f'merge or change them before migrating: {", ".join(duplicates)}'
+        )
+    CustomUser.objects.update(email=Lower(Trim('email')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', accounts.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='email',
+            field=models.EmailField(blank=True, db_index=True, max_length=254, verbose_name='email address'),
+        ),
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_email_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='email_notifications',
+            field=models.BooleanField(default=True, help_text='Send order and message notifications by email'),
+        ),
+    ]
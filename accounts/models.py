@@ -1,7 +1,27 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
 
+class CustomUserManager(UserManager):
+    """User manager that stores emails lower-cased and defaults username to email"""
+
+    @classmethod
+    def normalize_email(cls, email):
+        return (email or '').strip().lower()
+
+    def create_user(self, username=None, email=None, password=None, **extra_fields):
+        email = self.normalize_email(email)
+        return super().create_user(username or email, email, password, **extra_fields)
+
+    def create_superuser(self, username=None, email=None, password=None, **extra_fields):
+        email = self.normalize_email(email)
+        return super().create_superuser(username or email, email, password, **extra_fields)
+
+    def get_by_email(self, email):
+        """Single index lookup on the normalized email column"""
+        return self.filter(email=self.normalize_email(email)).order_by('pk').first()
+
+
 class CustomUser(AbstractUser):
     USER_TYPE_CHOICES = [
         ('customer', 'Customer'),
@@ -9,19 +29,27 @@ class CustomUser(AbstractUser):
         ('admin', 'Admin'),
     ]
 
+    email = models.EmailField('email address', blank=True, db_index=True)
     user_type = models.CharField(max_length=20, choices=USER_TYPE_CHOICES, default='customer')
     phone_number = models.CharField(max_length=20, blank=True)
     profile_image = models.ImageField(upload_to='profile_images/', blank=True, null=True)
     is_verified = models.BooleanField(default=False)
+    email_notifications = models.BooleanField(default=True, help_text='Send order and message notifications by email')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CustomUserManager()
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return f"{self.email} ({self.get_user_type_display()})"
 
+    def save(self, *args, **kwargs):
+        self.email = CustomUserManager.normalize_email(self.email)
+        super().save(*args, **kwargs)
+
     @property
     def is_customer(self):
         return self.user_type == 'customer'
@@ -1,4 +1,9 @@
-from django.test import TestCase
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from crochet_shop.testing import QueryBudgetMixin
 from .models import CustomUser, SellerProfile
 
 
@@ -22,3 +27,97 @@ class CustomUserTestCase(TestCase):
     def test_seller_creation(self):
         self.assertTrue(self.seller.is_seller)
         self.assertFalse(self.seller.is_customer)
+
+
+class PurgeSessionsCommandTestCase(TestCase):
+    def test_only_expired_sessions_are_deleted(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.contrib.sessions.models import Session
+        from django.core.management import call_command
+        from django.utils import timezone
+
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='active', session_data='', expire_date=now + timedelta(days=1))
+
+        call_command('purge_sessions', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['active'])
+
+
+class EmailBackendTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='Mixed.Case@Example.com', password='testpass123')
+
+    def test_email_is_normalized(self):
+        self.assertEqual(self.user.email, 'mixed.case@example.com')
+        self.assertEqual(self.user.username, 'mixed.case@example.com')
+
+    def test_email_migration_refuses_case_duplicates(self):
+        from importlib import import_module
+        from django.apps import apps
+        normalize_emails = import_module('accounts.migrations.0002_email_index').normalize_emails
+
+        first = CustomUser.objects.create_user(email='amina@example.com', password='testpass123')
+        second = CustomUser.objects.create_user(username='amina2', email='other@example.com', password='testpass123')
+        CustomUser.objects.filter(pk=second.pk).update(email=' Amina@Example.com')
+        with self.assertRaisesMessage(RuntimeError, 'amina@example.com'):
+            normalize_emails(apps, None)
+        self.assertEqual(CustomUser.objects.get(pk=second.pk).email, ' Amina@Example.com')
+
+        CustomUser.objects.filter(pk=first.pk).delete()
+        normalize_emails(apps, None)
+        self.assertEqual(CustomUser.objects.get(pk=second.pk).email, 'amina@example.com')
+
+    def test_authenticate_ignores_email_case(self):
+        from .backends import EmailBackend
+        user = EmailBackend().authenticate(None, username=' MIXED.case@example.COM', password='testpass123')
+        self.assertEqual(user, self.user)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_get_user_is_cached_until_user_is_saved(self):
+        from .backends import EmailBackend
+        backend = EmailBackend()
+        backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.user.pk), self.user)
+
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(self.user.pk).first_name, 'Renamed')
+
+    def test_get_user_is_not_cached_without_a_shared_cache(self):
+        from .backends import EmailBackend
+        backend = EmailBackend()
+        backend.get_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(backend.get_user(self.user.pk), self.user)
+
+
+class SellerDashboardQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        from orders.fulfilment import split_order
+        from orders.models import Order, OrderItem
+        from shop.models import Category, Product
+
+        self.seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        SellerProfile.objects.create(user=self.seller, shop_name='Yarn Co', phone_number='0700000000', shop_address='Nairobi')
+        category = Category.objects.create(name='Bags', slug='bags')
+        for i in range(5):
+            product = Product.objects.create(
+                category=category, seller=self.seller, name=f'Bag {i}', slug=f'bag-{i}',
+                description='Handmade', price='1500.00', stock=3, image=f'products/bag-{i}.jpg',
+            )
+            order = Order.objects.create(
+                customer_name='Alice', customer_phone='0711111111', customer_address='Nairobi', total_amount='1500.00',
+            )
+            split_order(order, [OrderItem(product=product, product_name=product.name, product_price=Decimal('1500.00'))])
+        self.client.force_login(self.seller)
+
+    def test_seller_dashboard_query_budget(self):
+        self.assertQueryBudget(12, reverse('accounts:seller_dashboard'))
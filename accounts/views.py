@@ -2,13 +2,17 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import HttpResponseBadRequest
 from django.views.decorators.http import require_http_methods
 from django.db.models import Count, Sum, Q, Avg
 from datetime import timedelta
 from django.utils import timezone
 from .models import CustomUser, SellerProfile
 from .forms import CustomUserCreationForm, CustomUserLoginForm, SellerProfileForm, CustomUserProfileForm
-from orders.models import Order, Payment
+from crochet_shop.streaming import streaming_csv_response
+from crochet_shop.replicas import use_replica
+from orders.exports import filter_orders, order_export, sales_export
+from orders.models import Order, Payment, SellerOrder
 from shop.models import Product, SellerReview
 
 
@@ -22,7 +26,7 @@ def register(request):
         if form.is_valid():
             user = form.save()
             # Log the user in with explicit backend
-            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+            login(request, user, backend='accounts.backends.EmailBackend')
             messages.success(request, f'Welcome {user.first_name}! Account created successfully.')
             
             # If seller, redirect to seller profile setup
@@ -53,7 +57,7 @@ def login_view(request):
         form = CustomUserLoginForm(request, data=request.POST)
         if form.is_valid():
             user = form.get_user()
-            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+            login(request, user, backend='accounts.backends.EmailBackend')
             messages.success(request, f'Welcome back, {user.first_name}!')
             
             # Redirect based on user type
@@ -112,6 +116,7 @@ def seller_profile_setup(request):
     return render(request, 'accounts/seller_profile_setup.html', {'form': form})
 
 
+@use_replica
 @login_required(login_url='accounts:login')
 def seller_dashboard(request):
     if not request.user.is_seller:
@@ -124,14 +129,12 @@ def seller_dashboard(request):
         return redirect('accounts:seller_profile_setup')
     
     # Get seller's products
-    products = Product.objects.filter(seller=request.user).order_by('-created_at')
+    products = Product.objects.filter(seller=request.user).select_related('category').order_by('-created_at')
     
-    # Get seller's orders (from products sold)
-    from orders.models import OrderItem
-    seller_order_items = OrderItem.objects.filter(product__seller=request.user).select_related('order').order_by('-order__created_at')
-    
-    # Get unique orders
-    seller_orders = Order.objects.filter(items__product__seller=request.user).distinct().order_by('-created_at')
+    # Seller's part of each order, looked up directly on the seller index
+    seller_orders = SellerOrder.objects.filter(seller=request.user).select_related('order').annotate(
+        item_count=Count('items')
+    ).order_by('-created_at')
     
     # Get seller's reviews
     reviews = SellerReview.objects.filter(seller=request.user)
@@ -142,15 +145,32 @@ def seller_dashboard(request):
         'products': products,
         'product_count': products.count(),
         'seller_orders': seller_orders,
-        'seller_order_items': seller_order_items,
-        'orders_count': seller_orders.count(),
+        'orders_count': SellerOrder.objects.filter(seller=request.user).count(),
         'reviews': reviews,
         'avg_rating': avg_rating,
         'review_count': reviews.count(),
+        'order_statuses': Order.STATUS_CHOICES,
     }
     return render(request, 'accounts/seller_dashboard.html', context)
 
 
+@use_replica
+@login_required(login_url='accounts:login')
+def seller_sales_export(request):
+    """Stream the seller's sold items as CSV"""
+    if not request.user.is_seller:
+        messages.error(request, 'Only sellers can access this page.')
+        return redirect('shop:home')
+    
+    try:
+        header, rows = sales_export(request.user, request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    filename = f'sales-{timezone.localdate():%Y%m%d}.csv'
+    return streaming_csv_response(filename, header, rows)
+
+
+@use_replica
 def seller_profile(request, seller_id):
     """Public seller profile view with reviews and ratings"""
     try:
@@ -193,6 +213,7 @@ def seller_profile(request, seller_id):
     return render(request, 'accounts/seller_profile.html', context)
 
 
+@use_replica
 @login_required(login_url='accounts:login')
 def customer_dashboard(request):
     if not request.user.is_authenticated:
@@ -209,6 +230,7 @@ def customer_dashboard(request):
     return render(request, 'accounts/customer_dashboard.html', context)
 
 
+@use_replica
 @login_required(login_url='accounts:login')
 def admin_dashboard(request):
     """Admin dashboard for Festo - custom theme matching the app"""
@@ -258,6 +280,7 @@ def admin_dashboard(request):
     return render(request, 'accounts/admin_dashboard.html', context)
 
 
+@use_replica
 @login_required(login_url='accounts:login')
 def admin_orders(request):
     """Admin view for managing all orders"""
@@ -267,20 +290,41 @@ def admin_orders(request):
     
     orders = Order.objects.all().order_by('-created_at')
     
-    # Filter by status if provided
+    # Filter by status and date range if provided
     status = request.GET.get('status')
-    if status:
-        orders = orders.filter(status=status)
+    try:
+        orders = filter_orders(orders, request.GET)
+    except ValueError as e:
+        messages.error(request, str(e))
     
     context = {
         'orders': orders,
         'statuses': Order._meta.get_field('status').choices,
         'selected_status': status,
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
     }
     
     return render(request, 'accounts/admin_orders.html', context)
 
 
+@use_replica
+@login_required(login_url='accounts:login')
+def admin_orders_export(request):
+    """Stream all matching orders, their items and payments as CSV"""
+    if request.user.user_type != 'admin':
+        messages.error(request, 'You do not have permission to access this page.')
+        return redirect('shop:home')
+    
+    try:
+        header, rows = order_export(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    filename = f'orders-{timezone.localdate():%Y%m%d}.csv'
+    return streaming_csv_response(filename, header, rows)
+
+
+@use_replica
 @login_required(login_url='accounts:login')
 def admin_sellers(request):
     """Admin view for managing sellers"""
@@ -302,6 +346,7 @@ def admin_sellers(request):
     return render(request, 'accounts/admin_sellers.html', context)
 
 
+@use_replica
 @login_required(login_url='accounts:login')
 def admin_products(request):
     """Admin view for managing products"""
@@ -333,6 +378,7 @@ def admin_products(request):
     return render(request, 'accounts/admin_products.html', context)
 
 
+@use_replica
 @login_required(login_url='accounts:login')
 def admin_reviews(request):
     """Admin view for managing seller reviews"""
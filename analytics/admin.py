@@ -0,0 +1,15 @@
+from django.contrib import admin
+from .models import ProductAffinity, SalesRollup
+
+
+@admin.register(SalesRollup)
+class SalesRollupAdmin(admin.ModelAdmin):
+    list_display = ['period', 'period_start', 'seller', 'product', 'units', 'revenue', 'orders', 'cancellations']
+    list_filter = ['period', 'period_start']
+    raw_id_fields = ['seller', 'product']
+
+
+@admin.register(ProductAffinity)
+class ProductAffinityAdmin(admin.ModelAdmin):
+    list_display = ['product', 'related', 'co_purchases', 'score']
+    raw_id_fields = ['product', 'related']
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from accounts.models import CustomUser
+from analytics.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily and weekly sales rollups from order items (run after bulk imports or to repair drift)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default='', help='Only rebuild from the week containing this date (YYYY-MM-DD)')
+        parser.add_argument('--seller', default='', help='Only rebuild this seller (email)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+        seller = None
+        if options['seller']:
+            seller = CustomUser.objects.get_by_email(options['seller'])
+            if seller is None:
+                raise CommandError(f'No user with email "{options["seller"]}"')
+
+        written = rebuild(since=since, seller=seller)
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote {written} sales rollup rows'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.recommendations import NEIGHBORS, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the related-products index from order co-purchases and categories (run nightly or after bulk imports)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbors', type=int, default=NEIGHBORS, help='Related products kept per product')
+
+    def handle(self, *args, **options):
+        if options['neighbors'] < 1:
+            raise CommandError('--neighbors must be at least 1')
+        written = rebuild(neighbors=options['neighbors'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote {written} product affinity rows'))
@@ -0,0 +1,67 @@
+from django.db import models
+from accounts.models import CustomUser
+from shop.models import Product
+
+
+class SalesRollup(models.Model):
+    """
+    Pre-aggregated sales for one seller (product is NULL) or one product in a
+    day or week bucket, keyed by the date the order was placed. Units and
+    revenue are net of cancelled orders.
+    """
+    PERIOD_CHOICES = [
+        ('day', 'Daily'),
+        ('week', 'Weekly'),
+    ]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    seller = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='sales_rollups')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name='sales_rollups')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['period', 'period_start']
+        constraints = [
+            # Also serve as the indexes for chart range scans
+            models.UniqueConstraint(
+                fields=['seller', 'period', 'period_start'], condition=models.Q(product__isnull=True),
+                name='unique_seller_rollup',
+            ),
+            models.UniqueConstraint(
+                fields=['product', 'period', 'period_start'], condition=models.Q(product__isnull=False),
+                name='unique_product_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        if self.product_id:
+            return f'{self.get_period_display()} {self.period_start} - product {self.product_id}'
+        return f'{self.get_period_display()} {self.period_start} - seller {self.seller_id}'
+
+
+class ProductAffinity(models.Model):
+    """
+    One entry of a product's precomputed neighbour list: ``related`` was bought
+    in the same order as ``product`` ``co_purchases`` times and/or shares its
+    category. product_detail reads the top entries by ``score``.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='affinities')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='affine_to')
+    co_purchases = models.PositiveIntegerField(default=0)
+    score = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_product_affinity'),
+        ]
+        indexes = [
+            models.Index(fields=['product', '-score'], name='product_affinity_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.related_id} ({self.score})'
@@ -0,0 +1,117 @@
+"""
+Maintain the ProductAffinity recommendation index.
+
+Each product keeps up to NEIGHBORS related products ranked by score: one
+point per order both appeared in, plus CATEGORY_SCORE when they share a
+category. ``rebuild`` recomputes the lists from order items (cancelled orders
+excluded) and tops them up with the newest products of the same category;
+``record_order`` adds a newly placed order's pairs as it arrives, so lists
+may grow past NEIGHBORS until the next rebuild.
+"""
+import heapq
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from orders.models import OrderItem
+from shop.models import Product
+from .models import ProductAffinity
+
+NEIGHBORS = 12
+CATEGORY_SCORE = 0.5
+REBUILD_BATCH_SIZE = 1000
+
+
+def _score(co_purchases, same_category):
+    return co_purchases + (CATEGORY_SCORE if same_category else 0)
+
+
+def record_order(order):
+    """Count a newly placed order (with its items saved) towards its products' affinities"""
+    categories = dict(
+        OrderItem.objects.filter(order=order, product__isnull=False)
+        .values_list('product_id', 'product__category_id').distinct()
+    )
+    if len(categories) < 2:
+        return
+    ProductAffinity.objects.bulk_create([
+        ProductAffinity(product_id=product_id, related_id=related_id,
+                        score=_score(0, categories[product_id] == categories[related_id]))
+        for product_id in categories for related_id in categories if product_id != related_id
+    ], ignore_conflicts=True)
+    ProductAffinity.objects.filter(product_id__in=categories, related_id__in=categories).update(
+        co_purchases=F('co_purchases') + 1, score=F('score') + 1,
+    )
+
+
+def related_products(product, limit=4):
+    """Top ``limit`` available neighbours of ``product``, topped up from its category before the first rebuild"""
+    related = list(
+        Product.objects.filter(affine_to__product=product, available=True)
+        .order_by('-affine_to__score')[:limit]
+    )
+    if len(related) < limit:
+        related += Product.objects.filter(category=product.category_id, available=True).exclude(
+            pk__in=[product.pk, *(p.pk for p in related)]
+        )[:limit - len(related)]
+    return related
+
+
+def _co_purchases():
+    """(product_id, related_id, orders) for every pair bought together in a non-cancelled order"""
+    pairs = (
+        OrderItem.objects.filter(product__isnull=False, order__items__product__isnull=False)
+        .exclude(order__status='cancelled')
+        .values_list('product_id', 'order__items__product_id')
+        .annotate(orders=Count('order_id', distinct=True))
+        .order_by()
+    )
+    for product_id, related_id, orders in pairs.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        if product_id != related_id:
+            yield product_id, related_id, orders
+
+
+def rebuild(neighbors=NEIGHBORS):
+    """Recompute every product's neighbour list. Returns the number of rows written."""
+    categories = {}
+    newest = defaultdict(list)
+    for pk, category_id in Product.objects.filter(available=True).order_by('category_id', '-created_at').values_list(
+        'pk', 'category_id'
+    ):
+        categories[pk] = category_id
+        if len(newest[category_id]) <= neighbors:
+            newest[category_id].append(pk)
+
+    top = defaultdict(list)
+    for product_id, related_id, orders in _co_purchases():
+        if product_id not in categories or related_id not in categories:
+            continue
+        entry = (_score(orders, categories[product_id] == categories[related_id]), related_id, orders)
+        heap = top[product_id]
+        if len(heap) < neighbors:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    written = 0
+    with transaction.atomic():
+        ProductAffinity.objects.all().delete()
+        batch = []
+        for product_id, category_id in categories.items():
+            entries = top.get(product_id, [])
+            chosen = {related_id for _, related_id, _ in entries}
+            for related_id in newest[category_id]:
+                if len(entries) >= neighbors:
+                    break
+                if related_id != product_id and related_id not in chosen:
+                    entries.append((CATEGORY_SCORE, related_id, 0))
+            batch += [
+                ProductAffinity(product_id=product_id, related_id=related_id, co_purchases=orders, score=score)
+                for score, related_id, orders in entries
+            ]
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                written += len(ProductAffinity.objects.bulk_create(batch))
+                batch = []
+        written += len(ProductAffinity.objects.bulk_create(batch))
+    return written
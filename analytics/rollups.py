@@ -0,0 +1,164 @@
+"""
+Maintain SalesRollup rows.
+
+Orders are bucketed by the local date they were placed. Placing an order adds
+its units, revenue and one order to every (seller, product) and seller bucket
+it touches. Each seller's part of an order is cancelled on its own: when a
+seller group (SellerOrder) is cancelled its units and revenue are taken back
+out of that seller's buckets and a cancellation is counted there, while the
+other sellers' buckets are left alone. Items placed before orders were split
+into seller groups follow the order's status instead. ``rebuild`` recomputes
+the same numbers from OrderItem with grouped queries.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncWeek
+from django.utils import timezone
+
+from orders.models import OrderItem
+from .models import SalesRollup
+
+PERIODS = ('day', 'week')
+REBUILD_BATCH_SIZE = 1000
+
+
+def bucket_start(day, period):
+    """First day of the bucket containing ``day`` (weeks start on Monday)"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _order_lines(items):
+    """Units and revenue of order items per (seller, product) and per (seller, None)"""
+    lines = defaultdict(lambda: [0, Decimal('0')])
+    items = items.filter(product__seller__isnull=False).values_list(
+        'product__seller_id', 'product_id', 'quantity', 'product_price',
+    )
+    for seller_id, product_id, quantity, price in items:
+        for key in ((seller_id, product_id), (seller_id, None)):
+            lines[key][0] += quantity
+            lines[key][1] += price * quantity
+    return lines
+
+
+def _increment(period, period_start, seller_id, product_id, **deltas):
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas:
+        return
+    lookup = {'period': period, 'period_start': period_start, 'seller_id': seller_id, 'product_id': product_id}
+    changes = {name: F(name) + value for name, value in deltas.items()}
+    changes['updated_at'] = timezone.now()
+    if SalesRollup.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SalesRollup.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Another request created the bucket first
+        SalesRollup.objects.filter(**lookup).update(**changes)
+
+
+def _apply(order, items, sign, orders=0, cancellations=0):
+    day = timezone.localdate(order.created_at)
+    lines = _order_lines(items)
+    for period in PERIODS:
+        start = bucket_start(day, period)
+        for (seller_id, product_id), (units, revenue) in lines.items():
+            _increment(period, start, seller_id, product_id, units=sign * units, revenue=sign * revenue,
+                       orders=orders, cancellations=cancellations)
+
+
+def record_order_placed(order):
+    """Add a newly placed order (with its items saved) to the rollups"""
+    items = OrderItem.objects.filter(order=order)
+    if order.status == 'cancelled':
+        _apply(order, items, 0, orders=1, cancellations=1)
+    else:
+        _apply(order, items, 1, orders=1)
+
+
+def _record_cancellation(order, items, old_status, new_status):
+    if old_status == new_status or 'cancelled' not in (old_status, new_status):
+        return
+    if new_status == 'cancelled':
+        _apply(order, items, -1, cancellations=1)
+    else:
+        _apply(order, items, 1, cancellations=-1)
+
+
+def record_status_change(order, old_status, new_status):
+    """
+    Move the units and revenue of an order's items that have no seller group
+    out of (or back into) the rollups when the order is (un)cancelled
+    """
+    _record_cancellation(order, OrderItem.objects.filter(order=order, seller_order__isnull=True), old_status, new_status)
+
+
+def record_seller_order_change(seller_order, old_status, new_status):
+    """Move one seller's part of an order out of (or back into) their rollups when it is (un)cancelled"""
+    _record_cancellation(seller_order.order, OrderItem.objects.filter(seller_order=seller_order), old_status, new_status)
+
+
+def _grouped(items, period, by_product):
+    if period == 'week':
+        bucket = TruncWeek('order__created_at', output_field=DateField())
+    else:
+        bucket = TruncDate('order__created_at')
+    # A seller group's status decides for its items; items without one follow the order
+    cancelled = Q(seller_order__status='cancelled') | Q(seller_order__isnull=True, order__status='cancelled')
+    active = ~cancelled
+    keys = ['bucket', 'product__seller_id'] + (['product_id'] if by_product else [])
+    return items.annotate(bucket=bucket).values(*keys).annotate(
+        total_units=Sum('quantity', filter=active),
+        total_revenue=Sum(
+            ExpressionWrapper(F('quantity') * F('product_price'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+            filter=active,
+        ),
+        total_orders=Count('order_id', distinct=True),
+        total_cancellations=Count('order_id', distinct=True, filter=cancelled),
+    ).order_by()
+
+
+def rebuild(since=None, seller=None):
+    """
+    Recompute rollups from order items. ``since`` (a date) limits the rebuild to
+    orders placed from the start of that week on; ``seller`` to one seller.
+    Returns the number of rollup rows written.
+    """
+    rollups = SalesRollup.objects.all()
+    items = OrderItem.objects.filter(product__seller__isnull=False)
+    if since:
+        since = bucket_start(since, 'week')
+        rollups = rollups.filter(period_start__gte=since)
+        items = items.filter(order__created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+    if seller:
+        rollups = rollups.filter(seller=seller)
+        items = items.filter(product__seller=seller)
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        for period in PERIODS:
+            for by_product in (False, True):
+                batch = []
+                for row in _grouped(items, period, by_product).iterator(chunk_size=REBUILD_BATCH_SIZE):
+                    batch.append(SalesRollup(
+                        period=period,
+                        period_start=row['bucket'],
+                        seller_id=row['product__seller_id'],
+                        product_id=row.get('product_id'),
+                        units=row['total_units'] or 0,
+                        revenue=row['total_revenue'] or 0,
+                        orders=row['total_orders'],
+                        cancellations=row['total_cancellations'],
+                    ))
+                    if len(batch) >= REBUILD_BATCH_SIZE:
+                        written += len(SalesRollup.objects.bulk_create(batch))
+                        batch = []
+                written += len(SalesRollup.objects.bulk_create(batch))
+    return written
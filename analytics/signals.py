@@ -0,0 +1,36 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from orders.models import Order, SellerOrder
+from orders.state_machine import orders_bulk_transitioned, seller_orders_transitioned
+from .rollups import record_seller_order_change, record_status_change
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    # Read __dict__ so orders loaded with .only()/.defer() don't fetch the field
+    instance._rollup_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_status_change(sender, instance, created, **kwargs):
+    """Keep SalesRollup cancellations in step with status changes saved through the model"""
+    old_status = instance._rollup_status
+    if not created and old_status is not None and old_status != instance.status:
+        record_status_change(instance, old_status, instance.status)
+    instance._rollup_status = instance.status
+
+
+@receiver(orders_bulk_transitioned)
+def update_rollups_on_bulk_transition(sender, changes, **kwargs):
+    cancelled = {pk: (old, new) for pk, old, new in changes if 'cancelled' in (old, new) and old != new}
+    for order in Order.objects.filter(pk__in=cancelled):
+        record_status_change(order, *cancelled[order.pk])
+
+
+@receiver(seller_orders_transitioned)
+def update_rollups_on_seller_order_transition(sender, changes, **kwargs):
+    """A seller's cancelled part of an order leaves their rollups even while other sellers carry on"""
+    cancelled = {pk: (old, new) for pk, old, new in changes if 'cancelled' in (old, new) and old != new}
+    for seller_order in SellerOrder.objects.filter(pk__in=cancelled).select_related('order'):
+        record_seller_order_change(seller_order, *cancelled[seller_order.pk])
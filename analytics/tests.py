@@ -0,0 +1,210 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from orders.models import Order, OrderItem
+from shop.models import Category, Product
+from .models import ProductAffinity, SalesRollup
+from .recommendations import rebuild as rebuild_recommendations, record_order, related_products
+from .rollups import rebuild, record_order_placed
+
+
+class SalesRollupTestCase(TestCase):
+    def setUp(self):
+        self.seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        category = Category.objects.create(name='Bags', slug='bags')
+        self.tote = Product.objects.create(category=category, seller=self.seller, name='Tote Bag', description='x',
+                                           price='1000.00', stock=50, image='products/tote.jpg')
+        self.hat = Product.objects.create(category=category, seller=self.seller, name='Hat', description='x',
+                                          price='500.00', stock=50, image='products/hat.jpg')
+        self.day = date(2025, 3, 5)  # a Wednesday
+
+    def place_order(self, lines, day=None, split=False):
+        order = Order.objects.create(customer_name='Customer', customer_phone='0712345678',
+                                     customer_address='Nairobi', total_amount='0.00')
+        when = timezone.make_aware(datetime.combine(day or self.day, datetime.min.time())) + timedelta(hours=12)
+        Order.objects.filter(pk=order.pk).update(created_at=when)
+        order.refresh_from_db()
+        if split:
+            # One seller group per seller, as checkout does
+            from orders.fulfilment import split_order
+            split_order(order, [OrderItem(product=product, product_name=product.name,
+                                          product_price=Decimal(product.price), quantity=quantity)
+                                for product, quantity in lines])
+        else:
+            for product, quantity in lines:
+                OrderItem.objects.create(order=order, product=product, product_name=product.name,
+                                         product_price=product.price, quantity=quantity)
+        record_order_placed(order)
+        return order
+
+    def snapshot(self):
+        return sorted(SalesRollup.objects.values_list(
+            'period', 'period_start', 'seller_id', 'product_id', 'units', 'revenue', 'orders', 'cancellations',
+        ), key=str)
+
+    def test_placing_and_cancelling_orders_updates_buckets(self):
+        self.place_order([(self.tote, 2), (self.hat, 1)])
+        order = self.place_order([(self.tote, 1)], day=self.day + timedelta(days=1))
+
+        seller_week = SalesRollup.objects.get(period='week', period_start=date(2025, 3, 3), product=None)
+        self.assertEqual((seller_week.units, seller_week.revenue, seller_week.orders), (4, Decimal('3500.00'), 2))
+        tote_day = SalesRollup.objects.get(period='day', period_start=self.day, product=self.tote)
+        self.assertEqual((tote_day.units, tote_day.orders), (2, 1))
+
+        order.status = 'cancelled'
+        order.save()
+        seller_week.refresh_from_db()
+        self.assertEqual((seller_week.units, seller_week.revenue, seller_week.orders, seller_week.cancellations),
+                         (3, Decimal('2500.00'), 2, 1))
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.place_order([(self.tote, 2), (self.hat, 1)])
+        cancelled = self.place_order([(self.hat, 3)], day=self.day + timedelta(days=7))
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        restored = self.place_order([(self.tote, 1)], day=self.day + timedelta(days=8))
+        restored.status = 'cancelled'
+        restored.save()
+        restored.status = 'processing'
+        restored.save()
+        incremental = self.snapshot()
+
+        rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+        rebuild(since=self.day + timedelta(days=7))
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_bulk_cancellation_updates_rollups(self):
+        from orders.state_machine import bulk_transition
+        order = self.place_order([(self.tote, 2)])
+        bulk_transition(Order.objects.filter(pk=order.pk), 'cancelled')
+
+        seller_day = SalesRollup.objects.get(period='day', period_start=self.day, product=None)
+        self.assertEqual((seller_day.units, seller_day.orders, seller_day.cancellations), (0, 1, 1))
+
+        # Orders split into seller groups are taken out once, through their groups
+        grouped = self.place_order([(self.hat, 1)], day=self.day + timedelta(days=1), split=True)
+        bulk_transition(Order.objects.filter(pk=grouped.pk), 'cancelled')
+        seller_day = SalesRollup.objects.get(period='day', period_start=self.day + timedelta(days=1), product=None)
+        self.assertEqual((seller_day.units, seller_day.orders, seller_day.cancellations), (0, 1, 1))
+
+    def test_seller_cancelling_their_part_leaves_other_sellers(self):
+        from orders.models import SellerOrder
+        from orders.state_machine import bulk_transition_seller_orders
+
+        other = CustomUser.objects.create_user(email='other@example.com', password='testpass123', user_type='seller')
+        scarf = Product.objects.create(category=self.tote.category, seller=other, name='Scarf', description='x',
+                                       price='800.00', stock=50, image='products/scarf.jpg')
+        order = self.place_order([(self.tote, 2), (scarf, 1)], split=True)
+
+        def seller_day(seller):
+            return SalesRollup.objects.values_list('units', 'revenue', 'orders', 'cancellations').get(
+                period='day', period_start=self.day, seller=seller, product=None,
+            )
+
+        bulk_transition_seller_orders(SellerOrder.objects.filter(order=order, seller=self.seller), 'cancelled')
+        self.assertEqual(seller_day(self.seller), (0, Decimal('0.00'), 1, 1))
+        self.assertEqual(seller_day(other), (1, Decimal('800.00'), 1, 0))
+        incremental = self.snapshot()
+        rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+        # The last seller cancelling cancels the order; the first seller's part is not taken out twice
+        bulk_transition_seller_orders(SellerOrder.objects.filter(order=order, seller=other), 'cancelled')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertEqual(seller_day(self.seller), (0, Decimal('0.00'), 1, 1))
+        self.assertEqual(seller_day(other), (0, Decimal('0.00'), 1, 1))
+        incremental = self.snapshot()
+        rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_sales_series_endpoint_is_zero_filled(self):
+        self.place_order([(self.tote, 2)])
+        self.client.force_login(self.seller)
+
+        response = self.client.get(reverse('analytics:sales_series'), {
+            'period': 'day', 'date_from': '2025-03-04', 'date_to': '2025-03-06',
+        })
+        data = response.json()
+        self.assertEqual([point['units'] for point in data['series']], [0, 2, 0])
+        self.assertEqual(data['totals']['revenue'], '2000.00')
+
+        response = self.client.get(reverse('analytics:sales_series'), {
+            'period': 'week', 'date_from': '2025-03-01', 'date_to': '2025-03-09', 'product': self.hat.pk,
+        })
+        self.assertEqual([point['date'] for point in response.json()['series']], ['2025-02-24', '2025-03-03'])
+
+    def test_malformed_parameters_are_rejected(self):
+        admin = CustomUser.objects.create_user(email='admin@example.com', password='testpass123', user_type='admin')
+        self.client.force_login(admin)
+        url = reverse('analytics:sales_series')
+        self.assertEqual(self.client.get(url, {'seller': 'abc'}).status_code, 400)
+        for dates in ({'date_to': '2025-13-01'}, {'date_from': '2024-13-40'}, {'date_to': 'yesterday'},
+                      {'date_from': '2025-03-10', 'date_to': '2025-03-01'}):
+            self.assertEqual(self.client.get(url, {'seller': self.seller.pk, **dates}).status_code, 400, dates)
+        self.assertEqual(self.client.get(url, {'seller': self.seller.pk}).status_code, 200)
+
+    def test_customers_cannot_read_sales(self):
+        customer = CustomUser.objects.create_user(email='customer@example.com', password='testpass123')
+        self.client.force_login(customer)
+        self.assertEqual(self.client.get(reverse('analytics:sales_series')).status_code, 403)
+
+
+class RecommendationTestCase(TestCase):
+    def setUp(self):
+        seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        bags = Category.objects.create(name='Bags', slug='bags')
+        hats = Category.objects.create(name='Hats', slug='hats')
+        self.tote, self.clutch, self.beanie, self.bucket_hat = [
+            Product.objects.create(category=category, seller=seller, name=name, description='x',
+                                   price='1000.00', stock=50, image='products/x.jpg')
+            for category, name in [(bags, 'Tote'), (bags, 'Clutch'), (hats, 'Beanie'), (hats, 'Bucket Hat')]
+        ]
+
+    def place_order(self, products, status='pending'):
+        order = Order.objects.create(customer_name='Customer', customer_phone='0712345678',
+                                     customer_address='Nairobi', total_amount='0.00', status=status)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, product_name=product.name,
+                                     product_price=product.price)
+        record_order(order)
+        return order
+
+    def snapshot(self):
+        return sorted(ProductAffinity.objects.filter(co_purchases__gt=0).values_list(
+            'product_id', 'related_id', 'co_purchases', 'score',
+        ))
+
+    def test_rebuild_matches_incremental_updates(self):
+        self.place_order([self.tote, self.beanie])
+        self.place_order([self.tote, self.beanie, self.clutch])
+        incremental = self.snapshot()
+        self.assertIn((self.tote.pk, self.beanie.pk, 2, 2.0), incremental)
+        self.assertIn((self.tote.pk, self.clutch.pk, 1, 1.5), incremental)
+
+        rebuild_recommendations()
+        self.assertEqual(self.snapshot(), incremental)
+        # Same-category products fill the rest of the list
+        self.assertTrue(ProductAffinity.objects.filter(
+            product=self.beanie, related=self.bucket_hat, co_purchases=0, score=0.5,
+        ).exists())
+
+    def test_related_products_ranked_by_score_in_one_query(self):
+        self.place_order([self.tote, self.beanie])
+        self.place_order([self.tote, self.beanie])
+        self.place_order([self.tote, self.bucket_hat], status='cancelled')
+        rebuild_recommendations()
+
+        with self.assertNumQueries(1):
+            related = related_products(self.tote, limit=2)
+        self.assertEqual(related, [self.beanie, self.clutch])
+
+    def test_product_without_index_falls_back_to_category(self):
+        self.assertEqual(related_products(self.beanie), [self.bucket_hat])
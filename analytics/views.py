@@ -0,0 +1,104 @@
+from datetime import timedelta
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from accounts.models import CustomUser
+from crochet_shop.replicas import use_replica
+from .models import SalesRollup
+from .rollups import bucket_start
+
+DEFAULT_BUCKETS = {'day': 30, 'week': 12}
+MAX_BUCKETS = 400
+
+
+def _date_param(request, name):
+    """The YYYY-MM-DD date in ``name``, None if absent; ValueError if it isn't a valid date"""
+    value = request.GET.get(name, '')
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+@use_replica
+@login_required(login_url='accounts:login')
+def sales_series(request):
+    """
+    Sales chart data from the rollups: one zero-filled point per day or week.
+    Sellers see their own sales; admins may pass ?seller=<id>.
+    """
+    user = request.user
+    if user.user_type == 'admin' and request.GET.get('seller'):
+        if not request.GET['seller'].isdigit():
+            return JsonResponse({'success': False, 'message': 'seller must be a seller id'}, status=400)
+        seller = CustomUser.objects.filter(pk=request.GET['seller'], user_type='seller').first()
+        if seller is None:
+            return JsonResponse({'success': False, 'message': 'Seller not found'}, status=404)
+    elif user.is_seller:
+        seller = user
+    else:
+        return JsonResponse({'success': False, 'message': 'Only sellers can view sales analytics'}, status=403)
+
+    period = request.GET.get('period', 'day')
+    if period not in DEFAULT_BUCKETS:
+        return JsonResponse({'success': False, 'message': 'period must be "day" or "week"'}, status=400)
+    step = timedelta(weeks=1) if period == 'week' else timedelta(days=1)
+
+    try:
+        date_to = _date_param(request, 'date_to') or timezone.localdate()
+        date_from = _date_param(request, 'date_from') or date_to - step * (DEFAULT_BUCKETS[period] - 1)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Dates must be valid YYYY-MM-DD dates'}, status=400)
+    if date_from > date_to:
+        return JsonResponse({'success': False, 'message': 'date_from must not be after date_to'}, status=400)
+    date_from, date_to = bucket_start(date_from, period), bucket_start(date_to, period)
+    if (date_to - date_from) / step >= MAX_BUCKETS:
+        return JsonResponse({'success': False, 'message': f'Date range must cover 1 to {MAX_BUCKETS} buckets'}, status=400)
+
+    rollups = SalesRollup.objects.filter(
+        seller=seller, period=period, period_start__gte=date_from, period_start__lte=date_to,
+    )
+    product_id = request.GET.get('product')
+    if product_id and not product_id.isdigit():
+        return JsonResponse({'success': False, 'message': 'product must be a product id'}, status=400)
+    if product_id:
+        rollups = rollups.filter(product_id=product_id)
+    else:
+        rollups = rollups.filter(product__isnull=True)
+
+    by_start = {
+        row[0]: row[1:]
+        for row in rollups.values_list('period_start', 'units', 'revenue', 'orders', 'cancellations')
+    }
+    series = []
+    totals = {'units': 0, 'revenue': 0, 'orders': 0, 'cancellations': 0}
+    start = date_from
+    while start <= date_to:
+        units, revenue, orders, cancellations = by_start.get(start, (0, 0, 0, 0))
+        series.append({
+            'date': start.isoformat(),
+            'units': units,
+            'revenue': str(revenue),
+            'orders': orders,
+            'cancellations': cancellations,
+        })
+        totals['units'] += units
+        totals['revenue'] += revenue
+        totals['orders'] += orders
+        totals['cancellations'] += cancellations
+        start += step
+    totals['revenue'] = str(totals['revenue'])
+
+    return JsonResponse({
+        'success': True,
+        'period': period,
+        'seller': seller.pk,
+        'product': int(product_id) if product_id else None,
+        'series': series,
+        'totals': totals,
+    })
@@ -0,0 +1,7 @@
+"""
+Storefront load-test harness.
+
+Generate data with ``python manage.py generate_bulk_data`` and drive it with
+``python manage.py run_benchmark`` (in-process) or
+``python manage.py run_benchmark --base-url http://127.0.0.1:8000`` (gunicorn).
+"""
@@ -0,0 +1,155 @@
+"""
+Drive the traffic mix with N concurrent virtual users and summarise
+throughput and latency percentiles per endpoint.
+"""
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+from .traffic import TRAFFIC_MIX
+
+
+class InProcessSession:
+    """Runs requests through the full WSGI handler and middleware without a server"""
+
+    def __init__(self):
+        from django.test import Client
+        self.client = Client()
+        self.email = ''
+
+    def login(self, email, password):
+        from accounts.models import CustomUser
+        self.client.force_login(CustomUser.objects.get(email=email), backend='accounts.backends.EmailBackend')
+        self.email = email
+
+    def get(self, path, params=None):
+        return self.client.get(path, params or {}).status_code
+
+    def post(self, path, data):
+        return self.client.post(path, data).status_code
+
+    def post_json(self, path, body):
+        return self.client.post(path, body, content_type='application/json').status_code
+
+
+class HttpSession:
+    """Runs requests against a live server such as a local gunicorn"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.http = requests.Session()
+        self.email = ''
+
+    def _csrf_headers(self):
+        if 'csrftoken' not in self.http.cookies:
+            self.http.get(f'{self.base_url}/accounts/login/')
+        return {'X-CSRFToken': self.http.cookies.get('csrftoken', ''), 'Referer': f'{self.base_url}/'}
+
+    def login(self, email, password):
+        headers = self._csrf_headers()
+        self.http.post(f'{self.base_url}/accounts/login/', {'username': email, 'password': password},
+                       headers=headers, allow_redirects=False)
+        self.email = email
+
+    def get(self, path, params=None):
+        return self.http.get(f'{self.base_url}{path}', params=params, allow_redirects=False).status_code
+
+    def post(self, path, data):
+        return self.http.post(f'{self.base_url}{path}', data, headers=self._csrf_headers(),
+                              allow_redirects=False).status_code
+
+    def post_json(self, path, body):
+        return self.http.post(f'{self.base_url}{path}', data=body, allow_redirects=False,
+                              headers={'Content-Type': 'application/json'}).status_code
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class BenchmarkResult:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, status, error=None):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            # Redirects are the normal outcome of form posts
+            if status >= 400:
+                self.errors[name] += 1
+                self.error_samples.setdefault(name, error or f'HTTP {status}')
+
+    def summary(self):
+        rows = []
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            rows.append({
+                'endpoint': name,
+                'requests': len(values),
+                'errors': self.errors[name],
+                'rps': len(values) / self.elapsed if self.elapsed else 0.0,
+                'mean_ms': sum(values) / len(values) * 1000,
+                'p50_ms': percentile(values, 0.50) * 1000,
+                'p95_ms': percentile(values, 0.95) * 1000,
+                'p99_ms': percentile(values, 0.99) * 1000,
+            })
+        total = sum(row['requests'] for row in rows)
+        return {
+            'elapsed_s': self.elapsed,
+            'total_requests': total,
+            'total_errors': sum(self.errors.values()),
+            'throughput_rps': total / self.elapsed if self.elapsed else 0.0,
+            'endpoints': rows,
+            'error_samples': dict(self.error_samples),
+        }
+
+
+def run_benchmark(session_factory, catalog, password, concurrency=4, duration=30.0, iterations=None, seed=1):
+    """
+    Run ``concurrency`` virtual users until ``duration`` seconds pass or each
+    has performed ``iterations`` actions, whichever comes first.
+    """
+    result = BenchmarkResult()
+    names, weights = zip(*[(name, weight) for name, weight, _, _ in TRAFFIC_MIX])
+    actions = {name: (needs_login, action) for name, _, needs_login, action in TRAFFIC_MIX}
+    deadline = time.perf_counter() + duration
+
+    def virtual_user(index):
+        rng = random.Random(seed * 1000 + index)
+        session = session_factory()
+        if catalog.customer_emails:
+            session.login(catalog.customer_emails[index % len(catalog.customer_emails)], password)
+        done = 0
+        while time.perf_counter() < deadline and (iterations is None or done < iterations):
+            name = rng.choices(names, weights)[0]
+            needs_login, action = actions[name]
+            if needs_login and not session.email:
+                continue
+            start = time.perf_counter()
+            error = None
+            try:
+                status = action(session, catalog, rng)
+            except Exception as e:
+                status, error = 599, repr(e)
+            result.record(name, time.perf_counter() - start, status, error)
+            done += 1
+
+    threads = [threading.Thread(target=virtual_user, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,112 @@
+"""
+Scripted traffic mix: each action is one user-visible step of a shopping
+session, weighted roughly like production traffic.
+"""
+import json
+from dataclasses import dataclass, field
+
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from chat.models import Conversation
+from orders.models import Payment
+from shop.models import Category, Product
+
+
+@dataclass
+class Catalog:
+    """Identifiers loaded once so actions do not query the database themselves"""
+    product_slugs: list
+    product_ids: list
+    category_slugs: list
+    customer_emails: list
+    conversations: dict = field(default_factory=dict)
+    checkout_request_ids: list = field(default_factory=list)
+
+    @classmethod
+    def load(cls, prefix='bench', limit=5000):
+        products = Product.objects.filter(available=True, stock__gt=0).values_list('id', 'slug')[:limit]
+        customers = CustomUser.objects.filter(
+            email__startswith=f'{prefix}-customer-', user_type='customer'
+        ).values_list('email', flat=True)[:limit]
+        conversations = {}
+        for conversation_id, email in Conversation.objects.filter(
+            customer__email__startswith=f'{prefix}-customer-'
+        ).values_list('id', 'customer__email')[:limit]:
+            conversations.setdefault(email, []).append(conversation_id)
+        pending = Payment.objects.filter(status='pending').exclude(checkout_request_id='')
+        return cls(
+            product_slugs=[slug for _, slug in products],
+            product_ids=[pk for pk, _ in products],
+            category_slugs=list(Category.objects.values_list('slug', flat=True)),
+            customer_emails=list(customers),
+            conversations=conversations,
+            checkout_request_ids=list(pending.values_list('checkout_request_id', flat=True)[:limit]),
+        )
+
+
+def browse_home(session, catalog, rng):
+    return session.get(reverse('shop:home'))
+
+
+def browse_products(session, catalog, rng):
+    params = {}
+    if catalog.category_slugs and rng.random() < 0.6:
+        params['category'] = rng.choice(catalog.category_slugs)
+    return session.get(reverse('shop:product_list'), params)
+
+
+def view_product(session, catalog, rng):
+    return session.get(reverse('shop:product_detail', args=[rng.choice(catalog.product_slugs)]))
+
+
+def search(session, catalog, rng):
+    return session.get(reverse('shop:search'), {'q': rng.choice(['bag', 'sweater', 'bunny', 'hat', 'scarf'])})
+
+
+def add_to_cart(session, catalog, rng):
+    return session.post(reverse('shop:add_to_cart', args=[rng.choice(catalog.product_ids)]), {'quantity': 1})
+
+
+def checkout(session, catalog, rng):
+    session.post(reverse('shop:add_to_cart', args=[rng.choice(catalog.product_ids)]), {'quantity': 1})
+    return session.post(reverse('shop:checkout'), {
+        'customer_name': 'Load Test',
+        'customer_phone': '0712345678',
+        'customer_email': session.email,
+        'customer_address': 'Nairobi, Kenya',
+        'payment_method': 'mpesa',
+    })
+
+
+def payment_callback(session, catalog, rng):
+    checkout_request_id = catalog.checkout_request_ids.pop() if catalog.checkout_request_ids else 'ws_CO_unknown'
+    payload = {'Body': {'stkCallback': {
+        'MerchantRequestID': 'bench',
+        'CheckoutRequestID': checkout_request_id,
+        'ResultCode': 0,
+        'ResultDesc': 'The service request is processed successfully.',
+        'CallbackMetadata': {'Item': [{'Name': 'MpesaReceiptNumber', 'Value': f'BENCH{rng.randint(0, 10**8)}'}]},
+    }}}
+    return session.post_json(reverse('orders:mpesa_payment_callback'), json.dumps(payload))
+
+
+def chat(session, catalog, rng):
+    conversations = catalog.conversations.get(session.email)
+    if not conversations:
+        return session.get(reverse('chat:conversations_list'))
+    conversation_id = rng.choice(conversations)
+    return session.post(reverse('chat:send_message_ajax', args=[conversation_id]), {'content': 'Is this still available?'})
+
+
+# (name, weight, needs_login, action)
+TRAFFIC_MIX = [
+    ('home', 20, False, browse_home),
+    ('product_list', 20, False, browse_products),
+    ('product_detail', 25, False, view_product),
+    ('search', 10, False, search),
+    ('add_to_cart', 10, False, add_to_cart),
+    ('checkout', 5, True, checkout),
+    ('payment_callback', 3, False, payment_callback),
+    ('chat', 7, True, chat),
+]
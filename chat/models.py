@@ -15,7 +15,13 @@ class Conversation(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
-        unique_together = ('customer', 'seller', 'order')
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'seller', 'order'], name='unique_conversation'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', '-updated_at'], name='conversation_seller_idx'),
+            models.Index(fields=['customer', '-updated_at'], name='conversation_customer_idx'),
+        ]
 
     def __str__(self):
         return f"Chat: {self.customer.email} <-> {self.seller.email}"
@@ -34,6 +40,10 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['conversation', 'is_read', 'sender'], name='message_unread_idx'),
+            models.Index(fields=['conversation', '-created_at'], name='message_conversation_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender.email}: {self.content[:50]}"
@@ -1,3 +1,92 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from accounts.models import CustomUser
+from crochet_shop.testing import QueryBudgetMixin, QueryPlanAssertionsMixin
+from .models import Conversation, Message
+
+
+class ChatIndexTestCase(QueryPlanAssertionsMixin, TestCase):
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(email='customer@example.com', password='testpass123')
+        self.seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+
+    def test_conversation_lists_use_index(self):
+        self.assertUsesIndex(Conversation.objects.filter(seller=self.seller))
+        self.assertUsesIndex(Conversation.objects.filter(customer=self.customer))
+
+    def test_unread_messages_use_index(self):
+        conversations = Conversation.objects.filter(customer=self.customer)
+        unread = Message.objects.filter(conversation__in=conversations, is_read=False).exclude(sender=self.customer)
+        self.assertUsesIndex(unread)
+
+
+class ConversationsListQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(email='customer@example.com', password='testpass123')
+        for i in range(5):
+            seller = CustomUser.objects.create_user(email=f'seller{i}@example.com', password='testpass123', user_type='seller')
+            conversation = Conversation.objects.create(customer=self.customer, seller=seller)
+            Message.objects.create(conversation=conversation, sender=seller, content=f'Hello {i}')
+        self.client.force_login(self.customer)
+
+    def test_conversations_list_query_budget(self):
+        # Includes the django_session SELECT: tests run without a shared cache
+        response = self.assertQueryBudget(6, reverse('chat:conversations_list'))
+        self.assertContains(response, 'Hello 4')
+
+
+class MessageNotificationTestCase(TestCase):
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(email='customer@example.com', password='testpass123', first_name='Amina')
+        self.seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        self.conversation = Conversation.objects.create(customer=self.customer, seller=self.seller)
+        self.client.force_login(self.customer)
+
+    def test_burst_of_messages_becomes_one_notification(self):
+        from django.core import mail
+        url = reverse('chat:send_message_ajax', args=[self.conversation.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            for text in ['Hi', 'Is the tote still available?', 'In green?']:
+                self.assertEqual(self.client.post(url, {'content': text}).status_code, 200)
+
+        notification = self.seller.notifications.get()
+        self.assertEqual((notification.count, notification.message), (3, 'Amina: In green?'))
+        # In-app only, so sending never waits on SMTP
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Once read, the next message starts a new notification
+        notification.is_read = True
+        notification.save()
+        self.client.post(url, {'content': 'Hello again'})
+        self.assertEqual(self.seller.notifications.filter(is_read=False).get().count, 1)
+
+
+class UnreadCountConditionalTestCase(TestCase):
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(email='customer@example.com', password='testpass123', first_name='Amina')
+        self.seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        self.conversation = Conversation.objects.create(customer=self.customer, seller=self.seller)
+        self.client.force_login(self.seller)
+        self.url = reverse('chat:unread_count')
+
+    def test_poll_gets_304_until_count_changes(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Message.objects.create(conversation=self.conversation, sender=self.customer, content='Hi')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json(), {'unread_count': 1})
+
+        # Reading the conversation changes the reader's count
+        etag = response['ETag']
+        self.client.get(reverse('chat:conversation_detail', args=[self.conversation.pk]))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).json(), {'unread_count': 0})
+
+        # Counted from the database, so changes made elsewhere show up too
+        response = self.client.get(self.url)
+        Message.objects.create(conversation=self.conversation, sender=self.customer, content='Still there?')
+        Message.objects.filter(conversation=self.conversation).update(is_read=True)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Message.objects.filter(conversation=self.conversation).update(is_read=False)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).json(), {'unread_count': 2})
@@ -0,0 +1,27 @@
+"""
+Unread message counts for the polling endpoint.
+
+The count is the whole body of ``get_unread_count``, so it also serves as
+the ETag: a poll whose If-None-Match still matches gets a 304 without a
+body. It is counted in the database on every poll (one indexed COUNT), so
+every worker agrees on it, and kept on the request so the view does not
+count twice.
+"""
+from .models import Conversation, Message
+
+
+def unread_count(request):
+    if not hasattr(request, '_unread_count'):
+        user = request.user
+        if user.is_customer:
+            conversations = Conversation.objects.filter(customer=user)
+        else:
+            conversations = Conversation.objects.filter(seller=user)
+        request._unread_count = Message.objects.filter(
+            conversation__in=conversations, is_read=False
+        ).exclude(sender=user).count()
+    return request._unread_count
+
+
+def unread_count_etag(request):
+    return f'unread-{request.user.pk}-{unread_count(request)}'
@@ -2,15 +2,35 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.db.models import Q
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from django.db.models import OuterRef, Q, Subquery
 from .models import Conversation, Message
-from orders.models import Order, Notification
+from .unread import unread_count, unread_count_etag
+from orders.models import Order
+from orders.notifications import notify
 from shop.models import Product
 
 User = get_user_model()
 
 
+def _notify_recipient(conversation, sender, content):
+    """
+    Notify the other participant; a burst of messages becomes one notification.
+    In-app only: sending a message must not wait on SMTP.
+    """
+    recipient = conversation.customer if sender == conversation.seller else conversation.seller
+    notify(
+        [recipient],
+        'message',
+        title=f'New message from {sender.first_name}',
+        message=f'{sender.first_name}: {content[:100]}',
+        order=conversation.order,
+        group_key=f'conversation:{conversation.pk}',
+        email=False,
+    )
+
+
 @login_required
 def conversations_list(request):
     """Display all conversations for the logged-in user"""
@@ -19,6 +39,12 @@ def conversations_list(request):
     else:  # seller
         conversations = Conversation.objects.filter(seller=request.user)
     
+    # Load participants, order and last message preview in the same query
+    last_message = Message.objects.filter(conversation=OuterRef('pk')).order_by('-created_at')
+    conversations = conversations.select_related('customer', 'seller', 'order').annotate(
+        last_message_content=Subquery(last_message.values('content')[:1])
+    )
+    
     context = {
         'conversations': conversations,
     }
@@ -49,16 +75,7 @@ def conversation_detail(request, conversation_id):
                 content=content
             )
             conversation.save()  # Update 'updated_at'
-            
-            # Create notification for the other user
-            other_user = conversation.seller if request.user.is_customer else conversation.customer
-            Notification.objects.create(
-                user=other_user,
-                notification_type='message',
-                title=f'New message from {request.user.first_name}',
-                message=f'{request.user.first_name}: {content[:100]}',
-                order=conversation.order
-            )
+            _notify_recipient(conversation, request.user, content)
             
             return redirect('chat:conversation_detail', conversation_id=conversation.id)
     
@@ -75,8 +92,13 @@ def start_conversation(request, order_id):
     """Start a new conversation for an order"""
     order = get_object_or_404(Order, id=order_id)
     
-    # Find the seller of the order (first product's seller)
-    seller = order.items.first().product.seller if order.items.exists() else None
+    # Customers pick which seller of the order to talk to (?seller=<id>); default to the first one
+    seller_orders = order.seller_orders.filter(seller__isnull=False).select_related('seller').order_by('pk')
+    seller_id = request.GET.get('seller', '')
+    if seller_id.isdigit():
+        seller_orders = seller_orders.filter(seller_id=seller_id)
+    seller_order = seller_orders.first()
+    seller = seller_order.seller if seller_order else None
     if not seller:
         return redirect('chat:conversations_list')
     
@@ -129,6 +151,7 @@ def send_message_ajax(request, conversation_id):
         content=content
     )
     conversation.save()
+    _notify_recipient(conversation, request.user, content)
     
     return JsonResponse({
         'success': True,
@@ -142,16 +165,8 @@ def send_message_ajax(request, conversation_id):
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=unread_count_etag)
 def get_unread_count(request):
-    """Get unread message count for current user"""
-    if request.user.is_customer:
-        conversations = Conversation.objects.filter(customer=request.user)
-    else:
-        conversations = Conversation.objects.filter(seller=request.user)
-    
-    unread_count = Message.objects.filter(
-        conversation__in=conversations,
-        is_read=False
-    ).exclude(sender=request.user).count()
-    
-    return JsonResponse({'unread_count': unread_count})
+    """Get unread message count for current user; polls answer 304 until it changes"""
+    return JsonResponse({'unread_count': unread_count(request)})
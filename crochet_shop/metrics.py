@@ -0,0 +1,389 @@
+"""
+Request and outbound-call metrics exposed in Prometheus text format.
+
+Each process keeps its counters, gauges and histograms in memory and
+periodically writes a snapshot to ``METRICS_DIR/metrics-<pid>.json``. The
+/metrics view merges every snapshot in the directory, so a scrape sees totals
+across all gunicorn workers without an external collector. Snapshots of
+workers that have exited are folded into ``retired.json`` on the next scrape,
+so their counters stay in the totals while their gauges are dropped.
+
+Outside DEBUG the endpoint answers only requests carrying METRICS_TOKEN.
+
+Database connection pools (DATABASE_POOL) are sampled after every request.
+"""
+import fcntl
+import glob
+import hmac
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, Prometheus style; the last bucket is +Inf.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+QUANTILES = (0.5, 0.95, 0.99)
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests handled, by route, method and status code.'),
+    'http_request_errors_total': ('counter', 'Requests that ended in a 5xx response.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by route and method.'),
+    'outbound_requests_total': ('counter', 'Calls to external services (M-PESA, SMTP) by outcome.'),
+    'outbound_request_duration_seconds': ('histogram', 'Latency of calls to external services.'),
+    'db_connections_opened_total': ('counter', 'Connections Django opened, or took from the pool, by alias.'),
+    'db_pool_max_size': ('gauge', 'Connections the pools may hold.'),
+    'db_pool_size': ('gauge', 'Connections currently held by the pools.'),
+    'db_pool_checked_out': ('gauge', 'Pooled connections lent out to requests.'),
+    'db_pool_requests_waiting': ('gauge', 'Requests waiting for a pooled connection.'),
+    'db_pool_requests_total': ('counter', 'Connections requested from the pools.'),
+    'db_pool_requests_queued_total': ('counter', 'Connection requests that had to wait.'),
+    'db_pool_wait_seconds_total': ('counter', 'Time requests spent waiting for a pooled connection.'),
+    'db_pool_timeouts_total': ('counter', 'Connection requests that timed out or failed.'),
+    'db_pool_connections_opened_total': ('counter', 'New server connections opened by the pools.'),
+    'db_pool_connection_setup_seconds_total': ('counter', 'Time spent opening new server connections.'),
+}
+
+# psycopg_pool statistics that accumulate between pop_stats() calls: (key, metric, scale)
+POOL_COUNTERS = (
+    ('requests_num', 'db_pool_requests_total', 1),
+    ('requests_queued', 'db_pool_requests_queued_total', 1),
+    ('requests_wait_ms', 'db_pool_wait_seconds_total', 0.001),
+    ('requests_errors', 'db_pool_timeouts_total', 1),
+    ('connections_num', 'db_pool_connections_opened_total', 1),
+    ('connections_ms', 'db_pool_connection_setup_seconds_total', 0.001),
+)
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+class MetricsRegistry:
+    """Thread-safe per-process metric store with a file-backed snapshot"""
+
+    def __init__(self, directory, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # Samples taken in a preloading master must not be re-reported by every worker
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, labels, value):
+        key = _key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name, labels, seconds):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {
+                    key: {'buckets': list(h['buckets']), 'sum': h['sum'], 'count': h['count']}
+                    for key, h in self.histograms.items()
+                },
+            }
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_json(self.directory, self.path, self.snapshot())
+        except OSError as e:
+            logger.warning('Could not write metrics snapshot to %s: %s', self.directory, e)
+
+    @property
+    def retired_path(self):
+        # Outside the metrics-*.json pattern, so it is never mistaken for a worker
+        return os.path.join(self.directory, 'retired.json')
+
+    def collect(self):
+        """Merge the snapshots of every running worker, including this one, with the totals of exited ones"""
+        self.flush(force=True)
+        self.retire_exited()
+        counters = {}
+        gauges = {}
+        histograms = {}
+        retired = _load(self.retired_path)
+        if retired:
+            _merge(retired, counters, histograms)
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            data = _load(path)
+            if data is None:
+                continue
+            _merge(data, counters, histograms)
+            for key, value in data.get('gauges', {}).items():
+                gauges[key] = gauges.get(key, 0) + value
+        return counters, gauges, histograms
+
+    def retire_exited(self):
+        """
+        Fold the snapshots of exited workers into retired.json and delete
+        them, so restarts do not grow the directory (and every scrape) forever
+        while their counts stay in the totals.
+        """
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if _is_running(path):
+                continue
+            # Claim the file first so two scraping workers never count it twice
+            claimed = f'{path}.{os.getpid()}.retiring'
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            try:
+                with open(os.path.join(self.directory, '.retired.lock'), 'a') as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    totals = _load(self.retired_path) or {}
+                    counters = totals.setdefault('counters', {})
+                    histograms = totals.setdefault('histograms', {})
+                    data = _load(claimed)
+                    if data:
+                        _merge(data, counters, histograms)
+                    _write_json(self.directory, self.retired_path, totals)
+                os.remove(claimed)
+            except OSError as e:
+                logger.warning('Could not retire metrics snapshot %s: %s', path, e)
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(directory, path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _merge(data, counters, histograms):
+    for key, value in data.get('counters', {}).items():
+        counters[key] = counters.get(key, 0) + value
+    for key, h in data.get('histograms', {}).items():
+        merged = histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+        merged['buckets'] = [a + b for a, b in zip(merged['buckets'], h['buckets'])]
+        merged['sum'] += h['sum']
+        merged['count'] += h['count']
+
+
+def _is_running(path):
+    """Whether the worker that wrote a snapshot is still alive"""
+    try:
+        pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+        os.kill(pid, 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+registry = MetricsRegistry(
+    getattr(settings, 'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'crochet_shop_metrics')),
+    getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0),
+)
+
+
+@contextmanager
+def timer(service, operation):
+    """Time a call to an external service, e.g. ``with timer('mpesa', 'stk_push'):``"""
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        labels = {'service': service, 'operation': operation}
+        registry.observe('outbound_request_duration_seconds', labels, time.perf_counter() - start)
+        registry.inc('outbound_requests_total', {**labels, 'outcome': outcome})
+
+
+def record_pool_stats(alias, stats):
+    """Copy one psycopg_pool ``pop_stats()`` result into the registry"""
+    labels = {'alias': alias}
+    registry.set('db_pool_max_size', labels, stats.get('pool_max', 0))
+    registry.set('db_pool_size', labels, stats.get('pool_size', 0))
+    registry.set('db_pool_checked_out', labels, stats.get('pool_size', 0) - stats.get('pool_available', 0))
+    registry.set('db_pool_requests_waiting', labels, stats.get('requests_waiting', 0))
+    for key, name, scale in POOL_COUNTERS:
+        if stats.get(key):
+            registry.inc(name, labels, stats[key] * scale)
+
+
+def sample_pools(**kwargs):
+    """Record the statistics of this process's connection pools, if any"""
+    for alias in connections:
+        connection = connections[alias]
+        if not connection.settings_dict['OPTIONS'].get('pool'):
+            continue
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            record_pool_stats(alias, pool.pop_stats())
+
+
+def _count_connection(sender, connection, **kwargs):
+    registry.inc('db_connections_opened_total', {'alias': connection.alias})
+
+
+connection_created.connect(_count_connection, dispatch_uid='metrics_connection_created')
+# After Django has handed the request's connections back to the pool
+request_finished.connect(sample_pools, dispatch_uid='metrics_sample_pools')
+
+
+def histogram_quantile(q, buckets):
+    """Estimate a quantile from bucket counts by linear interpolation, as Prometheus does"""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(BUCKETS, buckets):
+        if cumulative + count >= rank and count:
+            if math.isinf(bound):
+                return lower
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        if not math.isinf(bound):
+            lower = bound
+    return lower
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if math.isinf(bound) else repr(bound)
+
+
+def render_prometheus(counters, histograms, gauges=None):
+    families = {}
+    for key, value in [*counters.items(), *(gauges or {}).items()]:
+        name, labels = json.loads(key)
+        families.setdefault(name, []).append(f'{name}{_format_labels(labels)} {value}')
+
+    quantiles = {}
+    for key, h in sorted(histograms.items()):
+        name, labels = json.loads(key)
+        lines = families.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(BUCKETS, h['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labels + [["le", _format_bound(bound)]])} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {h["sum"]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {h["count"]}')
+        for q in QUANTILES:
+            estimate = histogram_quantile(q, h['buckets'])
+            if estimate is not None:
+                quantiles.setdefault(f'{name}_quantile', []).append(
+                    f'{name}_quantile{_format_labels(labels + [["quantile", str(q)]])} {estimate}'
+                )
+
+    output = []
+    for name in sorted(families):
+        kind, help_text = HELP.get(name, ('untyped', name))
+        output.append(f'# HELP {name} {help_text}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(families[name])
+    for name in sorted(quantiles):
+        output.append(f'# HELP {name} p50/p95/p99 estimated from the histogram buckets.')
+        output.append(f'# TYPE {name} gauge')
+        output.extend(quantiles[name])
+    return '\n'.join(output) + '\n'
+
+
+class MetricsMiddleware:
+    """Count requests and errors and time each request per route"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        # The URL pattern, not the path, keeps label cardinality bounded
+        route = '/' + match.route if match else 'unmatched'
+        labels = {'route': route, 'method': request.method}
+        registry.observe('http_request_duration_seconds', labels, elapsed)
+        registry.inc('http_requests_total', {**labels, 'status': str(response.status_code)})
+        if response.status_code >= 500:
+            registry.inc('http_request_errors_total', labels)
+        registry.flush()
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token and not settings.DEBUG:
+        # Never expose route names and traffic publicly by accident
+        return HttpResponseForbidden('Set METRICS_TOKEN to enable /metrics')
+    # Constant-time, on bytes: a str comparison raises on non-ASCII headers
+    authorization = request.headers.get('Authorization', '').encode()
+    if token and not hmac.compare_digest(authorization, f'Bearer {token}'.encode()):
+        return HttpResponseForbidden('Forbidden')
+    sample_pools()
+    counters, gauges, histograms = registry.collect()
+    return HttpResponse(render_prometheus(counters, histograms, gauges), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,160 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import replicas
+
+logger = logging.getLogger('crochet_shop.queries')
+
+
+class QueryRecorder:
+    """Database execute wrapper that records every statement and how long it took"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': params,
+                'alias': context['connection'].alias,
+                'duration': time.perf_counter() - start,
+            })
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(query['duration'] for query in self.queries)
+
+    @property
+    def duplicates(self):
+        """Executions of a statement with the exact same SQL and parameters"""
+        counts = Counter((query['sql'], repr(query['params'])) for query in self.queries)
+        return sum(n - 1 for n in counts.values())
+
+    @property
+    def similar(self):
+        """Executions of the same SQL with different parameters - usually an N+1 loop"""
+        counts = Counter(query['sql'] for query in self.queries)
+        return {sql: n for sql, n in counts.items() if n > 1}
+
+    def slowest(self, n):
+        return sorted(self.queries, key=lambda query: query['duration'], reverse=True)[:n]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Record query count, DB time, duplicates and the slowest statements for
+    each request and log one structured line per request on the
+    ``crochet_shop.queries`` logger. With QUERY_TIMING_HEADER the totals are
+    also exported as a Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_INSTRUMENTATION', settings.DEBUG)
+        self.timing_header = getattr(settings, 'QUERY_TIMING_HEADER', settings.DEBUG)
+        self.slowest_count = getattr(settings, 'QUERY_INSTRUMENTATION_SLOWEST', 3)
+        self.warn_threshold = getattr(settings, 'QUERY_BUDGET_WARNING', 50)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view_name = request.resolver_match.view_name if request.resolver_match else None
+        db_ms = recorder.total_time * 1000
+
+        if self.timing_header:
+            server_timing = [
+                f'db;dur={db_ms:.2f};desc="{recorder.count} queries"',
+                f'app;dur={elapsed * 1000:.2f}',
+            ]
+            if response.has_header('Server-Timing'):
+                server_timing.insert(0, response['Server-Timing'])
+            response['Server-Timing'] = ', '.join(server_timing)
+
+        record = {
+            'event': 'request_queries',
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(db_ms, 2),
+            'total_ms': round(elapsed * 1000, 2),
+            'duplicates': recorder.duplicates,
+            'similar': max(recorder.similar.values(), default=0),
+            'slowest': [
+                {'ms': round(query['duration'] * 1000, 2), 'sql': query['sql'][:300]}
+                for query in recorder.slowest(self.slowest_count)
+            ],
+        }
+        level = logging.WARNING if recorder.count > self.warn_threshold else logging.INFO
+        logger.log(level, json.dumps(record), extra={'query_stats': record})
+
+        return response
+
+
+def _stream_in(state, content):
+    """Iterate a streaming body with ``state`` active, since it runs after the middleware returns"""
+    content = iter(content)
+    while True:
+        token = replicas.enter(state)
+        try:
+            chunk = next(content)
+        except StopIteration:
+            return
+        finally:
+            replicas.leave(token)
+        yield chunk
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Track per request whether reads may go to a replica (see
+    crochet_shop/replicas.py) and pin visitors to the primary after a write.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = replicas.RoutingState(pinned=replicas.PIN_COOKIE in request.COOKIES)
+        token = replicas.enter(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.leave(token)
+
+        if response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = _stream_in(state, response.streaming_content)
+        if state.wrote and replicas.replicas():
+            response.set_cookie(replicas.PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = replicas.current()
+        if state is not None:
+            state.replica = request.method in ('GET', 'HEAD') and getattr(view_func, 'replica_reads', False)
+        return None
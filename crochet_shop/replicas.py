@@ -0,0 +1,87 @@
+"""
+Read-replica routing.
+
+Replicas are listed in settings.DATABASE_REPLICAS (see DATABASE_REPLICA_URLS
+in settings.py). Only views marked with ``@use_replica`` read from them, and
+only for GET/HEAD requests; everything else, and every write, goes to the
+primary (``default``). Views whose output is cached under the catalog
+version (the storefront pages, facet counts and navigation fragment) stay on
+the primary, so a lagging replica's render is never stored as current.
+
+A request that writes pins the visitor to the primary for
+REPLICA_PIN_SECONDS through a cookie, so the pages they load next (the
+order they just placed, the product they just edited) are not served from a
+replica that has not caught up yet. Reads later in the same request use the
+primary as well. Sessions are always read from the primary.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'primary_pin'
+
+# Apps whose rows must be read right after they are written, on any page
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = False
+        self.wrote = False
+
+    @property
+    def reads_from_replica(self):
+        return self.replica and not self.pinned and not self.wrote
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+def use_replica(view):
+    """Mark a read-only view whose GETs may be answered from a replica"""
+    view.replica_reads = True
+    return view
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def enter(state):
+    return _state.set(state)
+
+
+def leave(token):
+    _state.reset(token)
+
+
+def current():
+    return _state.get()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        aliases = replicas()
+        if state is None or not aliases or not state.reads_from_replica:
+            return None
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        # Always the primary, even for an instance that was read from a replica
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
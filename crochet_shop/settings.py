@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 import dj_database_url
 
@@ -21,10 +22,14 @@ INSTALLED_APPS = [
     'shop',
     'orders',
     'chat',
+    'analytics',
 ]
 
 MIDDLEWARE = [
+    'crochet_shop.metrics.MetricsMiddleware',
+    'crochet_shop.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'crochet_shop.middleware.QueryInstrumentationMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,13 +63,115 @@ TEMPLATES = [
 WSGI_APPLICATION = 'crochet_shop.wsgi.application'
 
 # Database Configuration
+# Each gunicorn worker serves GUNICORN_THREADS requests at a time (see
+# gunicorn.conf.py), so it never needs more connections than that.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 1))
+
+# DATABASE_POOL=true gives each worker a psycopg connection pool (PostgreSQL
+# only). Otherwise each thread keeps its connection for DATABASE_CONN_MAX_AGE
+# seconds. Either way a connection is checked before it is reused.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'False').lower() in ('true', '1', 'yes')
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 600))
+
+# DATABASE_MAX_CONNECTIONS, if set, is shared out between the workers so the
+# pools together stay under the server's connection limit.
+DATABASE_MAX_CONNECTIONS = int(os.environ.get('DATABASE_MAX_CONNECTIONS', 0))
+_pool_max_size = int(os.environ.get('DATABASE_POOL_MAX_SIZE', 0)) or GUNICORN_THREADS
+if DATABASE_MAX_CONNECTIONS:
+    _pool_max_size = min(_pool_max_size, max(DATABASE_MAX_CONNECTIONS // WEB_CONCURRENCY, 1))
+DATABASE_POOL_OPTIONS = {
+    'min_size': min(int(os.environ.get('DATABASE_POOL_MIN_SIZE', 1)), _pool_max_size),
+    'max_size': _pool_max_size,
+    # Seconds a request waits for a free connection before failing
+    'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+    # Idle connections above min_size are closed after this many seconds
+    'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', 300)),
+}
+
+
+def database_config(config):
+    """Apply the pooling or persistent-connection settings to one DATABASES entry"""
+    config['CONN_HEALTH_CHECKS'] = True
+    if DATABASE_POOL and config['ENGINE'] == 'django.db.backends.postgresql':
+        # Pooled connections go back to the pool at the end of each request
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = dict(DATABASE_POOL_OPTIONS)
+    else:
+        config['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+    return config
+
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default='sqlite:///db.sqlite3',
-        conn_max_age=600
-    )
+    'default': database_config(dj_database_url.config(default='sqlite:///db.sqlite3')),
 }
 
+# Read replicas: comma-separated database URLs, added as replica1, replica2, ...
+# Views marked @use_replica read from them (see crochet_shop/replicas.py).
+# Tests read replicas through the default test database.
+DATABASE_REPLICAS = []
+for number, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = database_config(dj_database_url.parse(url.strip()))
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['crochet_shop.replicas.ReplicaRouter']
+
+# After a write the visitor reads from the primary for this many seconds,
+# longer than replication normally lags
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
+# Cache Configuration
+# Local memory by default; set CACHE_DIR to share the cache between gunicorn
+# workers through the filesystem instead.
+CACHE_DIR = os.environ.get('CACHE_DIR', '')
+
+if CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'default'),
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(CACHE_DIR, 'sessions'),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'crochet-shop-default',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'crochet-shop-sessions',
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        },
+    }
+
+# Whether every worker sees the same cache. State that another worker can
+# change (sessions, users) is only cached when it does.
+SHARED_CACHE = bool(CACHE_DIR)
+
+# Anonymous storefront pages (home, product list, category, product detail)
+# are cached for this many seconds; catalog edits invalidate them at once.
+# 0 disables the page cache, as does a cache the workers don't share.
+STOREFRONT_CACHE_TIMEOUT = int(os.environ.get('STOREFRONT_CACHE_TIMEOUT', 300))
+
+# With a shared cache, sessions are written through to the database but read
+# from the cache, so authenticated pages skip the django_session SELECT on a
+# cache hit. A per-process cache would keep serving a session another worker
+# has logged out or updated, so without one they are read from the database.
+# Expired rows are removed with `python manage.py purge_sessions`.
+if SHARED_CACHE:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+SESSION_CACHE_ALIAS = 'sessions'
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -92,6 +199,9 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Covering (INCLUDE) indexes only apply on PostgreSQL; SQLite builds the plain index.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 CSRF_TRUSTED_ORIGINS = ['https://*.replit.dev', 'https://*.replit.app']
 
 # Custom User Model
@@ -114,6 +224,12 @@ DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@crochetshop.c
 # Site Configuration
 SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
 
+# Notifications
+# Read notifications older than this are removed (or archived with --archive)
+# by `python manage.py prune_notifications`.
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', '90'))
+NOTIFICATIONS_PER_PAGE = 20
+
 # M-PESA Configuration
 MPESA_CONSUMER_KEY = os.environ.get('MPESA_CONSUMER_KEY', 'RuDAmSmeO40FphvmvtkUkpexrwdkq5bZnycoBdBsSxtebm9S')
 MPESA_CONSUMER_SECRET = os.environ.get('MPESA_CONSUMER_SECRET', 'p7SXCpuaHxIDY6lpIGqPLE1vqaEAbi0G8k1zgvUP2pqXuoWkvBofsq1zpItcrE7E')
@@ -123,6 +239,41 @@ MPESA_PHONE = os.environ.get('MPESA_PHONE', '254708374149')
 MPESA_ENV = os.environ.get('MPESA_ENV', 'sandbox')  # 'sandbox' or 'live'
 MPESA_CALLBACK_URL = os.environ.get('MPESA_CALLBACK_URL', f'{SITE_URL}/orders/mpesa-callback/')
 
+# Query Instrumentation
+# Per-request query count, DB time and slowest statements are logged on
+# 'crochet_shop.queries'. The totals can also be sent to the client as a
+# Server-Timing header; that exposes backend timings to anyone, so both
+# default to DEBUG and the header can stay off while logging is on.
+QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION', str(DEBUG)).lower() in ('true', '1', 'yes')
+QUERY_TIMING_HEADER = os.environ.get('QUERY_TIMING_HEADER', str(DEBUG)).lower() in ('true', '1', 'yes')
+QUERY_INSTRUMENTATION_SLOWEST = 3
+QUERY_BUDGET_WARNING = int(os.environ.get('QUERY_BUDGET_WARNING', 50))
 
+# Metrics
+# Every worker writes its samples to METRICS_DIR; /metrics merges them.
+# Scrapes must send "Authorization: Bearer <METRICS_TOKEN>"; with DEBUG off
+# and no token set, /metrics is disabled.
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'crochet_shop_metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
 
-
+# Logging Configuration
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'crochet_shop': {
+            'handlers': ['console'],
+            'level': os.environ.get('APP_LOG_LEVEL', 'WARNING'),
+        },
+        'orders': {
+            'handlers': ['console'],
+            'level': os.environ.get('ORDERS_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
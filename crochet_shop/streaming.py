@@ -0,0 +1,44 @@
+"""
+Helpers for streaming large CSV downloads row by row.
+
+Text cells that a spreadsheet would read as a formula are prefixed with a
+quote, since exports carry customer-entered names and addresses.
+"""
+import csv
+import re
+from itertools import chain
+
+from django.http import StreamingHttpResponse
+
+
+class Echo:
+    """File-like object whose write() returns the line instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+_NUMBER = re.compile(r'[-+]?\d+(\.\d+)?')
+
+
+def safe_cell(value):
+    """Neutralise spreadsheet formula injection in a text cell; numbers pass unchanged"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not _NUMBER.fullmatch(value):
+        return "'" + value
+    return value
+
+
+def csv_lines(header, rows):
+    """Yield the CSV header and then one encoded line per row, lazily"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([safe_cell(value) for value in row])
+
+
+def streaming_csv_response(filename, header, rows):
+    # The BOM makes Excel open the file as UTF-8 instead of the locale code page
+    response = StreamingHttpResponse(chain(['\ufeff'], csv_lines(header, rows)), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
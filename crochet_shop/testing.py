@@ -0,0 +1,59 @@
+"""
+Shared assertions for the app test suites.
+"""
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryPlanAssertionsMixin:
+    """Assert that a queryset is answered from an index rather than a table scan"""
+
+    # SQLite: "SCAN shop_product" is a full table scan, while
+    # "SCAN shop_product USING INDEX ..." walks an index in order.
+    SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(?P<table>\w+)')
+
+    def get_query_plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Empty test tables make a sequential scan look cheapest; take
+                # it off the table so the plan shows whether an index exists.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, tables=None):
+        plan = self.get_query_plan(queryset)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan, f'Sequential scan in plan:\n{plan}')
+            self.assertIn('Index', plan, f'No index used in plan:\n{plan}')
+            return
+
+        scans = [
+            match.group('table')
+            for line in plan.splitlines()
+            for match in [self.SQLITE_SCAN.search(line)]
+            if match and 'USING' not in line
+        ]
+        if tables is not None:
+            scans = [table for table in scans if table in tables]
+        self.assertFalse(scans, f'Full table scan of {", ".join(scans)} in plan:\n{plan}')
+        self.assertIn('INDEX', plan, f'No index used in plan:\n{plan}')
+
+
+class QueryBudgetMixin:
+    """Assert that rendering a URL stays within a fixed number of queries"""
+
+    def assertQueryBudget(self, budget, url, method='get', data=None, client=None):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(client, method)(url, data)
+        self.assertLess(response.status_code, 400, f'{url} returned {response.status_code}')
+
+        executed = len(context.captured_queries)
+        if executed > budget:
+            statements = '\n'.join(
+                f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f'{url} ran {executed} queries, budget is {budget}:\n{statements}')
+        return response
@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import metrics, replicas
+
+
+@override_settings(METRICS_TOKEN='scrape-token')
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.original_directory = metrics.registry.directory
+        metrics.registry.directory = self.directory
+        metrics.registry._reset()
+
+    def tearDown(self):
+        metrics.registry.directory = self.original_directory
+
+    def scrape(self):
+        return self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+
+    def test_histogram_quantile_interpolates_within_bucket(self):
+        buckets = [0] * len(metrics.BUCKETS)
+        buckets[metrics.BUCKETS.index(0.1)] = 100
+        self.assertAlmostEqual(metrics.histogram_quantile(0.5, buckets), 0.075)
+        self.assertIsNone(metrics.histogram_quantile(0.5, [0] * len(metrics.BUCKETS)))
+
+    def test_metrics_endpoint_merges_worker_snapshots(self):
+        self.client.get(reverse('shop:home'))
+
+        # Another worker's snapshot on disk
+        other = metrics.MetricsRegistry(self.directory)
+        other.inc('http_requests_total', {'route': '/', 'method': 'GET', 'status': '200'}, 4)
+        with open(os.path.join(self.directory, 'metrics-999999.json'), 'w') as f:
+            json.dump(other.snapshot(), f)
+
+        with metrics.timer('smtp', 'send_mail'):
+            pass
+
+        body = self.scrape()
+        self.assertIn('http_requests_total{method="GET",route="/",status="200"} 5', body)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/",le="+Inf"} 1', body)
+        self.assertIn('http_request_duration_seconds_quantile{method="GET",route="/",quantile="0.95"}', body)
+        self.assertIn('outbound_requests_total{operation="send_mail",outcome="ok",service="smtp"} 1', body)
+
+    def test_pool_stats_become_gauges_and_counters(self):
+        stats = {'pool_max': 4, 'pool_size': 3, 'pool_available': 1, 'requests_waiting': 2,
+                 'requests_num': 10, 'requests_queued': 3, 'requests_wait_ms': 1500}
+        metrics.record_pool_stats('default', stats)
+        metrics.record_pool_stats('default', {**stats, 'requests_waiting': 0})
+
+        # Gauges from a worker that has exited are dropped, its counters kept
+        other = metrics.MetricsRegistry(self.directory)
+        other.set('db_pool_checked_out', {'alias': 'default'}, 4)
+        other.inc('db_pool_requests_total', {'alias': 'default'}, 5)
+        with open(os.path.join(self.directory, 'metrics-999999.json'), 'w') as f:
+            json.dump(other.snapshot(), f)
+
+        body = self.scrape()
+        self.assertIn('# TYPE db_pool_checked_out gauge', body)
+        self.assertIn('db_pool_checked_out{alias="default"} 2', body)
+        self.assertIn('db_pool_requests_waiting{alias="default"} 0', body)
+        self.assertIn('db_pool_requests_total{alias="default"} 25', body)
+        self.assertIn('db_pool_wait_seconds_total{alias="default"} 3.0', body)
+
+    def test_exited_worker_snapshots_are_retired_into_totals(self):
+        other = metrics.MetricsRegistry(self.directory)
+        other.inc('outbound_requests_total', {'service': 'mpesa', 'operation': 'stk_push', 'outcome': 'ok'}, 3)
+        for pid in (999998, 999999):
+            with open(os.path.join(self.directory, f'metrics-{pid}.json'), 'w') as f:
+                json.dump(other.snapshot(), f)
+
+        self.assertIn('outbound_requests_total{operation="stk_push",outcome="ok",service="mpesa"} 6', self.scrape())
+        self.assertEqual(sorted(name for name in os.listdir(self.directory) if not name.startswith('.')),
+                         ['metrics-%d.json' % os.getpid(), 'retired.json'])
+        # Counted once, not again on every scrape
+        self.assertIn('outbound_requests_total{operation="stk_push",outcome="ok",service="mpesa"} 6', self.scrape())
+
+    def test_scrapes_need_the_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        for authorization in ('Bearer wrong-token', 'Bearer scrape-tokén'):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION=authorization).status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTestCase(TestCase):
+    """
+    A second SQLite database file stands in for the replica. Rows are put in
+    only one of the two databases so each response shows where it read from.
+    The replica alias only exists while this test case runs, so it joins
+    ``databases`` once it is configured.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.settings['replica'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.directory, 'replica.sqlite3')},
+        })['replica']
+        call_command('migrate', database='replica', verbosity=0)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        del cls.databases
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        from accounts.models import CustomUser
+        from shop.models import Category, Product
+
+        cache.clear()
+        for alias, name in (('default', 'Primary'), ('replica', 'Replica')):
+            category = Category.objects.using(alias).create(name=f'{name} Only', slug=f'{name.lower()}-only')
+            Product.objects.using(alias).bulk_create([
+                Product(category=category, name=f'{name} Scarf', slug=f'{name.lower()}-scarf', price=500),
+            ])
+        CustomUser.objects.create_user(email='amina@example.com', password='testpass123')
+
+    def searched(self):
+        response = self.client.get(reverse('shop:search'), {'q': 'Scarf'})
+        return [product.name for product in response.context['products']]
+
+    def test_read_only_views_use_replica_until_a_write(self):
+        self.assertEqual(self.searched(), ['Replica Scarf'])
+        # Views that are not marked read-only stay on the primary
+        response = self.client.get(reverse('shop:cart'))
+        self.assertEqual([category.slug for category in response.context['all_categories']], ['primary-only'])
+
+        response = self.client.post(reverse('accounts:login'), {'username': 'amina@example.com', 'password': 'testpass123'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.searched(), ['Primary Scarf'])
+
+        # Once the pin expires reads go back to the replica
+        del self.client.cookies[replicas.PIN_COOKIE]
+        self.assertEqual(self.searched(), ['Replica Scarf'])
+
+    @override_settings(SHARED_CACHE=True)
+    def test_cached_storefront_pages_render_from_primary(self):
+        # A lagging replica's page would otherwise be cached under the current catalog version
+        response = self.client.get(reverse('shop:category', args=['primary-only']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Storefront-Cache'], 'miss')
+        self.assertEqual(self.client.get(reverse('shop:category', args=['replica-only'])).status_code, 404)
+        # So does the navigation fragment every page shares
+        response = self.client.get(reverse('shop:search'), {'q': 'Scarf'})
+        self.assertEqual([category.slug for category in response.context['all_categories']], ['primary-only'])
+
+    def test_instances_read_from_replica_save_to_primary(self):
+        from shop.models import Category
+
+        category = Category.objects.using('replica').get(slug='replica-only')
+        category.name = 'Renamed'
+        category.save()
+        self.assertEqual(category._state.db, 'default')
+        self.assertTrue(Category.objects.filter(slug='replica-only', name='Renamed').exists())
+        self.assertEqual(Category.objects.using('replica').get(slug='replica-only').name, 'Replica Only')
@@ -2,13 +2,16 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from crochet_shop.metrics import metrics_view
 
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('accounts/', include('accounts.urls')),
     path('chat/', include('chat.urls')),
     path('', include('shop.urls')),
     path('orders/', include('orders.urls')),
+    path('analytics/', include('analytics.urls')),
 ]
 
 if settings.DEBUG:
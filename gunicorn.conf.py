@@ -0,0 +1,17 @@
+"""
+Gunicorn settings. Worker and thread counts come from the same environment
+variables settings.py uses to size each worker's database pool.
+"""
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+
+
+def worker_exit(server, worker):
+    # Close pooled connections cleanly instead of leaving them to the server's timeout
+    from django.db import connections
+
+    for connection in connections.all():
+        if connection.settings_dict['OPTIONS'].get('pool'):
+            connection.close_pool()
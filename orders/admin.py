@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Order, OrderItem, OrderStatusHistory, DeliveryConfirmation, Notification
+from .models import ArchivedNotification, DeliveryZone, Order, OrderItem, OrderStatusHistory, DeliveryConfirmation, Notification, SellerOrder
+from .state_machine import transition
 
 
 class OrderItemInline(admin.TabularInline):
@@ -11,6 +12,13 @@ class OrderItemInline(admin.TabularInline):
         return obj.subtotal
 
 
+class SellerOrderInline(admin.TabularInline):
+    model = SellerOrder
+    extra = 0
+    readonly_fields = ['seller', 'status', 'subtotal', 'updated_at']
+    can_delete = False
+
+
 class OrderStatusHistoryInline(admin.TabularInline):
     model = OrderStatusHistory
     extra = 1
@@ -19,11 +27,11 @@ class OrderStatusHistoryInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['order_code', 'customer_name', 'customer_phone', 'total_amount', 'status', 'created_at']
-    list_filter = ['status', 'created_at']
+    list_display = ['order_code', 'customer_name', 'customer_phone', 'total_amount', 'delivery_zone', 'status', 'created_at']
+    list_filter = ['status', 'delivery_zone', 'created_at']
     search_fields = ['order_code', 'customer_name', 'customer_phone', 'customer_email']
-    readonly_fields = ['order_code', 'total_amount', 'created_at', 'updated_at']
-    inlines = [OrderItemInline, OrderStatusHistoryInline]
+    readonly_fields = ['order_code', 'total_amount', 'delivery_fee', 'created_at', 'updated_at']
+    inlines = [SellerOrderInline, OrderItemInline, OrderStatusHistoryInline]
     
     fieldsets = (
         ('Order Info', {
@@ -32,6 +40,9 @@ class OrderAdmin(admin.ModelAdmin):
         ('Customer Info', {
             'fields': ('customer_name', 'customer_phone', 'customer_email', 'customer_address')
         }),
+        ('Delivery', {
+            'fields': ('customer_latitude', 'customer_longitude', 'delivery_zone', 'delivery_fee')
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -40,14 +51,24 @@ class OrderAdmin(admin.ModelAdmin):
     
     def save_model(self, request, obj, form, change):
         if change and 'status' in form.changed_data:
-            OrderStatusHistory.objects.create(
-                order=obj,
-                status=obj.status,
-                note=f'Status updated to {obj.get_status_display()}'
-            )
+            # Save the other fields first, then move the status through the state machine.
+            # Admins may override the transition table to correct mistakes.
+            new_status = obj.status
+            obj.status = form.initial['status']
+            super().save_model(request, obj, form, change)
+            transition(obj, new_status, note=f'Status updated to {dict(Order.STATUS_CHOICES)[new_status]} by admin', force=True)
+            return
         super().save_model(request, obj, form, change)
 
 
+@admin.register(DeliveryZone)
+class DeliveryZoneAdmin(admin.ModelAdmin):
+    list_display = ['name', 'shape', 'radius_km', 'base_fee', 'fee_per_km', 'priority', 'active']
+    list_filter = ['shape', 'active']
+    list_editable = ['priority', 'active']
+    search_fields = ['name']
+
+
 @admin.register(DeliveryConfirmation)
 class DeliveryConfirmationAdmin(admin.ModelAdmin):
     list_display = ['order', 'customer_confirmed', 'confirmed_at']
@@ -63,6 +84,14 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ['title', 'message', 'user__email']
     readonly_fields = ['created_at']
 
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['title', 'user', 'notification_type', 'created_at', 'archived_at']
+    list_filter = ['notification_type', 'archived_at']
+    search_fields = ['title', 'user__email']
+    readonly_fields = ['archived_at']
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product_name', 'product_price', 'quantity']
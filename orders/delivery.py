@@ -0,0 +1,176 @@
+"""
+Delivery zones and fees.
+
+Active zones are loaded into a ZoneIndex: a uniform latitude/longitude grid
+mapping each cell to the zones whose bounding box touches it, so locating a
+point tests only the few zones registered in its cell. Each process keeps
+its index and at most every ZONES_CHECK_SECONDS compares it with the zones
+table (latest updated_at and row count), rebuilding it when they differ, so
+every worker picks up a zone edit within a few seconds. The worker that saved
+the zone checks on its next lookup (see orders/signals.py).
+"""
+import math
+import time
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Count, Max
+
+from .models import DeliveryZone, Order
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+CELL_DEGREES = 0.05  # about 5.5 km
+MAX_CELLS_PER_ZONE = 10000
+ZONES_CHECK_SECONDS = 5
+ASSIGN_BATCH_SIZE = 2000
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _in_polygon(lat, lng, points):
+    """Ray casting; ``points`` are (lat, lng) pairs"""
+    inside = False
+    j = len(points) - 1
+    for i in range(len(points)):
+        (lat_i, lng_i), (lat_j, lng_j) = points[i], points[j]
+        if (lng_i > lng) != (lng_j > lng) and lat < (lat_j - lat_i) * (lng - lng_i) / (lng_j - lng_i) + lat_i:
+            inside = not inside
+        j = i
+    return inside
+
+
+class _Shape:
+    """A zone with its geometry as floats and its bounding box"""
+
+    def __init__(self, zone):
+        self.zone = zone
+        self.lat, self.lng = float(zone.center_latitude), float(zone.center_longitude)
+        if zone.shape == 'polygon':
+            self.points = [(float(lat), float(lng)) for lat, lng in zone.polygon]
+            lats, lngs = zip(*self.points)
+            self.bounds = (min(lats), min(lngs), max(lats), max(lngs))
+        else:
+            self.radius = float(zone.radius_km)
+            dlat = self.radius / KM_PER_DEGREE
+            dlng = self.radius / (KM_PER_DEGREE * max(math.cos(math.radians(self.lat)), 0.01))
+            self.bounds = (self.lat - dlat, self.lng - dlng, self.lat + dlat, self.lng + dlng)
+
+    def distance_km(self, lat, lng):
+        return haversine_km(self.lat, self.lng, lat, lng)
+
+    def contains(self, lat, lng):
+        south, west, north, east = self.bounds
+        if not (south <= lat <= north and west <= lng <= east):
+            return False
+        if self.zone.shape == 'polygon':
+            return _in_polygon(lat, lng, self.points)
+        return self.distance_km(lat, lng) <= self.radius
+
+
+class ZoneIndex:
+    def __init__(self, zones, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.cells = defaultdict(list)
+        # Zones too big to register cell by cell are checked for every point
+        self.wide = []
+        for zone in zones:
+            shape = _Shape(zone)
+            (row0, col0), (row1, col1) = self._cell(*shape.bounds[:2]), self._cell(*shape.bounds[2:])
+            if (row1 - row0 + 1) * (col1 - col0 + 1) > MAX_CELLS_PER_ZONE:
+                self.wide.append(shape)
+                continue
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    self.cells[row, col].append(shape)
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def locate(self, lat, lng):
+        """(zone, km from its centre) for the best zone containing the point, or (None, None)"""
+        lat, lng = float(lat), float(lng)
+        matches = [shape for shape in self.cells.get(self._cell(lat, lng), []) + self.wide if shape.contains(lat, lng)]
+        if not matches:
+            return None, None
+        # Highest priority, then the closest centre
+        best = max(matches, key=lambda shape: (shape.zone.priority, -shape.distance_km(lat, lng)))
+        return best.zone, best.distance_km(lat, lng)
+
+
+_index = (None, None)
+_checked_at = -math.inf
+
+
+def zones_version():
+    """Changes whenever a zone is created, edited or deleted"""
+    state = DeliveryZone.objects.aggregate(updated_at=Max('updated_at'), count=Count('pk'))
+    return state['updated_at'], state['count']
+
+
+def get_zone_index():
+    """This process's index of active zones, rebuilt after any zone changes"""
+    global _index, _checked_at
+    now = time.monotonic()
+    if _index[1] is None or now - _checked_at >= ZONES_CHECK_SECONDS:
+        _checked_at = now
+        version = zones_version()
+        if _index[0] != version:
+            _index = (version, ZoneIndex(DeliveryZone.objects.filter(active=True)))
+    return _index[1]
+
+
+def zones_changed():
+    """Compare with the database on this process's next lookup"""
+    global _checked_at
+    _checked_at = -math.inf
+
+
+def delivery_fee(zone, distance_km):
+    fee = zone.base_fee + zone.fee_per_km * Decimal(str(distance_km))
+    return fee.quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+
+
+def quote(latitude, longitude):
+    """(zone, fee) for delivering to the coordinates; (None, 0) outside every zone"""
+    if latitude is None or longitude is None:
+        return None, Decimal('0')
+    zone, distance = get_zone_index().locate(latitude, longitude)
+    if zone is None:
+        return None, Decimal('0')
+    return zone, delivery_fee(zone, distance)
+
+
+def assign_zones(reassign=False, batch_size=ASSIGN_BATCH_SIZE):
+    """
+    Set delivery_zone on orders placed with coordinates, in keyset batches.
+    Fees already charged are left alone. Returns (orders checked, orders assigned).
+    """
+    index = get_zone_index()
+    orders = Order.objects.filter(customer_latitude__isnull=False, customer_longitude__isnull=False)
+    if not reassign:
+        orders = orders.filter(delivery_zone__isnull=True)
+    checked = assigned = 0
+    last_pk = 0
+    while True:
+        rows = list(
+            orders.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'customer_latitude', 'customer_longitude', 'delivery_zone_id')[:batch_size]
+        )
+        if not rows:
+            return checked, assigned
+        last_pk = rows[-1][0]
+        checked += len(rows)
+        changed = []
+        for pk, lat, lng, zone_id in rows:
+            zone, _ = index.locate(lat, lng)
+            if zone is not None and zone.pk != zone_id:
+                changed.append(Order(pk=pk, delivery_zone=zone))
+            elif zone is None and zone_id is not None:
+                changed.append(Order(pk=pk, delivery_zone=None))
+        Order.objects.bulk_update(changed, ['delivery_zone'])
+        assigned += sum(1 for order in changed if order.delivery_zone_id)
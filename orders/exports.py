@@ -0,0 +1,107 @@
+"""
+Streaming CSV exports of orders (admins) and sales (sellers).
+
+Rows come from a single ``values_list`` query read with ``.iterator()`` so
+memory stays flat however many orders match, and the header is sent before
+the query runs so the download starts immediately.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Order, OrderItem
+
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = [
+    ('Order code', 'order_code'),
+    ('Created', 'created_at'),
+    ('Status', 'status'),
+    ('Customer', 'customer_name'),
+    ('Email', 'customer_email'),
+    ('Phone', 'customer_phone'),
+    ('Order total', 'total_amount'),
+    ('Payment status', 'payment__status'),
+    ('Deposit', 'payment__deposit_amount'),
+    ('Deposit paid', 'payment__deposit_paid'),
+    ('M-PESA receipt', 'payment__deposit_transaction_id'),
+    ('Balance', 'payment__balance_amount'),
+    ('Balance paid', 'payment__balance_paid'),
+    ('Product', 'items__product_name'),
+    ('Color', 'items__color'),
+    ('Size', 'items__size'),
+    ('Quantity', 'items__quantity'),
+    ('Unit price', 'items__product_price'),
+]
+
+SALES_COLUMNS = [
+    ('Order code', 'order__order_code'),
+    ('Created', 'order__created_at'),
+    ('Status', 'order__status'),
+    ('Customer', 'order__customer_name'),
+    ('Product', 'product_name'),
+    ('Color', 'color'),
+    ('Size', 'size'),
+    ('Quantity', 'quantity'),
+    ('Unit price', 'product_price'),
+    ('Subtotal', 'subtotal'),
+]
+
+
+def _day_start(value, name):
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_orders(queryset, params, prefix=''):
+    """
+    Apply ``status``, ``date_from`` and ``date_to`` (inclusive) query parameters.
+    ``prefix`` points at the order from a related model, e.g. ``'order__'``.
+    Raises ValueError for values that cannot be parsed.
+    """
+    status = params.get('status')
+    if status:
+        if status not in dict(Order.STATUS_CHOICES):
+            raise ValueError(f'Unknown status "{status}"')
+        queryset = queryset.filter(**{f'{prefix}status': status})
+    if params.get('date_from'):
+        queryset = queryset.filter(**{f'{prefix}created_at__gte': _day_start(params['date_from'], 'date_from')})
+    if params.get('date_to'):
+        # Compare against the next midnight rather than __date so the created_at index stays usable
+        end = _day_start(params['date_to'], 'date_to') + timedelta(days=1)
+        queryset = queryset.filter(**{f'{prefix}created_at__lt': end})
+    return queryset
+
+
+def _format(value):
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if isinstance(value, Decimal):
+        return f'{value:.2f}'
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+    return '' if value is None else value
+
+
+def _rows(queryset, fields):
+    for values in queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [_format(value) for value in values]
+
+
+def order_export(params):
+    """Header and lazy rows for every order line (one row per item) with its payment"""
+    orders = filter_orders(Order.objects.all(), params).order_by('-created_at', '-pk', 'items__id')
+    return [label for label, _ in ORDER_COLUMNS], _rows(orders, [field for _, field in ORDER_COLUMNS])
+
+
+def sales_export(seller, params):
+    """Header and lazy rows for each item of the seller's products that was ordered"""
+    items = filter_orders(OrderItem.objects.filter(product__seller=seller), params, prefix='order__').annotate(
+        subtotal=ExpressionWrapper(F('product_price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+    ).order_by('-order__created_at', '-order_id', 'pk')
+    return [label for label, _ in SALES_COLUMNS], _rows(items, [field for _, field in SALES_COLUMNS])
@@ -0,0 +1,37 @@
+"""
+Per-seller fulfilment groups.
+
+Checkout splits an order into one SellerOrder per seller, so seller pages
+look up their own groups directly instead of joining through
+OrderItem -> Product, and each seller's part of the order moves through the
+state machine on its own.
+"""
+from collections import defaultdict
+
+from .models import OrderItem, SellerOrder
+
+
+def split_order(order, items):
+    """Create one group per seller for ``order`` and save the unsaved ``items`` into them"""
+    by_seller = defaultdict(list)
+    for item in items:
+        by_seller[item.product.seller_id if item.product else None].append(item)
+
+    groups = SellerOrder.objects.bulk_create([
+        SellerOrder(order=order, seller_id=seller_id, status=order.status,
+                    subtotal=sum(item.subtotal for item in seller_items))
+        for seller_id, seller_items in by_seller.items()
+    ])
+    for group, seller_items in zip(groups, by_seller.values()):
+        for item in seller_items:
+            item.order = order
+            item.seller_order = group
+    OrderItem.objects.bulk_create(items)
+    return groups
+
+
+def seller_order_for(order, user):
+    """The user's group in ``order``, or None if they sell nothing in it"""
+    if not user.is_authenticated:
+        return None
+    return order.seller_orders.filter(seller=user).first()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.delivery import ASSIGN_BATCH_SIZE, assign_zones
+
+
+class Command(BaseCommand):
+    help = 'Assign delivery zones to orders placed with coordinates, e.g. after adding or redrawing zones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reassign', action='store_true',
+                            help='Recheck orders that already have a zone, not only unassigned ones')
+        parser.add_argument('--batch-size', type=int, default=ASSIGN_BATCH_SIZE,
+                            help=f'Number of orders handled per batch (default: {ASSIGN_BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        # Only the zone link changes; delivery fees already charged stay as they were
+        checked, assigned = assign_zones(reassign=options['reassign'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Checked {checked} orders, assigned a zone to {assigned}'))
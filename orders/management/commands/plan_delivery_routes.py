@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.routing import plan_routes
+
+
+class Command(BaseCommand):
+    help = "Print a visiting order for a seller's on-the-way orders, one route per delivery zone"
+
+    def add_arguments(self, parser):
+        parser.add_argument('seller', help='Email of the seller')
+        parser.add_argument('--start', default='',
+                            help='Starting point as --start=latitude,longitude (default: the edge of each zone)')
+
+    def handle(self, *args, **options):
+        seller = get_user_model().objects.filter(email=options['seller'], user_type='seller').first()
+        if seller is None:
+            raise CommandError(f'No seller with email {options["seller"]}')
+        start = None
+        if options['start']:
+            try:
+                start = tuple(float(part) for part in options['start'].split(','))
+            except ValueError:
+                start = ()
+            if len(start) != 2:
+                raise CommandError('--start must be "latitude,longitude"')
+
+        routes, unrouted = plan_routes(seller, start)
+        for route in routes:
+            name = route.zone.name if route.zone else 'No delivery zone'
+            self.stdout.write(f'{name}: {len(route.stops)} stops, {route.distance_km:.1f} km')
+            for number, seller_order in enumerate(route.stops, 1):
+                order = seller_order.order
+                self.stdout.write(
+                    f'  {number:>3}. {order.order_code}  {order.customer_latitude},{order.customer_longitude}  '
+                    f'{order.customer_name}, {" ".join(order.customer_address.split())}'
+                )
+        if unrouted:
+            self.stdout.write(self.style.WARNING(
+                f'Without a location: {", ".join(seller_order.order.order_code for seller_order in unrouted)}'
+            ))
+        stops = sum(len(route.stops) for route in routes)
+        self.stdout.write(self.style.SUCCESS(f'✅ Planned {len(routes)} routes over {stops} stops'))
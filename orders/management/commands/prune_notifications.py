@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import ArchivedNotification, Notification
+
+ARCHIVED_FIELDS = ['pk', 'user_id', 'notification_type', 'title', 'message', 'order_id', 'count', 'created_at']
+
+
+class Command(BaseCommand):
+    help = 'Delete (or archive) read notifications older than the retention period in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help=f'Keep read notifications this many days (default: {settings.NOTIFICATION_RETENTION_DAYS})')
+        parser.add_argument('--archive', action='store_true',
+                            help='Copy rows into the archive table before deleting them')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of notifications handled per batch (default: 1000)')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches (default: 0)')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        batch_size = options['batch_size']
+        pause = options['sleep']
+        max_batches = options['max_batches']
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        # Unread notifications are never pruned. Each batch is found through the
+        # partial (created_at WHERE is_read) index and removed by primary key in
+        # its own short transaction.
+        expired = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('created_at')
+
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            with transaction.atomic():
+                rows = list(expired.values_list(*ARCHIVED_FIELDS)[:batch_size])
+                if not rows:
+                    break
+                if options['archive']:
+                    ArchivedNotification.objects.bulk_create([
+                        ArchivedNotification(**dict(zip(ARCHIVED_FIELDS[1:], row[1:]))) for row in rows
+                    ])
+                deleted, _ = Notification.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+            total += deleted
+            batches += 1
+            self.stdout.write(f'  Batch {batches}: {"archived" if options["archive"] else "deleted"} {deleted} notifications')
+
+            if len(rows) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+
+        action = 'Archived' if options['archive'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'✅ {action} {total} read notifications older than {options["days"]} days'))
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+# Statuses written by older code that are not in Order.STATUS_CHOICES
+LEGACY_STATUSES = {
+    'payment_confirmed': 'processing',
+    'shipped': 'on_the_way',
+    'payment_failed': 'pending',
+}
+
+
+def normalize_statuses(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    for old, new in LEGACY_STATUSES.items():
+        Order.objects.filter(status=old).update(status=new)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_statuses, migrations.RunPython.noop),
+    ]
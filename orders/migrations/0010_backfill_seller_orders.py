@@ -0,0 +1,69 @@
+from django.db import migrations
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+
+BATCH_SIZE = 2000
+
+
+def backfill_seller_orders(apps, schema_editor):
+    """One group per (order, seller) carrying the order's current status"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    SellerOrder = apps.get_model('orders', 'SellerOrder')
+
+    line_total = ExpressionWrapper(F('product_price') * F('quantity'), output_field=DecimalField(max_digits=10, decimal_places=2))
+    groups = (
+        OrderItem.objects.filter(seller_order__isnull=True)
+        .values('order_id', 'order__status', 'product__seller_id')
+        .annotate(subtotal=Sum(line_total))
+        .order_by('order_id')
+    )
+    batch = []
+    for group in groups.iterator(chunk_size=BATCH_SIZE):
+        batch.append(SellerOrder(
+            order_id=group['order_id'], seller_id=group['product__seller_id'],
+            status=group['order__status'], subtotal=group['subtotal'] or 0,
+        ))
+        if len(batch) >= BATCH_SIZE:
+            SellerOrder.objects.bulk_create(batch)
+            batch = []
+    SellerOrder.objects.bulk_create(batch)
+
+    # auto_now_add stamped the migration time; keep the groups in order date order
+    SellerOrder.objects.update(created_at=Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('created_at')[:1]))
+
+    # Keyset pages rather than a cursor, since the rows being read are also being updated
+    last_pk = 0
+    while True:
+        items = list(
+            OrderItem.objects.filter(pk__gt=last_pk, seller_order__isnull=True).order_by('pk')
+            .values_list('pk', 'order_id', 'product__seller_id')[:BATCH_SIZE]
+        )
+        if not items:
+            break
+        last_pk = items[-1][0]
+        group_ids = {
+            (order_id, seller_id): pk for pk, order_id, seller_id in SellerOrder.objects.filter(
+                order_id__in={order_id for _, order_id, _ in items}
+            ).values_list('pk', 'order_id', 'seller_id')
+        }
+        OrderItem.objects.bulk_update(
+            [OrderItem(pk=pk, seller_order_id=group_ids[order_id, seller_id]) for pk, order_id, seller_id in items],
+            ['seller_order'],
+        )
+
+
+def remove_seller_orders(apps, schema_editor):
+    apps.get_model('orders', 'OrderItem').objects.update(seller_order=None)
+    apps.get_model('orders', 'OrderStatusHistory').objects.update(seller_order=None)
+    apps.get_model('orders', 'SellerOrder').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_seller_orders'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_seller_orders, remove_seller_orders),
+    ]
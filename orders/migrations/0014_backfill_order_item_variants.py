@@ -0,0 +1,50 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def backfill_order_item_variants(apps, schema_editor):
+    """Point existing items at the variant matching their color and size, or the product's only variant"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    ProductVariant = apps.get_model('shop', 'ProductVariant')
+
+    last_pk = 0
+    while True:
+        items = list(
+            OrderItem.objects.filter(pk__gt=last_pk, product__isnull=False).order_by('pk')
+            .values_list('pk', 'product_id', 'color', 'size')[:BATCH_SIZE]
+        )
+        if not items:
+            break
+        last_pk = items[-1][0]
+        variants = {}
+        by_product = {}
+        for pk, product_id, color, size in ProductVariant.objects.filter(
+            product_id__in={product_id for _, product_id, _, _ in items}
+        ).values_list('pk', 'product_id', 'color', 'size'):
+            variants[product_id, color, size] = pk
+            by_product.setdefault(product_id, []).append(pk)
+        updates = []
+        for pk, product_id, color, size in items:
+            variant_id = variants.get((product_id, color, size))
+            if variant_id is None and len(by_product.get(product_id, [])) == 1:
+                variant_id = by_product[product_id][0]
+            if variant_id:
+                updates.append(OrderItem(pk=pk, variant_id=variant_id))
+        OrderItem.objects.bulk_update(updates, ['variant'])
+
+
+def clear_order_item_variants(apps, schema_editor):
+    apps.get_model('orders', 'OrderItem').objects.update(variant=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_order_item_variant'),
+        ('shop', '0008_backfill_product_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_item_variants, clear_order_item_variants),
+    ]
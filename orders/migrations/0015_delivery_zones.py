@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_backfill_order_item_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryZone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('shape', models.CharField(choices=[('radius', 'Radius'), ('polygon', 'Polygon')], default='radius', max_length=10)),
+                ('center_latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('center_longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('radius_km', models.DecimalField(blank=True, decimal_places=2, max_digits=7, null=True)),
+                ('polygon', models.JSONField(blank=True, default=list, help_text='[[latitude, longitude], ...] for polygon zones')),
+                ('base_fee', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('fee_per_km', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('priority', models.IntegerField(default=0, help_text='Higher wins where zones overlap')),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-priority', 'name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_fee',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_zone',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='orders.deliveryzone'),
+        ),
+    ]
@@ -1,13 +1,60 @@
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from shop.models import Product
+from shop.models import Product, ProductVariant
 import random
 import string
 
 User = get_user_model()
 
 
+class DeliveryZone(models.Model):
+    """
+    An area orders are delivered to: a circle of ``radius_km`` around the
+    centre, or a polygon of [latitude, longitude] points. The delivery fee is
+    ``base_fee`` plus ``fee_per_km`` for each km between the centre and the
+    customer. Where zones overlap the highest ``priority`` wins.
+    """
+    SHAPE_CHOICES = [
+        ('radius', 'Radius'),
+        ('polygon', 'Polygon'),
+    ]
+
+    name = models.CharField(max_length=100)
+    shape = models.CharField(max_length=10, choices=SHAPE_CHOICES, default='radius')
+    center_latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    center_longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    radius_km = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    polygon = models.JSONField(default=list, blank=True, help_text='[[latitude, longitude], ...] for polygon zones')
+    base_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    fee_per_km = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    priority = models.IntegerField(default=0, help_text='Higher wins where zones overlap')
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-priority', 'name']
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.shape == 'radius' and not self.radius_km:
+            raise ValidationError({'radius_km': 'Radius zones need a radius.'})
+        if self.shape == 'polygon':
+            points = self.polygon if isinstance(self.polygon, list) else []
+            valid = all(
+                isinstance(point, (list, tuple)) and len(point) == 2
+                and all(isinstance(value, (int, float)) for value in point)
+                and -90 <= point[0] <= 90 and -180 <= point[1] <= 180
+                for point in points
+            )
+            if len(points) < 3 or not valid:
+                raise ValidationError({'polygon': 'Enter at least three [latitude, longitude] points.'})
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -26,6 +73,8 @@ class Order(models.Model):
     customer_address = models.TextField()
     customer_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     customer_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    delivery_zone = models.ForeignKey(DeliveryZone, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    delivery_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     delivery_notes = models.TextField(blank=True)
@@ -34,6 +83,11 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Covering on PostgreSQL so dashboard counts and recent-order lists skip the heap
+            models.Index(fields=['status', '-created_at'], name='order_status_idx', include=['order_code', 'total_amount']),
+            models.Index(fields=['customer_email', '-created_at'], name='order_customer_email_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.order_code}"
@@ -58,9 +112,34 @@ class Order(models.Model):
             return 0
 
 
+class SellerOrder(models.Model):
+    """The part of an order one seller fulfils; each seller's status advances on its own"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='seller_orders')
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='seller_orders')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, default='pending')
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'seller'], name='unique_seller_order'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', '-created_at'], name='seller_order_seller_idx'),
+            models.Index(fields=['seller', 'status', '-created_at'], name='seller_order_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order.order_code} - {self.seller.email if self.seller else 'no seller'}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    seller_order = models.ForeignKey(SellerOrder, on_delete=models.SET_NULL, null=True, blank=True, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
+    variant = models.ForeignKey(ProductVariant, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_items')
     product_name = models.CharField(max_length=200)
     product_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
@@ -77,6 +156,8 @@ class OrderItem(models.Model):
 
 class OrderStatusHistory(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history')
+    # Set when one seller's part of the order changed rather than the whole order
+    seller_order = models.ForeignKey(SellerOrder, on_delete=models.SET_NULL, null=True, blank=True, related_name='status_history')
     status = models.CharField(max_length=20)
     note = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -119,7 +200,7 @@ class Payment(models.Model):
     balance_transaction_id = models.CharField(max_length=100, blank=True)
     
     # M-PESA fields
-    checkout_request_id = models.CharField(max_length=100, blank=True)
+    checkout_request_id = models.CharField(max_length=100, blank=True, db_index=True)
     
     # Payment status
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
@@ -193,11 +274,42 @@ class Notification(models.Model):
     title = models.CharField(max_length=255)
     message = models.TextField()
     order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    # Unread notifications sharing a key (e.g. one conversation) are merged instead of piling up
+    group_key = models.CharField(max_length=100, blank=True)
+    count = models.PositiveIntegerField(default=1)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notification_user_idx'),
+            # Small partial index backing the unread badge count on every page
+            models.Index(fields=['user'], name='notification_unread_idx', condition=models.Q(is_read=False)),
+            # Lets the retention command find old read rows without scanning the table
+            models.Index(fields=['created_at'], name='notification_read_idx', condition=models.Q(is_read=True)),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} - {self.user.email}"
+
+
+class ArchivedNotification(models.Model):
+    """Read notifications moved out of the hot table by `prune_notifications --archive`"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archived_notification_user_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user.email}"
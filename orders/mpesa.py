@@ -1,8 +1,12 @@
 import requests
 import json
+import logging
 from django.conf import settings
 from datetime import datetime
 from base64 import b64encode
+from crochet_shop.metrics import timer
+
+logger = logging.getLogger(__name__)
 
 
 class MpesaClient:
@@ -27,19 +31,19 @@ class MpesaClient:
         url = f'{self.base_url}/oauth/v1/generate?grant_type=client_credentials'
         
         try:
-            response = requests.get(
-                url,
-                auth=(self.consumer_key, self.consumer_secret),
-                timeout=5
-            )
-            response.raise_for_status()
+            with timer('mpesa', 'oauth'):
+                response = requests.get(
+                    url,
+                    auth=(self.consumer_key, self.consumer_secret),
+                    timeout=5
+                )
+                response.raise_for_status()
             return response.json()['access_token']
         except requests.exceptions.HTTPError as e:
-            print(f"Daraja OAuth Error: Status {e.response.status_code}")
-            print(f"Response: {e.response.text}")
+            logger.error("Daraja OAuth error: status %s, response %s", e.response.status_code, e.response.text)
             return None
         except Exception as e:
-            print(f"Error getting access token: {str(e)}")
+            logger.error("Error getting M-PESA access token: %s", e)
             return None
     
     def initiate_stk_push(self, phone_number, amount, order_code, account_reference='Great Below'):
@@ -93,16 +97,17 @@ class MpesaClient:
         }
         
         # Log the request for debugging
-        print(f"M-PESA Request: {json.dumps(payload, indent=2)}")
+        logger.debug("M-PESA request: %s", json.dumps(payload))
         
         try:
-            response = requests.post(
-                url,
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
-            response.raise_for_status()
+            with timer('mpesa', 'stk_push'):
+                response = requests.post(
+                    url,
+                    json=payload,
+                    headers=headers,
+                    timeout=10
+                )
+                response.raise_for_status()
             result = response.json()
             
             if result.get('ResponseCode') == '0':
@@ -125,10 +130,10 @@ class MpesaClient:
                 error_msg = error_data.get('errorMessage', error_data.get('error_description', str(e)))
             except:
                 error_msg = e.response.text if hasattr(e, 'response') else str(e)
-            print(f"M-PESA HTTP Error: {error_msg}")
+            logger.error("M-PESA HTTP error: %s", error_msg)
             return {'success': False, 'error': f'HTTP Error: {error_msg}'}
         except Exception as e:
-            print(f"M-PESA Exception: {str(e)}")
+            logger.exception("M-PESA STK push failed")
             return {'success': False, 'error': f'Request failed: {str(e)}'}
     
     def check_transaction_status(self, checkout_request_id):
@@ -156,13 +161,14 @@ class MpesaClient:
         }
         
         try:
-            response = requests.post(
-                url,
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
-            response.raise_for_status()
+            with timer('mpesa', 'stk_query'):
+                response = requests.post(
+                    url,
+                    json=payload,
+                    headers=headers,
+                    timeout=10
+                )
+                response.raise_for_status()
             return response.json()
         except Exception as e:
             return {'success': False, 'error': f'Request failed: {str(e)}'}
@@ -1,156 +1,172 @@
-from django.core.mail import send_mail
+import logging
+from datetime import timedelta
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
+from crochet_shop.metrics import timer
+from .models import Notification
 
+logger = logging.getLogger(__name__)
 
-def send_notification_email(notification):
+# Repeated notifications of these types are merged while unread
+COALESCED_TYPES = {'message'}
+COALESCE_WINDOW = timedelta(minutes=10)
+
+
+# Email subject and templates based on notification type
+EMAIL_TEMPLATES = {
+    'order_placed': {
+        'subject': '✅ Order Placed Successfully',
+        'template': 'emails/order_placed.html',
+    },
+    'order_confirmed': {
+        'subject': '📦 Your Order Has Been Confirmed',
+        'template': 'emails/order_confirmed.html',
+    },
+    'order_shipped': {
+        'subject': '🚚 Your Order is On The Way',
+        'template': 'emails/order_shipped.html',
+    },
+    'order_delivered': {
+        'subject': '📬 Your Order Has Been Delivered',
+        'template': 'emails/order_delivered.html',
+    },
+    'delivery_pending': {
+        'subject': '✋ Customer Confirmed Delivery',
+        'template': 'emails/delivery_confirmed.html',
+    },
+    'review_request': {
+        'subject': '⭐ You Received a New Review',
+        'template': 'emails/review_received.html',
+    },
+    'message': {
+        'subject': '💬 New Message From a Customer',
+        'template': 'emails/new_message.html',
+    },
+    'system': {
+        'subject': '📢 Important Notification',
+        'template': 'emails/system_notification.html',
+    },
+}
+
+
+def build_notification_email(notification, connection=None, template=None, subject=None, context=None):
     """
-    Send email notification to user based on notification type
+    Render the email for a notification, or return None if there is nothing to
+    send. ``template``, ``subject`` and ``context`` override the defaults for
+    the notification type.
     """
     user = notification.user
+    email_info = EMAIL_TEMPLATES.get(notification.notification_type)
+    if not user.email or not user.email_notifications or not (email_info or template):
+        return None
     
-    if not user.email:
-        return False
-    
-    # Email subject and templates based on notification type
-    email_templates = {
-        'order_placed': {
-            'subject': '✅ Order Placed Successfully',
-            'template': 'emails/order_placed.html',
-        },
-        'order_confirmed': {
-            'subject': '📦 Your Order Has Been Confirmed',
-            'template': 'emails/order_confirmed.html',
-        },
-        'order_shipped': {
-            'subject': '🚚 Your Order is On The Way',
-            'template': 'emails/order_shipped.html',
-        },
-        'order_delivered': {
-            'subject': '📬 Your Order Has Been Delivered',
-            'template': 'emails/order_delivered.html',
-        },
-        'delivery_pending': {
-            'subject': '✋ Customer Confirmed Delivery',
-            'template': 'emails/delivery_confirmed.html',
-        },
-        'review_request': {
-            'subject': '⭐ You Received a New Review',
-            'template': 'emails/review_received.html',
-        },
-        'message': {
-            'subject': '💬 New Message From a Customer',
-            'template': 'emails/new_message.html',
-        },
-        'system': {
-            'subject': '📢 Important Notification',
-            'template': 'emails/system_notification.html',
-        },
+    # Prepare context for email template
+    order = notification.order
+    email_context = {
+        'user': user,
+        'notification': notification,
+        'order': order,
+        'order_link': f"{settings.SITE_URL}{reverse('orders:order_status', args=[order.order_code])}" if order else None,
+        'site_url': settings.SITE_URL,
+        **(context or {}),
     }
     
-    email_info = email_templates.get(notification.notification_type)
-    if not email_info:
-        return False
-    
-    try:
-        # Prepare context for email template
-        context = {
-            'user': user,
-            'notification': notification,
-            'order': notification.order,
-            'order_link': f"{settings.SITE_URL}/orders/{notification.order.order_code}/status/" if notification.order else None,
-        }
-        
-        # Render HTML email
-        html_message = render_to_string(email_info['template'], context)
-        plain_message = strip_tags(html_message)
-        
-        # Send email
-        send_mail(
-            subject=email_info['subject'],
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        
-        return True
-    except Exception as e:
-        print(f"Error sending email to {user.email}: {str(e)}")
-        return False
+    html_message = render_to_string(template or email_info['template'], email_context)
+    message = EmailMultiAlternatives(
+        subject=subject or email_info['subject'],
+        body=strip_tags(html_message),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+        connection=connection,
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
 
 
-def send_seller_review_notification_email(seller, review):
+def send_notification_email(notification):
     """
-    Send email to seller when they receive a review
+    Send email notification to user based on notification type
     """
-    if not seller.email:
-        return False
-    
     try:
-        subject = f'⭐ New {review.rating}-Star Review from {review.customer.first_name}'
-        
-        context = {
-            'seller': seller,
-            'review': review,
-            'customer_name': review.customer.first_name,
-            'rating': review.rating,
-            'title': review.title,
-            'comment': review.comment,
-            'seller_profile_link': f"{settings.SITE_URL}/seller/{seller.id}/",
-        }
-        
-        html_message = render_to_string('emails/seller_review.html', context)
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[seller.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        
+        message = build_notification_email(notification)
+        if message is None:
+            return False
+        with timer('smtp', 'send_mail'):
+            message.send(fail_silently=False)
         return True
     except Exception as e:
-        print(f"Error sending review email to {seller.email}: {str(e)}")
+        logger.error("Error sending email to %s: %s", notification.user.email, e)
         return False
 
 
-def send_delivery_confirmation_email(seller, order, customer):
+def send_notification_emails(notifications, **overrides):
     """
-    Send email to seller when customer confirms delivery
+    Send the emails for many notifications over a single SMTP connection.
+    Returns the number of emails sent.
     """
-    if not seller.email:
-        return False
+    connection = get_connection()
+    emails = []
+    for notification in notifications:
+        try:
+            email = build_notification_email(notification, connection=connection, **overrides)
+        except Exception as e:
+            logger.error("Error rendering email for notification %s: %s", notification.pk, e)
+            continue
+        if email is not None:
+            emails.append(email)
+    if not emails:
+        return 0
     
     try:
-        subject = f'✅ Delivery Confirmed for Order {order.order_code}'
-        
-        context = {
-            'seller': seller,
-            'order': order,
-            'customer_name': customer.first_name,
-            'order_link': f"{settings.SITE_URL}/orders/{order.order_code}/status/",
-        }
-        
-        html_message = render_to_string('emails/delivery_confirmed_seller.html', context)
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[seller.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
-        
-        return True
+        with timer('smtp', 'send_messages'):
+            return connection.send_messages(emails) or 0
     except Exception as e:
-        print(f"Error sending delivery confirmation email to {seller.email}: {str(e)}")
-        return False
+        logger.error("Error sending %d notification emails: %s", len(emails), e)
+        return 0
+
+
+def notify(users, notification_type, title, message, order=None, group_key='', email=True,
+           email_template=None, email_subject=None, email_context=None):
+    """
+    Notify every user in ``users`` with one bulk INSERT, whatever their number.
+
+    For COALESCED_TYPES, a user's unread notification with the same
+    ``group_key`` from the last COALESCE_WINDOW is refreshed in place (one
+    UPDATE for all of them) instead of adding another row, and is not emailed
+    again. Emails for new rows are sent in one batch once the surrounding
+    transaction commits, skipping users who turned email notifications off.
+    Returns the new notifications.
+    """
+    users = [user for user in users if user is not None]
+    if not users:
+        return []
+    now = timezone.now()
+    coalesced_ids, coalesced_users = [], set()
+    if group_key and notification_type in COALESCED_TYPES:
+        for pk, user_id in Notification.objects.filter(
+            user__in=users, notification_type=notification_type, group_key=group_key,
+            is_read=False, created_at__gte=now - COALESCE_WINDOW,
+        ).values_list('pk', 'user_id'):
+            if user_id not in coalesced_users:
+                coalesced_ids.append(pk)
+                coalesced_users.add(user_id)
+        if coalesced_ids:
+            Notification.objects.filter(pk__in=coalesced_ids).update(
+                title=title, message=message, count=F('count') + 1, created_at=now,
+            )
+    notifications = Notification.objects.bulk_create([
+        Notification(user=user, notification_type=notification_type, title=title, message=message,
+                     order=order, group_key=group_key)
+        for user in users if user.pk not in coalesced_users
+    ])
+
+    if email and notifications:
+        overrides = {'template': email_template, 'subject': email_subject, 'context': email_context}
+        transaction.on_commit(lambda: send_notification_emails(notifications, **overrides))
+    return notifications
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .delivery import zones_changed
+from .models import DeliveryZone
+
+
+@receiver([post_save, post_delete], sender=DeliveryZone)
+def rebuild_zone_index(sender, **kwargs):
+    zones_changed()
@@ -0,0 +1,286 @@
+"""
+Order status state machine.
+
+Every status change goes through ``transition`` (one order) or
+``bulk_transition`` (many orders) so the order, its status history and the
+customer notification are written together in one transaction.
+
+Sellers move their own part of an order (a SellerOrder) with
+``bulk_transition_seller_orders``; the order then follows its slowest
+seller, see ``derive_order_status``.
+
+Every path locks the Order rows first and then their SellerOrder rows, each
+in primary key order, so concurrent customer, admin and seller moves on the
+same order wait for each other instead of deadlocking.
+"""
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Notification, Order, OrderStatusHistory, SellerOrder
+from .notifications import send_notification_emails
+
+logger = logging.getLogger(__name__)
+
+# Allowed moves; anything else needs force=True (admin corrections)
+TRANSITIONS = {
+    'pending': {'processing', 'cancelled'},
+    'processing': {'packed', 'cancelled'},
+    'packed': {'on_the_way', 'cancelled'},
+    'on_the_way': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+
+# Forward order of the non-cancelled statuses
+PIPELINE = ['pending', 'processing', 'packed', 'on_the_way', 'delivered']
+
+# Customer notification sent on entering a status: (type, title, message)
+STATUS_NOTIFICATIONS = {
+    'processing': ('order_confirmed', 'Order Confirmed - {code}', 'Your order {code} has been confirmed and is being prepared.'),
+    'on_the_way': ('order_shipped', 'Order On The Way - {code}', 'Your order {code} is on its way to you.'),
+    'delivered': ('order_delivered', 'Order Delivered - {code}', 'Your order {code} has been delivered. Please confirm delivery.'),
+    'cancelled': ('system', 'Order Cancelled - {code}', 'Your order {code} has been cancelled.'),
+}
+
+# Sent inside bulk_transition's transaction with changes=[(order_id, old_status, new_status), ...];
+# single transitions are visible to Order post_save receivers instead.
+orders_bulk_transitioned = Signal()
+
+# Sent inside the transaction whenever seller groups change status, whether moved by their
+# seller or along with their order, with changes=[(seller_order_id, old_status, new_status), ...]
+seller_orders_transitioned = Signal()
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+def can_transition(from_status, to_status):
+    return to_status in TRANSITIONS.get(from_status, set())
+
+
+def next_statuses(status):
+    """Status choices an order in ``status`` may move to, in display order"""
+    return [(value, label) for value, label in Order.STATUS_CHOICES if can_transition(status, value)]
+
+
+def sources_for(to_status):
+    return [status for status, targets in TRANSITIONS.items() if to_status in targets]
+
+
+def _settled_for(to_status):
+    """Seller group statuses that do not stop an order-level move to ``to_status``"""
+    later = PIPELINE[PIPELINE.index(to_status) + 1:] if to_status in PIPELINE else []
+    return [to_status, 'cancelled', *sources_for(to_status), *later]
+
+
+def derive_order_status(statuses):
+    """
+    Order status implied by its seller groups: as far along as the slowest
+    seller, and cancelled only once every seller has cancelled.
+    """
+    active = [status for status in statuses if status != 'cancelled']
+    if not active:
+        return 'cancelled' if statuses else None
+    return min(active, key=PIPELINE.index)
+
+
+def _default_note(status):
+    return f'Status updated to {dict(Order.STATUS_CHOICES)[status]}'
+
+
+def _notification_for(order_id, order_code, customer_id, status):
+    if not customer_id or status not in STATUS_NOTIFICATIONS:
+        return None
+    notification_type, title, message = STATUS_NOTIFICATIONS[status]
+    return Notification(
+        user_id=customer_id,
+        order_id=order_id,
+        notification_type=notification_type,
+        title=title.format(code=order_code),
+        message=message.format(code=order_code),
+    )
+
+
+def _send_emails(notification_ids):
+    # One query and one SMTP session however many orders changed
+    notifications = Notification.objects.filter(pk__in=notification_ids).select_related('user', 'order')
+    send_notification_emails(notifications)
+
+
+def _cascade_to_seller_orders(order_ids, to_status, force=False):
+    """Bring the seller groups of orders moved as a whole along with them"""
+    groups = SellerOrder.objects.filter(order_id__in=order_ids)
+    if force:
+        groups = groups.exclude(status__in={'cancelled', to_status})
+    else:
+        groups = groups.filter(status__in=sources_for(to_status))
+    rows = list(groups.select_for_update().order_by('pk').values_list('pk', 'status'))
+    if not rows:
+        return
+    SellerOrder.objects.filter(pk__in=[pk for pk, _ in rows]).update(status=to_status, updated_at=timezone.now())
+    seller_orders_transitioned.send(sender=SellerOrder, changes=[(pk, status, to_status) for pk, status in rows])
+
+
+def transition(order, to_status, note='', force=False):
+    """
+    Move ``order`` to ``to_status``, recording history and notifying the
+    customer. Raises InvalidTransition for moves the table does not allow.
+    Moving to the current status is a no-op, so retried callbacks are safe.
+    """
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f'Unknown status "{to_status}"')
+
+    with transaction.atomic():
+        locked = Order.objects.select_for_update().get(pk=order.pk)
+        from_status = locked.status
+        if from_status == to_status:
+            order.status = from_status
+            return False
+        if not force and not can_transition(from_status, to_status):
+            raise InvalidTransition(
+                f'Order {locked.order_code} cannot move from {locked.get_status_display()} to '
+                f'{dict(Order.STATUS_CHOICES)[to_status]}'
+            )
+        if not force and locked.seller_orders.exclude(status__in=_settled_for(to_status)).exists():
+            raise InvalidTransition(
+                f'Order {locked.order_code} cannot move to {dict(Order.STATUS_CHOICES)[to_status]}: '
+                f"a seller's part of the order cannot follow"
+            )
+
+        locked.status = to_status
+        locked.save(update_fields=['status', 'updated_at'])
+        _cascade_to_seller_orders([locked.pk], to_status, force)
+        OrderStatusHistory.objects.create(order=locked, status=to_status, note=note or _default_note(to_status))
+        notification = _notification_for(locked.pk, locked.order_code, locked.customer_id, to_status)
+        if notification:
+            notification.save()
+            transaction.on_commit(lambda: _send_emails([notification.pk]))
+
+    order.status, order.updated_at = locked.status, locked.updated_at
+    logger.info('Order %s moved from %s to %s', locked.order_code, from_status, to_status)
+    return True
+
+
+def record_event(order, note):
+    """Add a history entry without changing status, e.g. a failed payment attempt"""
+    return OrderStatusHistory.objects.create(order=order, status=order.status, note=note)
+
+
+def _apply_order_changes(candidates, to_status, note):
+    """
+    Write already locked orders' move to ``to_status``: one UPDATE, one
+    history INSERT and one notification INSERT. ``candidates`` are
+    (pk, status, order_code, customer_id) rows. Returns the notification ids.
+    """
+    ids = [pk for pk, _, _, _ in candidates]
+    Order.objects.filter(pk__in=ids).update(status=to_status, updated_at=timezone.now())
+    OrderStatusHistory.objects.bulk_create([
+        OrderStatusHistory(order_id=pk, status=to_status, note=note) for pk in ids
+    ])
+    notifications = [
+        notification for notification in (
+            _notification_for(pk, code, customer_id, to_status) for pk, _, code, customer_id in candidates
+        ) if notification
+    ]
+    Notification.objects.bulk_create(notifications)
+
+    changes = [(pk, from_status, to_status) for pk, from_status, _, _ in candidates]
+    orders_bulk_transitioned.send(sender=Order, changes=changes)
+    return [notification.pk for notification in notifications if notification.pk]
+
+
+def _send_emails_on_commit(notification_ids):
+    if notification_ids:
+        transaction.on_commit(lambda: _send_emails(notification_ids))
+
+
+def bulk_transition(orders, to_status, note=''):
+    """
+    Move every order in ``orders`` (a queryset) that is allowed to reach
+    ``to_status`` with one UPDATE, one history INSERT and one notification
+    INSERT. Returns the list of order ids that changed; orders in other states,
+    or with a seller already past ``to_status``, are left untouched.
+    """
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f'Unknown status "{to_status}"')
+    note = note or _default_note(to_status)
+
+    with transaction.atomic():
+        # Lock through a pk subquery so callers may pass filtered joins without duplicates
+        blocked = SellerOrder.objects.exclude(status__in=_settled_for(to_status)).values('order_id')
+        candidates = list(
+            Order.objects.filter(pk__in=orders.values('pk'), status__in=sources_for(to_status))
+            .exclude(pk__in=blocked)
+            .select_for_update().order_by('pk').values_list('pk', 'status', 'order_code', 'customer_id')
+        )
+        if not candidates:
+            return []
+        ids = [pk for pk, _, _, _ in candidates]
+        notification_ids = _apply_order_changes(candidates, to_status, note)
+        _cascade_to_seller_orders(ids, to_status)
+        _send_emails_on_commit(notification_ids)
+
+    logger.info('Moved %d orders to %s', len(ids), to_status)
+    return ids
+
+
+def _sync_orders(order_ids):
+    """Move each order to the status its seller groups imply; the caller holds the orders' locks"""
+    statuses = defaultdict(list)
+    for order_id, status in SellerOrder.objects.filter(order_id__in=order_ids).values_list('order_id', 'status'):
+        statuses[order_id].append(status)
+
+    moves = defaultdict(list)
+    for row in Order.objects.filter(pk__in=order_ids).order_by('pk').values_list(
+        'pk', 'status', 'order_code', 'customer_id'
+    ):
+        derived = derive_order_status(statuses[row[0]])
+        if derived and derived != row[1]:
+            moves[derived].append(row)
+
+    notification_ids = []
+    for status, candidates in moves.items():
+        notification_ids += _apply_order_changes(candidates, status, _default_note(status))
+    _send_emails_on_commit(notification_ids)
+
+
+def bulk_transition_seller_orders(seller_orders, to_status, note=''):
+    """
+    Move every seller group in ``seller_orders`` (a queryset) that is allowed
+    to reach ``to_status``, recording one history row per group, then update
+    the parent orders whose derived status changed. Returns the ids of the
+    groups that changed.
+    """
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f'Unknown status "{to_status}"')
+    note = note or _default_note(to_status)
+
+    with transaction.atomic():
+        groups = SellerOrder.objects.filter(pk__in=seller_orders.values('pk'), status__in=sources_for(to_status))
+        # Lock the parent orders before their groups, as transition and bulk_transition do
+        order_ids = list(groups.order_by().values_list('order_id', flat=True).distinct())
+        list(Order.objects.filter(pk__in=order_ids).select_for_update().order_by('pk').values_list('pk', flat=True))
+        candidates = list(
+            groups.filter(order_id__in=order_ids)
+            .select_for_update().order_by('pk').values_list('pk', 'order_id', 'status')
+        )
+        if not candidates:
+            return []
+        ids = [pk for pk, _, _ in candidates]
+        SellerOrder.objects.filter(pk__in=ids).update(status=to_status, updated_at=timezone.now())
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(order_id=order_id, seller_order_id=pk, status=to_status, note=note)
+            for pk, order_id, _ in candidates
+        ])
+        seller_orders_transitioned.send(
+            sender=SellerOrder, changes=[(pk, status, to_status) for pk, _, status in candidates]
+        )
+        _sync_orders({order_id for _, order_id, _ in candidates})
+
+    logger.info('Moved %d seller orders to %s', len(ids), to_status)
+    return ids
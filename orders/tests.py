@@ -1,3 +1,673 @@
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import CustomUser
+from crochet_shop.testing import QueryPlanAssertionsMixin
+from .models import Notification, Order, Payment, SellerOrder
+from .views import _payment_status_etag
+
+
+class OrderIndexTestCase(QueryPlanAssertionsMixin, TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='customer@example.com', password='testpass123')
+
+    def test_orders_by_status_use_index(self):
+        self.assertUsesIndex(Order.objects.filter(status='pending').order_by('-created_at')[:10])
+
+    def test_orders_by_customer_email_use_index(self):
+        self.assertUsesIndex(Order.objects.filter(customer_email=self.user.email).order_by('-created_at'))
+
+    def test_payment_by_checkout_request_id_uses_index(self):
+        self.assertUsesIndex(Payment.objects.filter(checkout_request_id='ws_CO_123'))
+
+    def test_notifications_use_index(self):
+        self.assertUsesIndex(self.user.notifications.all().order_by('-created_at')[:10])
+        self.assertUsesIndex(Notification.objects.filter(user=self.user, is_read=False))
+
+
+class OrderExportTestCase(TestCase):
+    def setUp(self):
+        from datetime import datetime
+        from django.utils import timezone
+        from shop.models import Category, Product
+        from .models import OrderItem
+
+        self.admin = CustomUser.objects.create_user(email='admin@example.com', password='testpass123', user_type='admin')
+        self.seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        other = CustomUser.objects.create_user(email='other@example.com', password='testpass123', user_type='seller')
+        category = Category.objects.create(name='Bags', slug='bags')
+        mine = Product.objects.create(category=category, seller=self.seller, name='Tote Bag', description='x',
+                                      price='1000.00', stock=5, image='products/tote.jpg')
+        theirs = Product.objects.create(category=category, seller=other, name='Beanie', description='x',
+                                        price='500.00', stock=5, image='products/beanie.jpg')
+        for n, (status, day) in enumerate([('pending', 1), ('delivered', 10), ('delivered', 20)]):
+            order = Order.objects.create(order_code=f'CR-TEST-{n}', customer_name=f'Customer {n}', customer_phone='0712345678',
+                                         customer_address='Nairobi', total_amount='2500.00', status=status)
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(datetime(2025, 3, day, 12)))
+            Payment.objects.create(order=order, deposit_amount='500.00', balance_amount='2000.00')
+            OrderItem.objects.create(order=order, product=mine, product_name='Tote Bag', product_price='1000.00', quantity=2)
+            OrderItem.objects.create(order=order, product=theirs, product_name='Beanie', product_price='500.00', quantity=1)
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        return lines[0], lines[1:]
+
+    def test_admin_export_has_one_row_per_item_with_payment(self):
+        from django.urls import reverse
+        self.client.force_login(self.admin)
+        header, rows = self.export(reverse('accounts:admin_orders_export'), status='delivered', date_to='2025-03-10')
+
+        self.assertTrue(header.startswith('Order code,Created,Status'))
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(row.startswith('CR-TEST-1,2025-03-10') for row in rows))
+        self.assertIn('pending,500.00,no', rows[0])
+
+    def test_seller_export_only_contains_own_items(self):
+        from django.urls import reverse
+        self.client.force_login(self.seller)
+        _, rows = self.export(reverse('accounts:seller_sales_export'), date_from='2025-03-10')
+
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(',Tote Bag,' in row and row.endswith(',2000.00') for row in rows))
+
+    def test_formulas_in_customer_fields_are_escaped(self):
+        from django.urls import reverse
+        from .models import OrderItem
+        Order.objects.filter(order_code='CR-TEST-1').update(customer_name='=HYPERLINK("http://x")')
+        OrderItem.objects.filter(order__order_code='CR-TEST-1').update(product_name='-1+2')
+        self.client.force_login(self.admin)
+        _, rows = self.export(reverse('accounts:admin_orders_export'), status='delivered', date_to='2025-03-10')
+
+        self.assertIn(',"\'=HYPERLINK(""http://x"")",', rows[0])
+        self.assertIn(",'-1+2,", rows[0])
+        self.assertIn(',2500.00,', rows[0])
+
+    def test_invalid_filters_are_rejected(self):
+        from django.urls import reverse
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('accounts:admin_orders_export'), {'date_from': 'soon'}).status_code, 400)
+        self.client.force_login(self.seller)
+        self.assertEqual(self.client.get(reverse('accounts:admin_orders_export')).status_code, 302)
+
+
+class OrderStateMachineTestCase(TestCase):
+    def setUp(self):
+        self.customer = CustomUser.objects.create_user(email='customer@example.com', password='testpass123')
+        self.orders = [
+            Order.objects.create(order_code=f'CR-SM-{n}', customer=self.customer, customer_name='Customer',
+                                 customer_phone='0712345678', customer_address='Nairobi', total_amount='1000.00')
+            for n in range(3)
+        ]
+
+    def test_transition_records_history_and_notifies_customer(self):
+        from .state_machine import transition
+        order = self.orders[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(transition(order, 'processing', note='Paid'))
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'processing')
+        self.assertEqual(list(order.status_history.values_list('status', 'note')), [('processing', 'Paid')])
+        self.assertEqual(self.customer.notifications.get().notification_type, 'order_confirmed')
+        self.assertFalse(transition(order, 'processing'))
+
+    def test_invalid_transition_is_rejected(self):
+        from .state_machine import InvalidTransition, transition
+        with self.assertRaises(InvalidTransition):
+            transition(self.orders[0], 'delivered')
+        self.assertEqual(Order.objects.get(pk=self.orders[0].pk).status, 'pending')
+        self.assertTrue(transition(self.orders[0], 'delivered', force=True))
+
+    def test_bulk_transition_skips_orders_in_other_states(self):
+        from .models import OrderStatusHistory
+        from .state_machine import bulk_transition
+        Order.objects.filter(pk=self.orders[2].pk).update(status='cancelled')
+
+        # SAVEPOINT, SELECT, UPDATE, history INSERT, notification INSERT, seller order UPDATE, RELEASE
+        with self.assertNumQueries(7):
+            changed = bulk_transition(Order.objects.all(), 'processing')
+
+        self.assertEqual(sorted(changed), [self.orders[0].pk, self.orders[1].pk])
+        self.assertEqual(Order.objects.filter(status='processing').count(), 2)
+        self.assertEqual(OrderStatusHistory.objects.count(), 2)
+        self.assertEqual(Notification.objects.filter(notification_type='order_confirmed').count(), 2)
+
+    def test_settled_payment_status_answers_not_modified(self):
+        from django.urls import reverse
+        order = self.orders[0]
+        payment = Payment.objects.create(order=order, deposit_amount='200.00', balance_amount='800.00',
+                                         checkout_request_id='ws_CO_ok', status='completed', deposit_paid=True)
+        url = reverse('orders:check_payment_status_api', args=[order.order_code])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        from .state_machine import transition
+        transition(order, 'processing')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['order_status'], 'processing')
+
+        # Pending M-PESA payments are re-checked on every poll
+        payment.status, payment.deposit_paid = 'pending', False
+        payment.save()
+        self.assertEqual(_payment_status_etag(None, order.order_code), None)
+
+    def test_mpesa_callback_confirms_or_records_failure(self):
+        import json
+        from django.urls import reverse
+        success, failure = self.orders[:2]
+        Payment.objects.create(order=success, deposit_amount='200.00', balance_amount='800.00', checkout_request_id='ws_CO_ok')
+        Payment.objects.create(order=failure, deposit_amount='200.00', balance_amount='800.00', checkout_request_id='ws_CO_fail')
+
+        def callback(checkout_request_id, result_code):
+            body = {'Body': {'stkCallback': {
+                'CheckoutRequestID': checkout_request_id, 'ResultCode': result_code, 'ResultDesc': 'Done',
+                'CallbackMetadata': {'Item': [{'Name': 'MpesaReceiptNumber', 'Value': 'ABC123'}]},
+            }}}
+            response = self.client.post(reverse('orders:mpesa_payment_callback'), json.dumps(body),
+                                        content_type='application/json')
+            self.assertEqual(response.json()['ResultCode'], 0)
+
+        callback('ws_CO_ok', 0)
+        callback('ws_CO_fail', 1032)
+
+        success.refresh_from_db()
+        failure.refresh_from_db()
+        self.assertEqual((success.status, success.payment.status), ('processing', 'completed'))
+        self.assertEqual((failure.status, failure.payment.status), ('pending', 'failed'))
+        self.assertEqual(failure.status_history.get().note, 'Payment failed: Done')
+
+
+class SellerFulfilmentTestCase(TestCase):
+    def setUp(self):
+        from shop.models import Category, Product
+        from decimal import Decimal
+        from .fulfilment import split_order
+        from .models import OrderItem
+
+        self.seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        other = CustomUser.objects.create_user(email='other@example.com', password='testpass123', user_type='seller')
+        customer = CustomUser.objects.create_user(email='customer@example.com', password='testpass123')
+        category = Category.objects.create(name='Bags', slug='bags')
+        mine = Product.objects.create(category=category, seller=self.seller, name='Tote Bag', description='x',
+                                      price='1000.00', stock=5, image='products/tote.jpg')
+        theirs = Product.objects.create(category=category, seller=other, name='Beanie', description='x',
+                                        price='500.00', stock=5, image='products/beanie.jpg')
+        self.orders = []
+        for n, (product, status) in enumerate([(mine, 'processing'), (mine, 'processing'), (mine, 'delivered'), (theirs, 'processing')]):
+            order = Order.objects.create(order_code=f'CR-FUL-{n}', customer=customer, customer_name='Customer',
+                                         customer_phone='0712345678', customer_address='Nairobi',
+                                         total_amount='1000.00', status=status)
+            # Two lines of the same product must not duplicate the order
+            split_order(order, [
+                OrderItem(product=product, product_name=product.name, product_price=Decimal('500.00'), quantity=1)
+                for _ in range(2)
+            ])
+            self.orders.append(order)
+        self.client.force_login(self.seller)
+
+    def test_bulk_update_changes_only_allowed_seller_orders(self):
+        from django.urls import reverse
+        from .models import OrderStatusHistory
+
+        SellerOrder.objects.filter(order__order_code='CR-FUL-0').update(status='packed')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('orders:seller_fulfilment'), {
+                'orders': [order.pk for order in self.orders], 'new_status': 'on_the_way', 'note': 'Courier run',
+            })
+        self.assertEqual(response.status_code, 302)
+        # CR-FUL-1 cannot skip packing, CR-FUL-2 is finished and CR-FUL-3 belongs to another seller
+        self.assertEqual(
+            dict(Order.objects.values_list('order_code', 'status')),
+            {'CR-FUL-0': 'on_the_way', 'CR-FUL-1': 'processing', 'CR-FUL-2': 'delivered', 'CR-FUL-3': 'processing'},
+        )
+        self.assertEqual(list(OrderStatusHistory.objects.filter(seller_order__isnull=False).values_list('order__order_code', 'note')),
+                         [('CR-FUL-0', 'Courier run')])
+
+    def test_json_endpoint_reports_updated_and_skipped(self):
+        import json
+        from django.core import mail
+        from django.urls import reverse
+
+        SellerOrder.objects.filter(order__order_code__in=['CR-FUL-0', 'CR-FUL-1']).update(status='packed')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('orders:seller_bulk_status_api'), json.dumps({
+                'orders': ['CR-FUL-0', 'CR-FUL-1', 'CR-FUL-2', 'CR-FUL-3', 'CR-MISSING'],
+                'status': 'on_the_way', 'note': 'Courier run',
+            }), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], ['CR-FUL-0', 'CR-FUL-1'])
+        self.assertEqual(response.json()['skipped'], ['CR-FUL-2', 'CR-FUL-3', 'CR-MISSING'])
+        self.assertEqual(Order.objects.get(order_code='CR-FUL-3').status, 'processing')
+        # Both customer emails went out in one batch
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Notification.objects.filter(notification_type='order_shipped').count(), 2)
+
+        response = self.client.post(reverse('orders:seller_bulk_status_api'), json.dumps({
+            'orders': ['CR-FUL-0'], 'status': 'bogus',
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_fulfilment_page_lists_seller_orders_once(self):
+        from django.urls import reverse
+        response = self.client.get(reverse('orders:seller_fulfilment'), {'status': 'processing'})
+        self.assertEqual([group.order.order_code for group in response.context['page']], ['CR-FUL-1', 'CR-FUL-0'])
+        self.assertEqual([value for value, _ in response.context['bulk_statuses']], ['packed', 'cancelled'])
+
+
+class SellerOrderTestCase(TestCase):
+    def setUp(self):
+        from decimal import Decimal
+        from shop.models import Category, Product
+        from .fulfilment import split_order
+        from .models import OrderItem
+
+        self.customer = CustomUser.objects.create_user(email='customer@example.com', password='testpass123')
+        category = Category.objects.create(name='Bags', slug='bags')
+        self.sellers, products = [], []
+        for n in range(2):
+            seller = CustomUser.objects.create_user(email=f'seller{n}@example.com', password='testpass123', user_type='seller')
+            self.sellers.append(seller)
+            products.append(Product.objects.create(category=category, seller=seller, name=f'Bag {n}', description='x',
+                                                   price='1000.00', stock=5, image=f'products/bag-{n}.jpg'))
+        self.order = Order.objects.create(order_code='CR-SPLIT-1', customer=self.customer, customer_name='Customer',
+                                          customer_phone='0712345678', customer_address='Nairobi', total_amount='3000.00')
+        split_order(self.order, [
+            OrderItem(product=products[0], product_name='Bag 0', product_price=Decimal('1000.00'), quantity=2),
+            OrderItem(product=products[1], product_name='Bag 1', product_price=Decimal('1000.00'), quantity=1),
+        ])
+
+    def move(self, seller, status):
+        from .state_machine import bulk_transition_seller_orders
+        with self.captureOnCommitCallbacks(execute=True):
+            return bulk_transition_seller_orders(SellerOrder.objects.filter(order=self.order, seller=seller), status)
+
+    def test_checkout_split_creates_one_group_per_seller(self):
+        groups = SellerOrder.objects.filter(order=self.order).order_by('seller__email')
+        self.assertEqual([(group.seller, group.subtotal) for group in groups],
+                         [(self.sellers[0], 2000), (self.sellers[1], 1000)])
+        self.assertEqual([group.items.count() for group in groups], [1, 1])
+
+    def test_order_follows_slowest_seller(self):
+        from .state_machine import transition
+        with self.captureOnCommitCallbacks(execute=True):
+            transition(self.order, 'processing', note='Deposit paid')
+        self.assertEqual(set(SellerOrder.objects.values_list('status', flat=True)), {'processing'})
+
+        self.move(self.sellers[0], 'packed')
+        self.move(self.sellers[0], 'on_the_way')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'processing')
+        self.assertFalse(Notification.objects.filter(notification_type='order_shipped').exists())
+
+        self.move(self.sellers[1], 'packed')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'packed')
+        self.move(self.sellers[1], 'on_the_way')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'on_the_way')
+        self.assertEqual(Notification.objects.filter(notification_type='order_shipped').count(), 1)
+
+    def test_cancelled_seller_does_not_hold_order_back(self):
+        from .state_machine import InvalidTransition, derive_order_status, transition
+        self.assertEqual(derive_order_status(['cancelled', 'packed']), 'packed')
+        self.assertEqual(derive_order_status(['cancelled', 'cancelled']), 'cancelled')
+
+        self.move(self.sellers[0], 'cancelled')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+        self.move(self.sellers[1], 'processing')
+        self.move(self.sellers[1], 'packed')
+        self.move(self.sellers[1], 'on_the_way')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'on_the_way')
+
+        # A shipped seller blocks cancelling the whole order
+        SellerOrder.objects.filter(order=self.order).update(status='on_the_way')
+        Order.objects.filter(pk=self.order.pk).update(status='packed')
+        self.order.refresh_from_db()
+        with self.assertRaises(InvalidTransition):
+            transition(self.order, 'cancelled')
+
+    def test_orders_are_locked_before_their_seller_groups(self):
+        from unittest import mock
+        from django.db.models import QuerySet
+        from .state_machine import bulk_transition, bulk_transition_seller_orders, transition
+
+        select_for_update = QuerySet.select_for_update
+        locks = []
+
+        def record(queryset, *args, **kwargs):
+            locks.append(queryset.model.__name__)
+            return select_for_update(queryset, *args, **kwargs)
+
+        moves = [
+            lambda: bulk_transition_seller_orders(SellerOrder.objects.filter(order=self.order, seller=self.sellers[0]), 'processing'),
+            lambda: transition(self.order, 'processing'),
+            lambda: bulk_transition(Order.objects.filter(pk=self.order.pk), 'packed'),
+        ]
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=record):
+            for move in moves:
+                locks.clear()
+                move()
+                self.assertEqual(locks[0], 'Order')
+                self.assertNotIn('Order', locks[locks.index('SellerOrder'):])
+
+    def test_each_seller_of_a_split_order_is_reviewed_separately(self):
+        from django.urls import reverse
+        from shop.models import SellerReview
+        from .models import DeliveryConfirmation
+        Order.objects.filter(pk=self.order.pk).update(status='delivered')
+        SellerOrder.objects.filter(seller=self.sellers[1]).update(status='delivered')
+        DeliveryConfirmation.objects.create(order=self.order, customer_confirmed=True)
+        url = reverse('orders:leave_review', args=[self.order.order_code])
+        self.client.force_login(self.customer)
+
+        # A group that has not been delivered cannot be reviewed yet
+        response = self.client.post(url, {'seller': self.sellers[0].pk, 'rating': 4})
+        self.assertRedirects(response, reverse('orders:order_status', args=[self.order.order_code]))
+        self.assertFalse(SellerReview.objects.exists())
+
+        SellerOrder.objects.filter(seller=self.sellers[0]).update(status='delivered')
+        self.client.post(url, {'seller': self.sellers[1].pk, 'rating': 3})
+        # Without a choice, the page offers the seller not yet reviewed
+        self.assertEqual(self.client.get(url).context['seller'], self.sellers[0])
+        self.client.post(url, {'seller': self.sellers[0].pk, 'rating': 5})
+        self.assertEqual(
+            dict(SellerReview.objects.filter(order=self.order).values_list('seller__email', 'rating')),
+            {'seller0@example.com': 5, 'seller1@example.com': 3},
+        )
+
+    def test_seller_updates_only_their_part_from_order_page(self):
+        from django.urls import reverse
+        self.client.force_login(self.sellers[1])
+        self.client.post(reverse('orders:order_status', args=[self.order.order_code]), {'new_status': 'processing'})
+        self.assertEqual(
+            dict(SellerOrder.objects.values_list('seller__email', 'status')),
+            {'seller0@example.com': 'pending', 'seller1@example.com': 'processing'},
+        )
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+
+class NotifyTestCase(TestCase):
+    def setUp(self):
+        self.users = [
+            CustomUser.objects.create_user(email=f'user{n}@example.com', password='testpass123') for n in range(6)
+        ]
+
+    def test_fan_out_uses_constant_queries(self):
+        from .notifications import notify
+        for users in (self.users[:2], self.users):
+            with self.assertNumQueries(1):
+                notify(users, 'system', title='Maintenance', message='Back soon', email=False)
+        self.assertEqual(Notification.objects.count(), 8)
+
+        # Coalescing adds one SELECT, plus one UPDATE however many users are merged
+        for users, queries in ((self.users[:2], 2), (self.users, 3)):
+            with self.assertNumQueries(queries):
+                notify(users, 'message', title='New message', message='Hi', group_key='conversation:1', email=False)
+        self.assertEqual(
+            sorted(Notification.objects.filter(notification_type='message').values_list('count', flat=True)),
+            [1, 1, 1, 1, 2, 2],
+        )
+
+    def test_emails_respect_preferences_and_wait_for_commit(self):
+        from django.core import mail
+        from .notifications import notify
+        CustomUser.objects.filter(pk=self.users[0].pk).update(email_notifications=False)
+        self.users[0].refresh_from_db()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            notify(self.users[:3], 'system', title='Maintenance', message='Back soon')
+        self.assertEqual(len(mail.outbox), 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['user1@example.com', 'user2@example.com'])
+
+
+class NotificationLifecycleTestCase(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='customer@example.com', password='testpass123')
+        other = CustomUser.objects.create_user(email='other@example.com', password='testpass123')
+        Notification.objects.bulk_create(
+            [Notification(user=self.user, notification_type='system', title=f'Note {n}', message='x') for n in range(25)]
+            + [Notification(user=other, notification_type='system', title='Other', message='x')]
+        )
+        self.client.force_login(self.user)
+
+    def test_mark_read_is_one_update_scoped_to_user(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.urls import reverse
+        first = self.user.notifications.order_by('pk').first()
+
+        # request_started resets the query log, so capture around the first request only
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('orders:mark_notifications_read'), {'ids': [first.pk]},
+                                        HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json(), {'marked': 1})
+        self.assertEqual(sum(query['sql'].startswith('UPDATE "orders_notification"') for query in queries), 1)
+
+        response = self.client.post(reverse('orders:mark_notifications_read'), {'next': 'https://evil.example/'})
+        self.assertRedirects(response, reverse('orders:notification_center'))
+        self.assertFalse(self.user.notifications.filter(is_read=False).exists())
+        self.assertTrue(Notification.objects.filter(user__email='other@example.com', is_read=False).exists())
+
+    def test_notification_center_is_paginated(self):
+        from django.urls import reverse
+        response = self.client.get(reverse('orders:notification_center'), {'page': 2})
+        self.assertEqual(len(response.context['page']), 5)
+        self.assertContains(response, 'Note 0')
+        response = self.client.get(reverse('orders:notification_center'), {'filter': 'unread'})
+        self.assertEqual(response.context['page'].paginator.count, 25)
+
+    def test_prune_archives_only_old_read_notifications(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from .models import ArchivedNotification
+
+        old = timezone.now() - timedelta(days=120)
+        ids = list(self.user.notifications.order_by('pk').values_list('pk', flat=True))
+        Notification.objects.filter(pk__in=ids[:5]).update(is_read=True, created_at=old)
+        Notification.objects.filter(pk__in=ids[5:7]).update(created_at=old)   # unread
+        Notification.objects.filter(pk__in=ids[7:9]).update(is_read=True)     # recent
+
+        out = StringIO()
+        call_command('prune_notifications', '--archive', '--batch-size', '2', stdout=out)
+        self.assertIn('Archived 5 read notifications', out.getvalue())
+        self.assertEqual(self.user.notifications.count(), 20)
+        self.assertEqual(ArchivedNotification.objects.filter(user=self.user, created_at=old).count(), 5)
+
+        Notification.objects.filter(pk__in=ids[7:9]).update(created_at=old)
+        call_command('prune_notifications', stdout=out)
+        self.assertEqual(self.user.notifications.count(), 18)
+        self.assertEqual(ArchivedNotification.objects.count(), 5)
+
+
+class DeliveryZoneTestCase(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import DeliveryZone
+
+        cache.clear()
+        self.city = DeliveryZone.objects.create(
+            name='Nairobi', center_latitude='-1.286389', center_longitude='36.817223', radius_km='15',
+            base_fee='200', fee_per_km='20',
+        )
+        self.cbd = DeliveryZone.objects.create(
+            name='CBD', shape='polygon', center_latitude='-1.284', center_longitude='36.822', priority=10,
+            polygon=[[-1.275, 36.810], [-1.275, 36.835], [-1.295, 36.835], [-1.295, 36.810]], base_fee='100',
+        )
+
+    def test_index_prefers_priority_then_falls_back(self):
+        from .delivery import get_zone_index, quote
+
+        index = get_zone_index()
+        self.assertEqual(index.locate(-1.285, 36.820)[0], self.cbd)
+        # Inside the circle but outside the polygon
+        zone, km = index.locate(-1.320, 36.817)
+        self.assertEqual(zone, self.city)
+        self.assertAlmostEqual(km, 3.76, places=1)
+        self.assertEqual(quote(-1.320, 36.817), (self.city, 275))
+        self.assertEqual(index.locate(-0.091, 34.768), (None, None))
+
+        # Saving a zone rebuilds the index on next use
+        self.cbd.active = False
+        self.cbd.save()
+        self.assertIsNot(get_zone_index(), index)
+        self.assertEqual(get_zone_index().locate(-1.285, 36.820)[0], self.city)
+
+    def test_index_follows_changes_made_by_other_workers(self):
+        from unittest import mock
+        from django.utils import timezone
+        from . import delivery
+        from .models import DeliveryZone
+
+        self.assertEqual(delivery.get_zone_index().locate(-1.285, 36.820)[0], self.cbd)
+        # No signal reaches this process, as when another worker saves the zone
+        DeliveryZone.objects.filter(pk=self.cbd.pk).update(active=False, updated_at=timezone.now())
+        with self.assertNumQueries(0):
+            self.assertEqual(delivery.get_zone_index().locate(-1.285, 36.820)[0], self.cbd)
+        with mock.patch.object(delivery, 'ZONES_CHECK_SECONDS', 0):
+            self.assertEqual(delivery.get_zone_index().locate(-1.285, 36.820)[0], self.city)
+
+    def test_polygon_needs_three_points(self):
+        from django.core.exceptions import ValidationError
+
+        self.cbd.polygon = [[-1.275, 36.810], [-1.295, 36.835]]
+        with self.assertRaises(ValidationError):
+            self.cbd.full_clean()
+
+    def test_checkout_charges_zone_fee(self):
+        from decimal import Decimal
+        from django.urls import reverse
+        from shop.models import Category, Product
+
+        seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        product = Product.objects.create(
+            category=Category.objects.create(name='Bags', slug='bags'), seller=seller, name='Tote Bag',
+            description='x', price='1000.00', stock=5, image='products/tote.jpg',
+        )
+        self.client.post(reverse('shop:add_to_cart', args=[product.pk]))
+        quote = self.client.get(reverse('shop:delivery_quote'), {'latitude': '-1.320000', 'longitude': '36.817000'}).json()
+        self.assertEqual(quote, {'zone': 'Nairobi', 'delivery_fee': '275', 'total': '1275.00',
+                                 'deposit': '255.00', 'balance': '1020.00'})
+        self.client.post(reverse('shop:checkout'), {
+            'customer_name': 'Amina', 'customer_phone': '0712345678', 'customer_address': 'Nairobi',
+            'customer_latitude': '-1.320000', 'customer_longitude': '36.817000',
+            'delivery_fee_quote': quote['delivery_fee'],
+        })
+
+        order = Order.objects.get()
+        self.assertEqual((order.delivery_zone, order.delivery_fee, order.total_amount),
+                         (self.city, Decimal('275.00'), Decimal('1275.00')))
+        self.assertEqual(order.payment.deposit_amount, Decimal('255.00'))
+
+    def test_checkout_shows_a_changed_fee_before_charging_it(self):
+        from django.urls import reverse
+        from shop.models import Category, Product
+
+        seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        product = Product.objects.create(
+            category=Category.objects.create(name='Bags', slug='bags'), seller=seller, name='Tote Bag',
+            description='x', price='1000.00', stock=5, image='products/tote.jpg',
+        )
+        self.client.post(reverse('shop:add_to_cart', args=[product.pk]))
+        # Quoted before the zone's fee went up
+        response = self.client.post(reverse('shop:checkout'), {
+            'customer_name': 'Amina', 'customer_phone': '0712345678', 'customer_address': 'Nairobi',
+            'customer_latitude': '-1.320000', 'customer_longitude': '36.817000', 'delivery_fee_quote': '200',
+        })
+
+        self.assertFalse(Order.objects.exists())
+        self.assertContains(response, 'The delivery fee for your location is KES 275')
+        self.assertContains(response, 'id="delivery_fee_quote" value="275"')
+        self.assertContains(response, '<span id="orderTotal">1275.00</span>')
+        self.assertContains(response, 'Nairobi</textarea>')
+
+    def test_assign_zones_to_past_orders(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        for n, (lat, lng) in enumerate([(-1.285, 36.820), (-1.320, 36.817), (-0.091, 34.768), (None, None)]):
+            Order.objects.create(order_code=f'CR-ZONE-{n}', customer_name='Customer', customer_phone='0712345678',
+                                 customer_address='Nairobi', total_amount='1000.00',
+                                 customer_latitude=lat, customer_longitude=lng)
+        out = StringIO()
+        call_command('assign_delivery_zones', '--batch-size', '2', stdout=out)
+        self.assertIn('Checked 3 orders, assigned a zone to 2', out.getvalue())
+        self.assertEqual(
+            dict(Order.objects.values_list('order_code', 'delivery_zone__name')),
+            {'CR-ZONE-0': 'CBD', 'CR-ZONE-1': 'Nairobi', 'CR-ZONE-2': None, 'CR-ZONE-3': None},
+        )
+        # Fees charged at checkout are history
+        self.assertFalse(Order.objects.exclude(delivery_fee=0).exists())
+
+    def test_delivery_runs_group_open_orders_by_zone(self):
+        from django.urls import reverse
+        from .models import SellerOrder
+
+        seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        for n, (zone, status) in enumerate([(self.city, 'packed'), (None, 'processing'), (self.cbd, 'on_the_way'),
+                                            (self.cbd, 'delivered')]):
+            order = Order.objects.create(order_code=f'CR-RUN-{n}', customer_name='Customer', customer_phone='0712345678',
+                                         customer_address='Nairobi', total_amount='1000.00', delivery_zone=zone)
+            SellerOrder.objects.create(order=order, seller=seller, status=status, subtotal='1000.00')
+        self.client.force_login(seller)
+
+        response = self.client.get(reverse('orders:delivery_runs'))
+        self.assertEqual([group.order.order_code for group in response.context['seller_orders']],
+                         ['CR-RUN-2', 'CR-RUN-0', 'CR-RUN-1'])
+        self.assertContains(response, 'No delivery zone')
+
+
+class RoutePlanningTestCase(TestCase):
+    def test_two_opt_untangles_crossing_route(self):
+        import numpy as np
+        from .routing import distance_matrix, plan_route, route_length, two_opt
+
+        # Corners of a square visited diagonally cross over themselves
+        points = [(-1.30, 36.80), (-1.20, 36.90), (-1.20, 36.80), (-1.30, 36.90)]
+        dist = distance_matrix(*zip(*points))
+        untangled = two_opt([0, 1, 2, 3], dist)
+        self.assertLess(route_length(untangled, dist), route_length([0, 1, 2, 3], dist))
+        self.assertEqual(sorted(untangled), [0, 1, 2, 3])
+
+        route, km = plan_route(points, start=(-1.31, 36.79))
+        self.assertEqual(route[0], 0)
+        self.assertAlmostEqual(km, 1.6 + 3 * 11.1, delta=0.5)
+
+        rng = np.random.default_rng(7)
+        many = list(zip(rng.uniform(-1.4, -1.1, 300), rng.uniform(36.6, 37.0, 300)))
+        route, _ = plan_route(many)
+        self.assertEqual(sorted(route), list(range(300)))
+
+    def test_seller_routes_by_zone(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.urls import reverse
+        from .models import DeliveryZone
+
+        seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        zone = DeliveryZone.objects.create(name='Westlands', center_latitude='-1.26', center_longitude='36.80', radius_km='10')
+        stops = [(zone, -1.25, 36.80), (zone, -1.27, 36.80), (zone, -1.26, 36.80), (None, -1.0, 37.0), (None, None, None)]
+        for n, (order_zone, lat, lng) in enumerate(stops):
+            order = Order.objects.create(order_code=f'CR-ROUTE-{n}', customer_name='Customer', customer_phone='0712345678',
+                                         customer_address='Nairobi', total_amount='1000.00', delivery_zone=order_zone,
+                                         customer_latitude=lat, customer_longitude=lng)
+            SellerOrder.objects.create(order=order, seller=seller, status='on_the_way', subtotal='1000.00')
+
+        self.client.force_login(seller)
+        response = self.client.get(reverse('orders:delivery_routes'), {'start': '-1.24,36.80'})
+        routes = {route.zone: [stop.order.order_code for stop in route.stops] for route in response.context['routes']}
+        self.assertEqual(routes, {zone: ['CR-ROUTE-0', 'CR-ROUTE-2', 'CR-ROUTE-1'], None: ['CR-ROUTE-3']})
+        self.assertEqual([stop.order.order_code for stop in response.context['unrouted']], ['CR-ROUTE-4'])
+
+        out = StringIO()
+        call_command('plan_delivery_routes', 'seller@example.com', '--start=-1.24,36.80', stdout=out)
+        self.assertIn('Planned 2 routes over 4 stops', out.getvalue())
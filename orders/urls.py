@@ -7,8 +7,14 @@ urlpatterns = [
     path('confirmation/<str:order_code>/', views.order_confirmation, name='order_confirmation'),
     path('track/', views.track_order, name='track_order'),
     path('track/<str:order_code>/', views.order_status, name='order_status'),
-    path('payment/mpesa/<str:order_code>/', views.initiate_mpesa_payment, name='initiate_mpesa_payment'),
+    path('seller/fulfilment/', views.seller_fulfilment, name='seller_fulfilment'),
+    path('seller/delivery-runs/', views.delivery_runs, name='delivery_runs'),
+    path('seller/delivery-routes/', views.delivery_routes, name='delivery_routes'),
+    path('api/seller/bulk-status/', views.seller_bulk_status_api, name='seller_bulk_status_api'),
+    path('notifications/', views.notification_center, name='notification_center'),
+    path('notifications/mark-read/', views.mark_notifications_read, name='mark_notifications_read'),
     path('payment/mpesa/callback/', views.mpesa_payment_callback, name='mpesa_payment_callback'),
+    path('payment/mpesa/<str:order_code>/', views.initiate_mpesa_payment, name='initiate_mpesa_payment'),
     path('api/check-payment-status/<str:order_code>/', views.check_payment_status_api, name='check_payment_status_api'),
     path('<str:order_code>/confirm-delivery/', views.confirm_delivery, name='confirm_delivery'),
     path('<str:order_code>/review/', views.leave_review, name='leave_review'),
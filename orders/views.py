@@ -1,18 +1,41 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 import json
+import logging
 from datetime import datetime
 from decimal import Decimal
-from .models import Order, Payment, OrderStatusHistory, DeliveryConfirmation, Notification
+from .models import Order, Payment, DeliveryConfirmation, SellerOrder
 from shop.models import SellerReview
-from .notifications import send_notification_email, send_seller_review_notification_email, send_delivery_confirmation_email
+from .notifications import notify
 from .mpesa import MpesaClient
+from .fulfilment import seller_order_for
+from .routing import plan_routes
+from .state_machine import (
+    TRANSITIONS, InvalidTransition, bulk_transition_seller_orders, next_statuses, record_event, transition,
+)
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Upper bound on orders changed by one bulk fulfilment request
+MAX_BULK_ORDERS = 500
+FULFILMENT_PAGE_SIZE = 50
+# Seller groups that still have to go out on a delivery run
+DELIVERY_RUN_STATUSES = ['processing', 'packed', 'on_the_way']
 
 
 def initiate_mpesa_payment(request, order_code):
@@ -103,7 +126,7 @@ def mpesa_payment_callback(request):
         try:
             # Parse JSON from request body
             data = json.loads(request.body)
-            print(f"M-PESA Callback Received: {json.dumps(data, indent=2)}")
+            logger.debug("M-PESA callback received: %s", json.dumps(data))
             
             # Extract M-PESA callback response
             # The structure is: {"Body": {"stkCallback": {...}}}
@@ -135,8 +158,10 @@ def mpesa_payment_callback(request):
                 elif name == 'PhoneNumber':
                     phone_number = value
             
-            print(f"Payment Status: Code={result_code}, Description={result_desc}")
-            print(f"CheckoutRequestID: {checkout_request_id}")
+            logger.info(
+                "M-PESA callback: code=%s description=%s checkout_request_id=%s",
+                result_code, result_desc, checkout_request_id
+            )
             
             # Find payment by checkout_request_id
             try:
@@ -145,47 +170,31 @@ def mpesa_payment_callback(request):
                 
                 if result_code == 0 or str(result_code) == '0':
                     # Payment successful (ResultCode 0 = success)
-                    payment.deposit_paid = True
-                    payment.status = 'completed'
-                    payment.deposit_transaction_id = mpesa_receipt
-                    payment.save()
-                    
-                    order.status = 'payment_confirmed'
-                    order.save()
-                    
-                    # Create status history
-                    OrderStatusHistory.objects.create(
-                        order=order,
-                        status='payment_confirmed',
-                        note=f'Payment confirmed via M-PESA. Receipt: {mpesa_receipt}'
-                    )
-                    
-                    # Create notification for customer
-                    Notification.objects.create(
-                        user=order.customer if order.customer else None,
-                        email=order.customer_email if not order.customer else None,
-                        order=order,
-                        type='payment_received',
-                        message=f'Payment confirmed! Receipt: {mpesa_receipt}'
-                    )
+                    with transaction.atomic():
+                        payment.deposit_paid = True
+                        payment.deposit_paid_date = timezone.now()
+                        payment.status = 'completed'
+                        payment.deposit_transaction_id = mpesa_receipt or ''
+                        payment.save()
+                        
+                        # Confirms the order and notifies the customer
+                        try:
+                            transition(order, 'processing', note=f'Payment confirmed via M-PESA. Receipt: {mpesa_receipt}')
+                        except InvalidTransition:
+                            record_event(order, f'Payment received via M-PESA for a {order.get_status_display()} order. Receipt: {mpesa_receipt}')
                     
-                    print(f"✓ Payment confirmed for order {order.order_code}")
+                    logger.info("Payment confirmed for order %s", order.order_code)
                 else:
-                    # Payment failed or was cancelled
+                    # Payment failed or was cancelled; the order stays as it is so the customer can retry
                     payment.status = 'failed'
                     payment.save()
                     
-                    # Create status history
-                    OrderStatusHistory.objects.create(
-                        order=order,
-                        status='payment_failed',
-                        note=f'Payment failed: {result_desc}'
-                    )
+                    record_event(order, f'Payment failed: {result_desc}')
                     
-                    print(f"✗ Payment failed for order {order.order_code}: {result_desc}")
+                    logger.warning("Payment failed for order %s: %s", order.order_code, result_desc)
                     
             except Payment.DoesNotExist:
-                print(f"Warning: Payment not found for CheckoutRequestID {checkout_request_id}")
+                logger.warning("Payment not found for CheckoutRequestID %s", checkout_request_id)
                 # Still return success to acknowledge receipt
                 pass
                 
@@ -193,15 +202,33 @@ def mpesa_payment_callback(request):
             return JsonResponse({'ResultCode': 0, 'ResultDesc': 'Accepted'})
             
         except json.JSONDecodeError as e:
-            print(f"JSON Decode Error in callback: {str(e)}")
+            logger.warning("Invalid JSON in M-PESA callback: %s", e)
             return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
         except Exception as e:
-            print(f"Error processing M-PESA callback: {str(e)}")
+            logger.exception("Error processing M-PESA callback")
             return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
     
     return JsonResponse({'status': 'error'}, status=405)
 
 
+def _payment_status_etag(request, order_code):
+    """
+    ETag for payment states that only change through our own writes. Pending
+    M-PESA payments get none, so every poll still asks M-PESA.
+    """
+    row = Payment.objects.filter(order__order_code=order_code).values_list(
+        'status', 'deposit_paid', 'checkout_request_id', 'updated_at', 'order__status', 'order__updated_at'
+    ).first()
+    if row is None:
+        return None
+    status, deposit_paid, checkout_request_id, updated_at, order_status, order_updated_at = row
+    if checkout_request_id and not (status == 'completed' or deposit_paid):
+        return None
+    return f'payment-{order_code}-{status}-{int(deposit_paid)}-{order_status}-{updated_at.timestamp()}-{order_updated_at.timestamp()}'
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_payment_status_etag)
 def check_payment_status_api(request, order_code):
     """
     API endpoint to check M-PESA payment status
@@ -241,18 +268,16 @@ def check_payment_status_api(request, order_code):
                     # ResultCode 0 = success, 1 = failed
                     if result_code == 0 or str(result_code) == '0':
                         # Payment successful
-                        payment.deposit_paid = True
-                        payment.status = 'completed'
-                        payment.save()
-                        
-                        order.status = 'payment_confirmed'
-                        order.save()
-                        
-                        OrderStatusHistory.objects.create(
-                            order=order,
-                            status='payment_confirmed',
-                            note='Payment confirmed via M-PESA polling check'
-                        )
+                        with transaction.atomic():
+                            payment.deposit_paid = True
+                            payment.deposit_paid_date = timezone.now()
+                            payment.status = 'completed'
+                            payment.save()
+                            
+                            try:
+                                transition(order, 'processing', note='Payment confirmed via M-PESA polling check')
+                            except InvalidTransition:
+                                record_event(order, 'Payment confirmed via M-PESA polling check')
                         
                         return JsonResponse({
                             'success': True,
@@ -290,7 +315,7 @@ def check_payment_status_api(request, order_code):
                 'message': 'Order not found'
             }, status=404)
         except Exception as e:
-            print(f"Error checking payment status: {str(e)}")
+            logger.exception("Error checking payment status for order %s", order_code)
             return JsonResponse({
                 'success': False,
                 'payment_status': 'error',
@@ -323,42 +348,186 @@ def track_order(request):
 
 def order_status(request, order_code):
     order = get_object_or_404(Order, order_code=order_code)
-    status_history = order.status_history.all()
+    status_history = order.status_history.select_related('seller_order__seller__seller_profile')
     
-    # Check if user is the seller of this order
-    is_seller = False
-    if request.user.is_authenticated:
-        # Check if any of the order's products belong to this seller
-        seller_products = order.items.filter(product__seller=request.user).exists()
-        is_seller = seller_products
+    # Sellers manage only their own part of the order
+    seller_order = seller_order_for(order, request.user)
+    is_seller = seller_order is not None
     
     if request.method == 'POST' and is_seller:
         new_status = request.POST.get('new_status', '').strip()
         note = request.POST.get('note', '').strip()
         
-        if new_status in dict(Order.STATUS_CHOICES):
-            order.status = new_status
-            order.save()
-            
-            # Create status history record
-            OrderStatusHistory.objects.create(
-                order=order,
-                status=new_status,
-                note=note
-            )
-            
-            messages.success(request, f'Order status updated to {order.get_status_display()}')
-            return redirect('orders:order_status', order_code=order.order_code)
+        try:
+            changed = bulk_transition_seller_orders(SellerOrder.objects.filter(pk=seller_order.pk), new_status, note=note)
+        except InvalidTransition as e:
+            messages.error(request, str(e))
+        else:
+            if changed:
+                messages.success(request, f'Your items are now {dict(Order.STATUS_CHOICES)[new_status]}')
+            else:
+                messages.error(request, f'Your items cannot move from {seller_order.get_status_display()} to that status')
+        return redirect('orders:order_status', order_code=order.order_code)
     
     context = {
         'order': order,
         'status_history': status_history,
+        'seller_orders': order.seller_orders.select_related('seller__seller_profile').order_by('pk'),
+        'seller_order': seller_order,
         'is_seller': is_seller,
         'can_update': is_seller,
+        'next_statuses': next_statuses(seller_order.status) if is_seller else [],
     }
     return render(request, 'orders/order_status.html', context)
 
 
+def _apply_bulk_status(seller, order_filter, new_status, note):
+    """
+    Move the seller's part of the selected orders to ``new_status`` in one bulk
+    transition. Returns (updated_codes, skipped_codes).
+    """
+    if new_status not in TRANSITIONS:
+        raise InvalidTransition(f'Unknown status "{new_status}"')
+    selected = dict(
+        SellerOrder.objects.filter(seller=seller, **order_filter).values_list('pk', 'order__order_code')
+    )
+    updated_ids = bulk_transition_seller_orders(SellerOrder.objects.filter(pk__in=list(selected)), new_status, note=note)
+    updated = sorted(selected.pop(pk) for pk in updated_ids)
+    return updated, sorted(selected.values())
+
+
+@login_required
+def seller_fulfilment(request):
+    """List the seller's orders and apply one status change to many of them at once"""
+    if not request.user.is_seller:
+        messages.error(request, 'Only sellers can access this page.')
+        return redirect('shop:home')
+    
+    if request.method == 'POST':
+        order_ids = [value for value in request.POST.getlist('orders') if value.isdigit()][:MAX_BULK_ORDERS]
+        new_status = request.POST.get('new_status', '').strip()
+        note = request.POST.get('note', '').strip()
+        
+        if not order_ids:
+            messages.error(request, 'Select at least one order.')
+        else:
+            try:
+                updated, skipped = _apply_bulk_status(request.user, {'order_id__in': order_ids}, new_status, note)
+            except InvalidTransition as e:
+                messages.error(request, str(e))
+            else:
+                if updated:
+                    messages.success(request, f'{len(updated)} order(s) updated to {dict(Order.STATUS_CHOICES)[new_status]}.')
+                if skipped:
+                    messages.warning(request, f'{len(skipped)} order(s) could not move to that status: {", ".join(skipped[:20])}')
+        return redirect(request.get_full_path())
+    
+    status_filter = request.GET.get('status', '')
+    seller_orders = SellerOrder.objects.filter(seller=request.user).select_related('order').order_by('-created_at')
+    if status_filter:
+        seller_orders = seller_orders.filter(status=status_filter)
+    page = Paginator(seller_orders, FULFILMENT_PAGE_SIZE).get_page(request.GET.get('page'))
+    
+    # Only offer statuses some order on this page can move to
+    page_statuses = {seller_order.status for seller_order in page}
+    bulk_statuses = [
+        (value, label) for value, label in Order.STATUS_CHOICES
+        if any(value in TRANSITIONS[status] for status in page_statuses)
+    ]
+    
+    context = {
+        'page': page,
+        'status_filter': status_filter,
+        'order_statuses': Order.STATUS_CHOICES,
+        'bulk_statuses': bulk_statuses,
+    }
+    return render(request, 'orders/seller_fulfilment.html', context)
+
+
+@login_required
+def delivery_runs(request):
+    """The seller's open orders grouped by delivery zone, one group per run"""
+    if not request.user.is_seller:
+        messages.error(request, 'Only sellers can access this page.')
+        return redirect('shop:home')
+    
+    seller_orders = (
+        SellerOrder.objects.filter(seller=request.user, status__in=DELIVERY_RUN_STATUSES)
+        .select_related('order__delivery_zone')
+        .order_by(
+            F('order__delivery_zone__priority').desc(nulls_last=True), 'order__delivery_zone__name',
+            'order__delivery_zone', 'status', 'created_at',
+        )
+    )
+    
+    context = {
+        'seller_orders': seller_orders,
+        'run_statuses': [label for value, label in Order.STATUS_CHOICES if value in DELIVERY_RUN_STATUSES],
+    }
+    return render(request, 'orders/delivery_runs.html', context)
+
+
+def _parse_start(value):
+    """'lat,lng' from the query string as a pair of floats, or None"""
+    try:
+        latitude, longitude = (float(part) for part in value.split(','))
+    except ValueError:
+        return None
+    if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+        return latitude, longitude
+    return None
+
+
+@login_required
+def delivery_routes(request):
+    """Visiting order for the seller's on-the-way orders, one route per delivery zone"""
+    if not request.user.is_seller:
+        messages.error(request, 'Only sellers can access this page.')
+        return redirect('shop:home')
+    
+    start = _parse_start(request.GET.get('start', ''))
+    routes, unrouted = plan_routes(request.user, start)
+    
+    context = {
+        'routes': routes,
+        'unrouted': unrouted,
+        'start': start,
+    }
+    return render(request, 'orders/delivery_routes.html', context)
+
+
+@login_required
+@require_POST
+def seller_bulk_status_api(request):
+    """
+    JSON endpoint: {"orders": ["CR-...", ...], "status": "packed", "note": "..."}
+    Returns the order codes that were updated and those that were skipped.
+    """
+    if not request.user.is_seller:
+        return JsonResponse({'error': 'Only sellers can update orders'}, status=403)
+    try:
+        data = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    codes = data.get('orders') if isinstance(data, dict) else None
+    if not isinstance(codes, list) or not codes or not all(isinstance(code, str) for code in codes):
+        return JsonResponse({'error': '"orders" must be a non-empty list of order codes'}, status=400)
+    if len(codes) > MAX_BULK_ORDERS:
+        return JsonResponse({'error': f'At most {MAX_BULK_ORDERS} orders per request'}, status=400)
+    
+    try:
+        updated, skipped = _apply_bulk_status(
+            request.user, {'order__order_code__in': codes}, str(data.get('status', '')), str(data.get('note', '')).strip()
+        )
+    except InvalidTransition as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # Codes that are not the seller's orders are reported as skipped too
+    skipped += sorted(set(codes) - set(updated) - set(skipped))
+    return JsonResponse({'status': data['status'], 'updated': updated, 'skipped': skipped})
+
+
 @login_required
 def confirm_delivery(request, order_code):
     """Customer confirms delivery of order"""
@@ -388,20 +557,16 @@ def confirm_delivery(request, order_code):
         delivery_conf.confirmation_note = confirmation_note
         delivery_conf.save()
         
-        # Create notification for seller
-        notification = Notification.objects.create(
-            user=order.items.first().product.seller,
-            notification_type='delivery_pending',
+        # Let every seller in the order know
+        notify(
+            User.objects.filter(seller_orders__order=order),
+            'delivery_pending',
             title=f'Delivery Confirmed - {order.order_code}',
             message=f'Customer has confirmed delivery of order {order.order_code}',
-            order=order
-        )
-        
-        # Send email to seller
-        send_delivery_confirmation_email(
-            order.items.first().product.seller,
-            order,
-            request.user
+            order=order,
+            email_template='emails/delivery_confirmed_seller.html',
+            email_subject=f'✅ Delivery Confirmed for Order {order.order_code}',
+            email_context={'customer_name': request.user.first_name},
         )
         
         messages.success(request, 'Delivery confirmed! You can now leave a review.')
@@ -431,11 +596,22 @@ def leave_review(request, order_code):
         messages.error(request, 'You must confirm delivery before leaving a review.')
         return redirect('orders:confirm_delivery', order_code=order_code)
     
-    # Get the seller (from first product)
-    seller = order.items.first().product.seller
+    # Each seller's group is reviewed on its own; without a choice, take the first one not yet reviewed
+    delivered = order.seller_orders.filter(status='delivered', seller__isnull=False).select_related('seller').order_by('pk')
+    seller_id = request.POST.get('seller') or request.GET.get('seller')
+    if seller_id:
+        seller_order = delivered.filter(seller_id=seller_id).first() if seller_id.isdigit() else None
+    else:
+        reviewed = SellerReview.objects.filter(order=order, customer=request.user).values('seller_id')
+        seller_order = delivered.exclude(seller_id__in=reviewed).first() or delivered.first()
+    
+    if seller_order is None:
+        messages.error(request, 'That seller has not delivered their part of this order yet.')
+        return redirect('orders:order_status', order_code=order_code)
+    seller = seller_order.seller
     
     # Check if review already exists
-    existing_review = SellerReview.objects.filter(order=order, customer=request.user).first()
+    existing_review = SellerReview.objects.filter(order=order, customer=request.user, seller=seller).first()
     
     if request.method == 'POST':
         rating = request.POST.get('rating', 5)
@@ -462,17 +638,17 @@ def leave_review(request, order_code):
             )
             messages.success(request, 'Thank you for your review!')
             
-            # Create notification for seller
-            notification = Notification.objects.create(
-                user=seller,
-                notification_type='review_request',
+            notify(
+                [seller],
+                'review_request',
                 title=f'New Review from {request.user.first_name}',
                 message=f'You received a {rating}-star review for order {order.order_code}',
-                order=order
+                order=order,
+                email_template='emails/seller_review.html',
+                email_subject=f'⭐ New {review.rating}-Star Review from {request.user.first_name}',
+                email_context={'customer_name': request.user.first_name, 'rating': review.rating,
+                               'title': review.title, 'comment': review.comment},
             )
-            
-            # Send email to seller about review
-            send_seller_review_notification_email(seller, review)
         
         return redirect('accounts:customer_dashboard')
     
@@ -487,7 +663,42 @@ def leave_review(request, order_code):
     context = {
         'order': order,
         'seller': seller,
+        'other_sellers': [group.seller for group in delivered if group.pk != seller_order.pk],
         'existing_review': existing_review,
         'rating_choices': rating_choices,
     }
     return render(request, 'orders/leave_review.html', context)
+
+
+@login_required
+def notification_center(request):
+    """Paginated list of the user's notifications"""
+    notifications = request.user.notifications.select_related('order')
+    show_unread = request.GET.get('filter') == 'unread'
+    if show_unread:
+        notifications = notifications.filter(is_read=False)
+    page = Paginator(notifications.order_by('-created_at', '-pk'), settings.NOTIFICATIONS_PER_PAGE).get_page(request.GET.get('page'))
+    
+    context = {
+        'page': page,
+        'show_unread': show_unread,
+    }
+    return render(request, 'orders/notifications.html', context)
+
+
+@login_required
+@require_POST
+def mark_notifications_read(request):
+    """Mark the posted notification ids (or all of them) as read with one UPDATE"""
+    notifications = request.user.notifications.filter(is_read=False)
+    ids = [value for value in request.POST.getlist('ids') if value.isdigit()]
+    if ids:
+        notifications = notifications.filter(pk__in=ids)
+    marked = notifications.update(is_read=True)
+    
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'marked': marked})
+    next_url = request.POST.get('next', '')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        next_url = reverse('orders:notification_center')
+    return redirect(next_url)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Category, Product, ProductImage, SellerReview
+from .models import Category, Product, ProductImage, ProductVariant, SellerReview
+from .variants import sync_variants
 
 
 class ProductImageInline(admin.TabularInline):
@@ -7,6 +8,12 @@ class ProductImageInline(admin.TabularInline):
     extra = 1
 
 
+class ProductVariantInline(admin.TabularInline):
+    model = ProductVariant
+    extra = 0
+    fields = ['color', 'size', 'stock', 'price_delta']
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug', 'created_at']
@@ -21,7 +28,13 @@ class ProductAdmin(admin.ModelAdmin):
     list_editable = ['price', 'stock', 'available', 'featured']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name', 'description']
-    inlines = [ProductImageInline]
+    inlines = [ProductVariantInline, ProductImageInline]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Inline stock edits change the product total; a change to the total
+        # itself was already spread over the variants when the product was saved
+        sync_variants([form.instance], spread_stock=False)
 
 
 @admin.register(ProductImage)
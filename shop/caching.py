@@ -0,0 +1,137 @@
+"""
+Storefront page cache.
+
+Anonymous GETs of the catalog pages are served from the default cache. Keys
+are built from the path, the sorted query string, the visitor's cart count
+and a catalog version that Product, Category and SellerReview changes bump
+(see shop/signals.py), so an edit invalidates every cached page at once
+without enumerating them. Old entries simply age out.
+
+Pages carry a CSRF token for the add-to-cart forms; it is swapped for a
+placeholder before storing and replaced with the visitor's own token when
+served. Requests with pending flash messages are never cached or served
+from cache.
+
+The catalog version lives in the cache, so with per-process local memory a
+worker that never saw an edit would keep serving its old pages. Pages,
+template fragments, facet counts and ETags are therefore only cached or
+sent when every worker shares the cache (SHARED_CACHE, set by CACHE_DIR).
+"""
+import hashlib
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from .models import Product
+
+CATALOG_VERSION_KEY = 'catalog:version'
+FRAGMENT_CACHE_TIMEOUT = 3600
+CSRF_PLACEHOLDER = b'__csrf_token__'
+
+_CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def get_version(key):
+    """Current value of a version counter kept in the default cache"""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+        return cache.incr(key)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalidate every cached storefront page and fragment"""
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def _cart_count(request):
+    cart = request.session.get('cart', {})
+    return sum(item.get('quantity', 0) for item in cart.values())
+
+
+def page_cache_key(request):
+    query = '&'.join(sorted(request.GET.urlencode().split('&')))
+    raw = f'{request.path}?{query}|cart={_cart_count(request)}'
+    digest = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+    return f'storefront:page:{get_catalog_version()}:{digest}'
+
+
+def is_storefront_request(request):
+    """Anonymous page views that render the same for everyone with the same cart"""
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        # len() loads pending messages without marking them as shown
+        and not len(messages.get_messages(request))
+    )
+
+
+def cache_storefront_page(view):
+    """Serve anonymous visitors a cached copy of ``view``'s page"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.SHARED_CACHE or settings.STOREFRONT_CACHE_TIMEOUT <= 0 or not is_storefront_request(request):
+            return view(request, *args, **kwargs)
+
+        key = page_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            token = get_token(request).encode()
+            response = HttpResponse(content.replace(CSRF_PLACEHOLDER, token), content_type=content_type)
+            response['X-Storefront-Cache'] = 'hit'
+            return response
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            content = _CSRF_INPUT.sub(rb'\g<1>' + CSRF_PLACEHOLDER + rb'\g<2>', response.content)
+            cache.set(key, (content, response['Content-Type']), settings.STOREFRONT_CACHE_TIMEOUT)
+            response['X-Storefront-Cache'] = 'miss'
+        return response
+
+    return wrapper
+
+
+def storefront_etag(request, *parts):
+    """
+    ETag for an anonymous storefront page, or None to always render. The CSRF
+    cookie is part of it so a revalidated copy never carries a stale token.
+    """
+    if not settings.SHARED_CACHE or not is_storefront_request(request):
+        return None
+    raw = '|'.join(str(part) for part in (
+        get_catalog_version(), _cart_count(request), request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''), *parts,
+    ))
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def catalog_etag(request, *args, **kwargs):
+    return storefront_etag(request)
+
+
+def product_etag(request, slug):
+    if not settings.SHARED_CACHE or not is_storefront_request(request):
+        return None
+    updated_at = Product.objects.filter(slug=slug, available=True).order_by().values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    return storefront_etag(request, updated_at.isoformat())
@@ -0,0 +1,302 @@
+"""
+Bulk product catalog import/export.
+
+Rows are streamed from CSV, JSON arrays or JSON Lines, validated and written
+in batches with one upsert per batch. Rows with a ``slug`` update that
+product (if it belongs to the importing seller); rows without one create a
+new product with a slug allocated from its name.
+"""
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import IntegrityError, transaction
+
+from crochet_shop.streaming import csv_lines as stream_csv_lines
+
+from .caching import bump_catalog_version
+from .facets import sync_attributes
+from .variants import sync_variants
+from .models import Category, Product
+from .slugs import RESERVED_SLUGS, allocate_slugs
+
+FIELDS = ['slug', 'name', 'description', 'category', 'price', 'stock', 'available', 'featured',
+          'colors', 'sizes', 'image']
+UPDATE_FIELDS = ['name', 'description', 'category', 'price', 'stock', 'available', 'featured',
+                 'colors', 'sizes', 'image', 'updated_at']
+MAX_REPORTED_ERRORS = 1000
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n'}
+
+_WHITESPACE = re.compile(r'[\s,]*')
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+
+# Readers
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.json', '.jsonl', '.ndjson')):
+        return 'json'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def text_stream(stream):
+    """Wrap a binary upload or file in a decoder without reading it into memory"""
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def read_csv_rows(stream):
+    reader = csv.DictReader(text_stream(stream))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_json_rows(stream, chunk_size=64 * 1024):
+    """Yield the objects of a top-level JSON array or of a JSON Lines file, one at a time"""
+    stream = text_stream(stream)
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size)
+    pos = _WHITESPACE.match(buffer).end()
+    in_array = buffer[pos:pos + 1] == '['
+    if in_array:
+        pos += 1
+    eof = not buffer
+    number = 0
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if in_array and buffer[pos:pos + 1] == ']':
+            return
+        if pos < len(buffer):
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError(f'Invalid JSON after record {number}')
+            else:
+                if end < len(buffer) or eof:
+                    number += 1
+                    yield number, value
+                    pos = end
+                    continue
+        elif eof:
+            if in_array:
+                raise ValueError('Unterminated JSON array')
+            return
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def read_rows(stream, fmt):
+    return read_json_rows(stream) if fmt == 'json' else read_csv_rows(stream)
+
+
+# Import
+
+SAVE_ATTEMPTS = 3
+
+def _parse_bool(value, default):
+    value = str(value).strip().lower() if value is not None else ''
+    if value == '':
+        return default
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValidationError(f'"{value}" is not a yes/no value')
+
+
+def _describe(error):
+    if hasattr(error, 'error_dict'):
+        return '; '.join(f'{name}: {message}' for name, messages in error.message_dict.items() for message in messages)
+    return '; '.join(error.messages)
+
+
+def _text(row, key):
+    value = row.get(key)
+    return '' if value is None else str(value).strip()
+
+
+class ProductImporter:
+    def __init__(self, seller, batch_size=500):
+        self.seller = seller
+        self.batch_size = batch_size
+        self.categories = {}
+        for category in Category.objects.all():
+            self.categories[category.slug] = category
+            self.categories[category.name.lower()] = category
+        self.seen_slugs = set()
+
+    def run(self, rows):
+        result = ImportResult()
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return result
+            self.import_batch(batch, result)
+
+    def build(self, row):
+        """Validate one row and return an unsaved Product (slug may be blank)"""
+        if not isinstance(row, dict):
+            raise ValidationError('Expected an object with product fields')
+        category_key = _text(row, 'category')
+        category = self.categories.get(category_key) or self.categories.get(category_key.lower())
+        if category is None:
+            raise ValidationError(f'Unknown category "{category_key}"')
+        try:
+            price = Decimal(_text(row, 'price'))
+        except InvalidOperation:
+            price = None
+        if price is None or not price.is_finite() or price < 0:
+            raise ValidationError(f'Invalid price "{_text(row, "price")}"')
+        stock = _text(row, 'stock') or '0'
+        if not stock.isdigit():
+            raise ValidationError(f'Invalid stock "{stock}"')
+
+        product = Product(
+            slug=_text(row, 'slug'),
+            name=_text(row, 'name'),
+            description=_text(row, 'description'),
+            category=category,
+            seller=self.seller,
+            price=price,
+            stock=int(stock),
+            available=_parse_bool(row.get('available'), True),
+            featured=_parse_bool(row.get('featured'), False),
+            colors=_text(row, 'colors'),
+            sizes=_text(row, 'sizes'),
+            image=_text(row, 'image'),
+        )
+        if product.slug:
+            validate_slug(product.slug)
+            if product.slug in RESERVED_SLUGS:
+                raise ValidationError(f'Slug "{product.slug}" is reserved')
+        if len(product.image.name) > Product._meta.get_field('image').max_length:
+            raise ValidationError('Image path is too long')
+        product.clean_fields(exclude=['slug', 'category', 'seller', 'image'])
+        return product
+
+    def sync_derived(self, products):
+        """Facet attributes and variants, which post_save would keep up to date for single saves"""
+        # Upserts do not return primary keys on every backend
+        missing = {product.slug: product for product in products if product.pk is None}
+        for slug, pk in Product.objects.filter(slug__in=missing).values_list('slug', 'pk'):
+            missing[slug].pk = pk
+        sync_attributes(products)
+        sync_variants(products)
+
+    def import_batch(self, batch, result):
+        products = []
+        for row_number, row in batch:
+            try:
+                product = self.build(row)
+            except ValidationError as e:
+                result.add_error(row_number, _describe(e))
+                continue
+            if product.slug:
+                if product.slug in self.seen_slugs:
+                    result.add_error(row_number, f'Duplicate slug "{product.slug}" in file')
+                    continue
+                self.seen_slugs.add(product.slug)
+            products.append((row_number, product))
+
+        existing = dict(
+            (slug, (seller_id, image)) for slug, seller_id, image in Product.objects.filter(
+                slug__in=[product.slug for _, product in products if product.slug]
+            ).values_list('slug', 'seller_id', 'image')
+        )
+        inserts, upserts, new_products = [], [], []
+        for row_number, product in products:
+            if product.slug in existing:
+                seller_id, image = existing[product.slug]
+                if seller_id != self.seller.pk:
+                    result.add_error(row_number, f'Slug "{product.slug}" belongs to another seller')
+                    continue
+                # Keep the current photo when the row leaves the image column blank
+                product.image = product.image.name or image
+                upserts.append((row_number, product))
+            else:
+                if not product.image.name:
+                    result.add_error(row_number, 'Image is required for new products')
+                    continue
+                if not product.slug:
+                    new_products.append(product)
+                inserts.append((row_number, product))
+
+        for attempt in range(SAVE_ATTEMPTS):
+            slugs = allocate_slugs(Product, [product.name for product in new_products], fallback='product')
+            for product, slug in zip(new_products, slugs):
+                product.slug = slug
+            try:
+                with transaction.atomic():
+                    # New rows are plain inserts so a slug taken concurrently fails instead of
+                    # overwriting someone else's product; only rows we own are upserted.
+                    Product.objects.bulk_create([product for _, product in inserts])
+                    Product.objects.bulk_create(
+                        [product for _, product in upserts],
+                        update_conflicts=True, unique_fields=['slug'], update_fields=UPDATE_FIELDS,
+                    )
+                    self.sync_derived([product for _, product in inserts + upserts])
+                break
+            except IntegrityError as e:
+                # Another writer may have taken one of the allocated slugs; allocate again
+                if not new_products or attempt == SAVE_ATTEMPTS - 1:
+                    for row_number, _ in inserts + upserts:
+                        result.add_error(row_number, f'Could not save batch: {e}')
+                    return
+                for _, product in inserts:
+                    product.pk = None
+        # bulk_create sends no post_save, so invalidate cached pages here
+        bump_catalog_version()
+        self.seen_slugs.update(product.slug for product in new_products)
+        result.created += len(inserts)
+        result.updated += len(upserts)
+
+
+# Export
+
+def export_rows(queryset, chunk_size=2000):
+    columns = ['slug', 'name', 'description', 'category__slug', 'price', 'stock', 'available', 'featured',
+               'colors', 'sizes', 'image']
+    for values in queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size):
+        yield dict(zip(FIELDS, values))
+
+
+def csv_lines(rows):
+    return stream_csv_lines(FIELDS, ([row[name] for name in FIELDS] for row in rows))
+
+
+def json_lines(rows):
+    """Stream a JSON array one product per line"""
+    yield '['
+    separator = '\n'
+    for row in rows:
+        row['price'] = str(row['price'])
+        yield separator + json.dumps(row)
+        separator = ',\n'
+    yield '\n]\n'
@@ -1,3 +1,8 @@
+from django.db import DEFAULT_DB_ALIAS
+
+from django.conf import settings
+
+from .caching import FRAGMENT_CACHE_TIMEOUT, get_catalog_version
 from .models import Category
 
 
@@ -8,8 +13,15 @@ def cart_context(request):
 
 
 def categories_context(request):
-    categories = Category.objects.all()
-    return {'all_categories': categories}
+    # Lazy, so a cached navigation fragment never runs the query. Read from
+    # the primary: the fragment is shared under the current catalog version.
+    # A timeout of 0 skips the fragment cache when workers don't share it.
+    categories = Category.objects.using(DEFAULT_DB_ALIAS)
+    return {
+        'all_categories': categories,
+        'catalog_version': get_catalog_version(),
+        'fragment_cache_timeout': FRAGMENT_CACHE_TIMEOUT if settings.SHARED_CACHE else 0,
+    }
 
 
 def notifications_context(request):
@@ -0,0 +1,154 @@
+"""
+Faceted browsing for product_list.
+
+Colors and sizes are normalized out of the comma-separated Product fields
+into AttributeValue/ProductAttribute (see ``sync_attributes``) so filters
+are index lookups. Within a facet, selected values are OR'ed; facets are
+AND'ed. Each facet's counts ignore that facet's own selection, so picking
+"Red" still shows how many products are "Blue". Counts are one grouped
+query per facet with a selection plus one shared query for the rest, and
+are cached per filter state under the catalog version when the cache is
+shared between workers.
+"""
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.text import slugify
+
+from .caching import get_catalog_version
+from .models import AttributeValue, Product, ProductAttribute
+
+ATTRIBUTE_KINDS = [kind for kind, _ in AttributeValue.KIND_CHOICES]
+FACET_CACHE_TIMEOUT = 3600
+
+
+def _product_attributes(product):
+    """{(kind, slug): name} for a product's colors and sizes"""
+    values = {}
+    for kind, names in (('color', product.get_colors_list()), ('size', product.get_sizes_list())):
+        for name in names:
+            slug = slugify(name)[:60]
+            if slug:
+                values.setdefault((kind, slug), name[:50])
+    return values
+
+
+def sync_attributes(products):
+    """Replace the attribute links of saved ``products`` with their current colors and sizes"""
+    wanted = {product.pk: _product_attributes(product) for product in products}
+    names = {key: name for values in wanted.values() for key, name in values.items()}
+    AttributeValue.objects.bulk_create(
+        [AttributeValue(kind=kind, slug=slug, name=name) for (kind, slug), name in names.items()],
+        ignore_conflicts=True,
+    )
+    value_ids = {
+        (kind, slug): pk for pk, kind, slug in AttributeValue.objects.filter(
+            slug__in={slug for _, slug in names}
+        ).values_list('pk', 'kind', 'slug')
+    }
+    ProductAttribute.objects.filter(product_id__in=wanted).delete()
+    ProductAttribute.objects.bulk_create([
+        ProductAttribute(product_id=product_id, value_id=value_ids[key])
+        for product_id, values in wanted.items() for key in values
+    ])
+
+
+def _decimal(value):
+    try:
+        value = Decimal(value)
+    except (InvalidOperation, TypeError):
+        return None
+    return value if value.is_finite() else None
+
+
+def parse_filters(params):
+    """Normalized filter state from the query string; equal states produce equal dicts"""
+    filters = {
+        'category': sorted(set(params.getlist('category')) - {''}),
+        'min_price': _decimal(params.get('min_price')),
+        'max_price': _decimal(params.get('max_price')),
+        'in_stock': params.get('availability') == 'in_stock',
+    }
+    for kind in ATTRIBUTE_KINDS:
+        filters[kind] = sorted(set(params.getlist(kind)) - {''})
+    return filters
+
+
+def filter_products(products, filters, skip=None):
+    """Apply ``filters`` to a Product queryset, leaving out the ``skip`` facet"""
+    if filters['category'] and skip != 'category':
+        products = products.filter(category__slug__in=filters['category'])
+    for kind in ATTRIBUTE_KINDS:
+        if filters[kind] and skip != kind:
+            products = products.filter(pk__in=ProductAttribute.objects.filter(
+                value__kind=kind, value__slug__in=filters[kind],
+            ).values('product_id'))
+    if filters['min_price'] is not None:
+        products = products.filter(price__gte=filters['min_price'])
+    if filters['max_price'] is not None:
+        products = products.filter(price__lte=filters['max_price'])
+    if filters['in_stock']:
+        products = products.filter(stock__gt=0)
+    return products
+
+
+def _attribute_counts(filters, kinds, skip=None):
+    products = filter_products(Product.objects.filter(available=True), filters, skip=skip)
+    rows = (
+        ProductAttribute.objects.filter(value__kind__in=kinds, product_id__in=products.values('pk'))
+        .values_list('value__kind', 'value__slug', 'value__name')
+        .annotate(count=Count('product_id'))
+        .order_by('value__kind', 'value__name')
+    )
+    counts = {kind: [] for kind in kinds}
+    for kind, slug, name, count in rows:
+        counts[kind].append((slug, name, count))
+    return counts
+
+
+def _compute(filters):
+    products = filter_products(Product.objects.filter(available=True), filters, skip='category')
+    counts = {'category': list(
+        products.values_list('category__slug', 'category__name')
+        .annotate(count=Count('pk')).order_by('category__name')
+    )}
+    # Facets without a selection all count against the fully filtered set, so share one query
+    selected = [kind for kind in ATTRIBUTE_KINDS if filters[kind]]
+    unselected = [kind for kind in ATTRIBUTE_KINDS if not filters[kind]]
+    if unselected:
+        counts.update(_attribute_counts(filters, unselected))
+    for kind in selected:
+        counts.update(_attribute_counts(filters, [kind], skip=kind))
+    return counts
+
+
+def facet_options(filters, counts):
+    """Template rows per facet; selected values stay listed (with 0) even when nothing matches"""
+    options = {}
+    for facet, rows in counts.items():
+        selected = set(filters[facet])
+        options[facet] = [
+            {'slug': slug, 'name': name, 'count': count, 'selected': slug in selected} for slug, name, count in rows
+        ]
+        listed = {slug for slug, _, _ in rows}
+        options[facet] += [
+            {'slug': slug, 'name': slug, 'count': 0, 'selected': True} for slug in filters[facet] if slug not in listed
+        ]
+    return options
+
+
+def facet_counts(filters):
+    """{facet: [(slug, name, count), ...]} for the filter state, cached until the catalog changes"""
+    if not settings.SHARED_CACHE:
+        return _compute(filters)
+    state = json.dumps(filters, sort_keys=True, default=str)
+    key = f'facets:{get_catalog_version()}:{hashlib.md5(state.encode(), usedforsecurity=False).hexdigest()}'
+    counts = cache.get(key)
+    if counts is None:
+        counts = _compute(filters)
+        cache.set(key, counts, FACET_CACHE_TIMEOUT)
+    return counts
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from shop.catalog_io import csv_lines, detect_format, export_rows, json_lines
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Stream products to a CSV or JSON file in the format accepted by import_products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='Destination file (default: stdout)')
+        parser.add_argument('--seller', default='', help='Only export this seller\'s products')
+        parser.add_argument('--format', choices=['csv', 'json'], default=None,
+                            help='File format (default: from the output extension, else csv)')
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['seller']:
+            seller = CustomUser.objects.get_by_email(options['seller'])
+            if seller is None:
+                raise CommandError(f'No user with email "{options["seller"]}"')
+            products = products.filter(seller=seller)
+
+        fmt = options['format'] or detect_format(options['output'])
+        lines = (json_lines if fmt == 'json' else csv_lines)(export_rows(products))
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            for line in lines:
+                f.write(line)
+        self.stdout.write(self.style.SUCCESS(f'✅ Exported products to {options["output"]}'))
@@ -0,0 +1,369 @@
+import random
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser, SellerProfile
+from chat.models import Conversation, Message
+from orders.models import Order, OrderItem, Payment, SellerOrder
+from shop.facets import sync_attributes
+from shop.models import Category, Product, ProductImage, SellerReview
+from shop.variants import sync_variants
+
+BENCHMARK_PASSWORD = 'benchmark123'
+
+CATEGORY_NAMES = ['Bags', 'Sweaters', 'Tops', 'Dolls', 'Hats', 'Accessories', 'Blankets', 'Baby']
+ADJECTIVES = ['Chunky', 'Cozy', 'Boho', 'Mini', 'Summer', 'Vintage', 'Granny Square', 'Pastel', 'Classic', 'Striped']
+NOUNS = ['Tote Bag', 'Cardigan', 'Crop Top', 'Bunny', 'Beanie', 'Scarf', 'Blanket', 'Booties', 'Coasters', 'Bucket Hat']
+COLORS = ['White', 'Cream', 'Pink', 'Sage', 'Navy', 'Yellow', 'Brown', 'Gray', 'Lilac']
+SIZES = ['XS', 'S', 'M', 'L', 'XL']
+ORDER_STATUSES = ['pending', 'processing', 'packed', 'on_the_way', 'delivered', 'delivered', 'cancelled']
+CHAT_LINES = [
+    'Hi, is this still available?', 'Yes it is!', 'Can I get it in another colour?',
+    'When will my order be shipped?', 'It is on the way.', 'Thank you, it arrived today.',
+]
+
+ORDER_CODE_MAX_LENGTH = Order._meta.get_field('order_code').max_length
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at values assigned by the generator"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class ProductTable:
+    """Compact per-product columns so millions of products fit in memory while orders are generated"""
+
+    def __init__(self):
+        self.ids = array('q')
+        self.seller_ids = array('q')
+        self.prices = array('l')
+        self.names = array('H')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, product, name_index):
+        self.ids.append(product.pk)
+        self.seller_ids.append(product.seller_id)
+        self.prices.append(int(product.price))
+        self.names.append(name_index)
+
+
+def product_name(name_index):
+    return f'{ADJECTIVES[name_index // len(NOUNS)]} {NOUNS[name_index % len(NOUNS)]}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a deterministic synthetic dataset (users, products, images, orders, payments, reviews, '
+        'conversations, messages) in chunked bulk_create batches. The same --seed and --anchor-date always '
+        'produce the same rows; each chunk is committed on its own so millions of rows stream through memory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sellers', type=int, default=20)
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--images-per-product', type=int, default=2)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--reviews', type=int, default=500)
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk_create chunk')
+        parser.add_argument('--prefix', default='bench', help='Prefix for generated emails, slugs and order codes')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--days', type=int, default=365, help='Spread timestamps over this many days')
+        parser.add_argument('--anchor-date', default='',
+                            help='Generate timestamps relative to this date (YYYY-MM-DD, default: today)')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.days = options['days']
+        self.counts = Counter()
+
+        anchor = options['anchor_date'] or timezone.localdate().isoformat()
+        try:
+            self.now = timezone.make_aware(datetime.fromisoformat(anchor))
+        except ValueError:
+            raise CommandError(f'Invalid --anchor-date "{anchor}", expected YYYY-MM-DD')
+
+        self.order_code_width = max(7, len(str(max(options['orders'] - 1, 0))))
+        if len(self.order_code(0)) > ORDER_CODE_MAX_LENGTH:
+            raise CommandError(
+                f'Order codes like "{self.order_code(0)}" exceed {ORDER_CODE_MAX_LENGTH} characters; use a shorter --prefix.'
+            )
+        if options['sellers'] < 1 or options['customers'] < 1 or options['products'] < 1:
+            raise CommandError('At least one seller, customer and product is required.')
+
+        if (CustomUser.objects.filter(email__startswith=f'{self.prefix}-').exists()
+                or Product.objects.filter(slug__startswith=f'{self.prefix}-product-').exists()
+                or Order.objects.filter(order_code__startswith=f'CR-{self.prefix}-').exists()):
+            raise CommandError(f'Data with prefix "{self.prefix}" already exists. Use a different --prefix.')
+
+        started = time.perf_counter()
+        categories = self.create_categories()
+        with explicit_timestamps(CustomUser, SellerProfile, Product, Order, SellerOrder, Payment, SellerReview,
+                                 Conversation, Message):
+            seller_ids = self.create_users('seller', options['sellers'])
+            customer_ids = self.create_users('customer', options['customers'])
+            products = self.create_products(options['products'], options['images_per_product'],
+                                            categories, seller_ids)
+            self.create_orders(options['orders'], customer_ids, products, options['reviews'], options['messages'])
+
+        elapsed = time.perf_counter() - started
+        total = sum(self.counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Generated {total} rows with prefix "{self.prefix}" in {elapsed:.1f}s '
+            f'({total / elapsed if elapsed else 0:.0f} rows/s). Password for all users: {BENCHMARK_PASSWORD}'
+        ))
+
+    # Helpers
+
+    def insert(self, model, objects, key=None):
+        """bulk_create one chunk; fill in primary keys by ``key`` on backends that cannot return them"""
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        if key and objects and objects[0].pk is None:
+            pks = dict(
+                model.objects.filter(**{f'{key}__in': [getattr(obj, key) for obj in objects]})
+                .values_list(key, 'pk')
+            )
+            for obj in objects:
+                obj.pk = pks[getattr(obj, key)]
+        self.counts[model.__name__] += len(objects)
+        return objects
+
+    def report(self, *models, started):
+        counts = ', '.join(f'{model.__name__}: {self.counts[model.__name__]}' for model in models)
+        self.stdout.write(f'  ✓ {counts} ({time.perf_counter() - started:.1f}s)')
+
+    def chunks(self, count):
+        for start in range(0, count, self.batch_size):
+            yield range(start, min(count, start + self.batch_size))
+
+    def random_past(self, days=None):
+        return self.now - timedelta(seconds=self.rng.randint(0, (days or self.days) * 86400))
+
+    def order_code(self, i):
+        return f'CR-{self.prefix}-{i:0{self.order_code_width}d}'
+
+    def email(self, user_type, i):
+        return f'{self.prefix}-{user_type}-{i}@example.com'
+
+    def phone(self, user_type, i):
+        # Derived from the index so orders can copy it without keeping users in memory
+        offset = 0 if user_type == 'customer' else 50000000
+        return f'07{10000000 + (offset + i * 7919) % 90000000}'
+
+    # Generators
+
+    def create_categories(self):
+        categories = []
+        for name in CATEGORY_NAMES:
+            category, _ = Category.objects.get_or_create(slug=name.lower(), defaults={'name': name})
+            categories.append(category)
+        return categories
+
+    def create_users(self, user_type, count):
+        started = time.perf_counter()
+        # Hashing once keeps generation fast; a fixed salt keeps the rows identical between runs
+        password = make_password(BENCHMARK_PASSWORD, salt=f'benchmarkseed{self.seed}')
+        ids = array('q')
+        for chunk in self.chunks(count):
+            users = []
+            for i in chunk:
+                email = self.email(user_type, i)
+                joined = self.random_past(self.days * 2)
+                users.append(CustomUser(
+                    username=email, email=email, password=password, user_type=user_type,
+                    first_name=f'{user_type.title()}{i}', phone_number=self.phone(user_type, i),
+                    date_joined=joined, created_at=joined, updated_at=joined,
+                ))
+            with transaction.atomic():
+                self.insert(CustomUser, users, key='email')
+                if user_type == 'seller':
+                    self.insert(SellerProfile, [
+                        SellerProfile(
+                            user_id=user.pk, shop_name=f'{user.first_name} Crochet', phone_number=user.phone_number,
+                            shop_address='Nairobi, Kenya', is_verified=True, verification_date=user.date_joined,
+                            created_at=user.date_joined, updated_at=user.date_joined,
+                        )
+                        for user in users
+                    ])
+            ids.extend(user.pk for user in users)
+        self.report(CustomUser, SellerProfile, started=started)
+        return ids
+
+    def create_products(self, count, images_per_product, categories, seller_ids):
+        started = time.perf_counter()
+        table = ProductTable()
+        name_count = len(ADJECTIVES) * len(NOUNS)
+        for chunk in self.chunks(count):
+            products = []
+            name_indexes = []
+            for i in chunk:
+                name_index = self.rng.randrange(name_count)
+                name = product_name(name_index)
+                created = self.random_past()
+                products.append(Product(
+                    category=self.rng.choice(categories),
+                    seller_id=self.rng.choice(seller_ids),
+                    name=name,
+                    slug=f'{self.prefix}-product-{i}',
+                    description=f'Handmade {name.lower()} crocheted with soft cotton yarn.',
+                    price=Decimal(self.rng.randrange(300, 6000, 50)),
+                    stock=self.rng.randint(0, 40),
+                    featured=self.rng.random() < 0.1,
+                    image=f'products/{self.prefix}-product-{i}.jpg',
+                    colors=', '.join(self.rng.sample(COLORS, self.rng.randint(1, 4))),
+                    sizes=', '.join(self.rng.sample(SIZES, self.rng.randint(0, 3))),
+                    created_at=created, updated_at=created,
+                ))
+                name_indexes.append(name_index)
+            with transaction.atomic():
+                self.insert(Product, products, key='slug')
+                sync_attributes(products)
+                sync_variants(products)
+                self.insert(ProductImage, [
+                    ProductImage(
+                        product_id=product.pk, image=f'products/{product.slug}-{n}.jpg',
+                        alt_text=f'{product.name} photo {n + 1}', order=n,
+                    )
+                    for product in products for n in range(images_per_product)
+                ])
+            for product, name_index in zip(products, name_indexes):
+                table.append(product, name_index)
+        self.report(Product, ProductImage, started=started)
+        return table
+
+    def create_orders(self, count, customer_ids, products, review_count, message_count):
+        started = time.perf_counter()
+        # Pick which orders get a review or a conversation up front so totals are exact
+        reviewed = set(self.rng.sample(range(count), min(review_count, count)))
+        conversation_count = min(count, max(1, message_count // 5)) if message_count else 0
+        conversation_slots = sorted(self.rng.sample(range(count), conversation_count))
+        messages_per_slot = {
+            slot: message_count // conversation_count + (1 if n < message_count % conversation_count else 0)
+            for n, slot in enumerate(conversation_slots)
+        }
+
+        for chunk in self.chunks(count):
+            orders = []
+            lines = {}
+            for i in chunk:
+                customer_index = self.rng.randrange(len(customer_ids))
+                picks = self.rng.sample(range(len(products)), min(len(products), self.rng.randint(1, 3)))
+                quantities = [self.rng.randint(1, 3) for _ in picks]
+                # Reviews are only left on delivered orders
+                status = 'delivered' if i in reviewed else self.rng.choice(ORDER_STATUSES)
+                created = self.random_past()
+                order = Order(
+                    order_code=self.order_code(i),
+                    customer_id=customer_ids[customer_index],
+                    customer_name=f'Customer{customer_index}',
+                    customer_phone=self.phone('customer', customer_index),
+                    customer_email=self.email('customer', customer_index),
+                    customer_address='Nairobi, Kenya',
+                    total_amount=Decimal(sum(products.prices[p] * q for p, q in zip(picks, quantities))),
+                    status=status,
+                    created_at=created,
+                    updated_at=created,
+                )
+                orders.append(order)
+                lines[i] = list(zip(picks, quantities))
+
+            with transaction.atomic():
+                self.insert(Order, orders, key='order_code')
+                # One fulfilment group per seller in each order
+                groups = {}
+                for i, order in zip(chunk, orders):
+                    for p, quantity in lines[i]:
+                        key = (order.pk, products.seller_ids[p])
+                        if key not in groups:
+                            groups[key] = SellerOrder(
+                                order_id=order.pk, seller_id=key[1], status=order.status, subtotal=Decimal(0),
+                                created_at=order.created_at, updated_at=order.created_at,
+                            )
+                        groups[key].subtotal += Decimal(products.prices[p]) * quantity
+                self.insert(SellerOrder, list(groups.values()))
+                if groups and next(iter(groups.values())).pk is None:
+                    for pk, order_id, seller_id in SellerOrder.objects.filter(
+                        order_id__in=[order.pk for order in orders]
+                    ).values_list('pk', 'order_id', 'seller_id'):
+                        groups[order_id, seller_id].pk = pk
+
+                items, payments, reviews, conversations = [], [], [], []
+                for i, order in zip(chunk, orders):
+                    for p, quantity in lines[i]:
+                        items.append(OrderItem(
+                            order_id=order.pk, seller_order_id=groups[order.pk, products.seller_ids[p]].pk,
+                            product_id=products.ids[p], product_name=product_name(products.names[p]),
+                            product_price=Decimal(products.prices[p]), quantity=quantity,
+                        ))
+                    paid = order.status != 'pending'
+                    payments.append(Payment(
+                        order_id=order.pk,
+                        deposit_amount=order.total_amount * Decimal('0.20'),
+                        balance_amount=order.total_amount * Decimal('0.80'),
+                        deposit_paid=paid,
+                        deposit_payment_method='mpesa',
+                        deposit_paid_date=order.created_at + timedelta(minutes=2) if paid else None,
+                        deposit_transaction_id=f'BENCH{i:010d}' if paid else '',
+                        checkout_request_id=f'ws_CO_{self.prefix}_{i}',
+                        status='completed' if paid else 'pending',
+                        created_at=order.created_at, updated_at=order.created_at,
+                    ))
+                    seller_id = products.seller_ids[lines[i][0][0]]
+                    if i in reviewed:
+                        # One review per order keeps (seller, customer, order) unique
+                        reviewed_at = order.created_at + timedelta(days=self.rng.randint(3, 14))
+                        reviews.append(SellerReview(
+                            seller_id=seller_id, customer_id=order.customer_id, order_id=order.pk,
+                            rating=self.rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 8, 12])[0],
+                            title='Lovely work', comment='Arrived quickly and looks great.',
+                            is_verified_purchase=True, created_at=reviewed_at, updated_at=reviewed_at,
+                        ))
+                    if i in messages_per_slot:
+                        conversations.append(Conversation(
+                            customer_id=order.customer_id, seller_id=seller_id, order_id=order.pk,
+                            created_at=order.created_at,
+                            updated_at=order.created_at + timedelta(minutes=10 * messages_per_slot[i]),
+                        ))
+                self.insert(OrderItem, items)
+                self.insert(Payment, payments)
+                self.insert(SellerReview, reviews)
+                self.insert(Conversation, conversations, key='order_id')
+                self.insert(Message, [
+                    Message(
+                        conversation_id=conversation.pk,
+                        sender_id=conversation.customer_id if n % 2 == 0 else conversation.seller_id,
+                        content=CHAT_LINES[n % len(CHAT_LINES)],
+                        is_read=self.rng.random() < 0.7,
+                        created_at=conversation.created_at + timedelta(minutes=10 * (n + 1)),
+                    )
+                    for conversation, i in zip(conversations, [s for s in chunk if s in messages_per_slot])
+                    for n in range(messages_per_slot[i])
+                ])
+        self.report(Order, SellerOrder, OrderItem, Payment, SellerReview, Conversation, Message, started=started)
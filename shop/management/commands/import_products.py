@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import CustomUser
+from shop.catalog_io import ProductImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import or update a seller\'s products from a CSV, JSON or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--seller', required=True, help='Email of the seller who owns the products')
+        parser.add_argument('--format', choices=['csv', 'json'], default=None,
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        seller = CustomUser.objects.get_by_email(options['seller'])
+        if seller is None or seller.user_type != 'seller':
+            raise CommandError(f'No seller with email "{options["seller"]}"')
+
+        fmt = options['format'] or detect_format(options['path'])
+        importer = ProductImporter(seller, batch_size=options['batch_size'])
+        try:
+            with open(options['path'], 'rb') as f:
+                result = importer.run(read_rows(f, fmt))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for row_number, message in result.errors:
+            self.stdout.write(self.style.WARNING(f'  Row {row_number}: {message}'))
+        if result.error_count > len(result.errors):
+            self.stdout.write(self.style.WARNING(f'  ... and {result.error_count - len(result.errors)} more errors'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {result.created} created, {result.updated} updated, {result.error_count} rows rejected'
+        ))
@@ -0,0 +1,64 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.runner import HttpSession, InProcessSession, run_benchmark
+from benchmarks.traffic import Catalog
+from shop.management.commands.generate_bulk_data import BENCHMARK_PASSWORD
+
+
+class Command(BaseCommand):
+    help = 'Replay the storefront traffic mix and report throughput and latency percentiles per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='',
+                            help='Target a running server (e.g. http://127.0.0.1:8000) instead of the in-process app')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run (default: 30)')
+        parser.add_argument('--iterations', type=int, default=None, help='Stop each virtual user after N actions')
+        parser.add_argument('--prefix', default='bench', help='Prefix used by generate_bulk_data')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', dest='json_path', default='', help='Also write the summary to this file')
+
+    def handle(self, *args, **options):
+        catalog = Catalog.load(prefix=options['prefix'])
+        if not catalog.product_ids:
+            raise CommandError('No products in stock. Run "python manage.py generate_bulk_data" first.')
+
+        base_url = options['base_url']
+        if base_url:
+            session_factory = lambda: HttpSession(base_url)
+            target = base_url
+        else:
+            session_factory = InProcessSession
+            target = 'in-process WSGI handler'
+
+        self.stdout.write(f'Running {options["concurrency"]} virtual users against {target}...')
+        result = run_benchmark(
+            session_factory, catalog, BENCHMARK_PASSWORD,
+            concurrency=options['concurrency'],
+            duration=options['duration'],
+            iterations=options['iterations'],
+            seed=options['seed'],
+        )
+        summary = result.summary()
+
+        header = f'{"endpoint":<18}{"reqs":>8}{"errors":>8}{"rps":>9}{"mean":>9}{"p50":>9}{"p95":>9}{"p99":>9}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in summary['endpoints']:
+            self.stdout.write(
+                f'{row["endpoint"]:<18}{row["requests"]:>8}{row["errors"]:>8}{row["rps"]:>9.1f}'
+                f'{row["mean_ms"]:>9.1f}{row["p50_ms"]:>9.1f}{row["p95_ms"]:>9.1f}{row["p99_ms"]:>9.1f}'
+            )
+        self.stdout.write('-' * len(header))
+        for name, sample in summary['error_samples'].items():
+            self.stdout.write(self.style.WARNING(f'  {name}: {sample[:200]}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {summary["total_requests"]} requests in {summary["elapsed_s"]:.1f}s '
+            f'({summary["throughput_rps"]:.1f} req/s, {summary["total_errors"]} errors). Latencies in ms.'
+        ))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(summary, f, indent=2)
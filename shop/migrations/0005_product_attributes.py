@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_generated_slugs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributeValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('color', 'Color'), ('size', 'Size')], max_length=10)),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField(max_length=60)),
+            ],
+            options={
+                'ordering': ['kind', 'name'],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'slug'), name='unique_attribute_value')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductAttribute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attribute_links', to='shop.product')),
+                ('value', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_links', to='shop.attributevalue')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['value', 'product'], name='product_attribute_value_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'value'), name='unique_product_attribute')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+from django.utils.text import slugify
+
+BATCH_SIZE = 2000
+
+
+def _values(product):
+    values = {}
+    for kind, field in (('color', product.colors), ('size', product.sizes)):
+        for name in (part.strip() for part in field.split(',')) if field else ():
+            slug = slugify(name)[:60]
+            if slug:
+                values.setdefault((kind, slug), name[:50])
+    return values
+
+
+def backfill_product_attributes(apps, schema_editor):
+    """Normalize the comma-separated colors and sizes of existing products"""
+    Product = apps.get_model('shop', 'Product')
+    AttributeValue = apps.get_model('shop', 'AttributeValue')
+    ProductAttribute = apps.get_model('shop', 'ProductAttribute')
+
+    value_ids = {}
+    last_pk = 0
+    while True:
+        products = list(Product.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'colors', 'sizes')[:BATCH_SIZE])
+        if not products:
+            break
+        last_pk = products[-1].pk
+        wanted = {product.pk: _values(product) for product in products}
+        new = {key: name for values in wanted.values() for key, name in values.items() if key not in value_ids}
+        AttributeValue.objects.bulk_create(
+            [AttributeValue(kind=kind, slug=slug, name=name) for (kind, slug), name in new.items()],
+            ignore_conflicts=True,
+        )
+        value_ids.update(
+            ((kind, slug), pk) for pk, kind, slug in AttributeValue.objects.filter(
+                slug__in={slug for _, slug in new}
+            ).values_list('pk', 'kind', 'slug')
+        )
+        ProductAttribute.objects.bulk_create([
+            ProductAttribute(product_id=product_id, value_id=value_ids[key])
+            for product_id, values in wanted.items() for key in values
+        ])
+
+
+def remove_product_attributes(apps, schema_editor):
+    apps.get_model('shop', 'ProductAttribute').objects.all().delete()
+    apps.get_model('shop', 'AttributeValue').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_attributes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_attributes, remove_product_attributes),
+    ]
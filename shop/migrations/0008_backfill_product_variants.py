@@ -0,0 +1,48 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def _options(value):
+    return [part.strip()[:50] for part in value.split(',') if part.strip()] if value else []
+
+
+def backfill_product_variants(apps, schema_editor):
+    """One variant per color x size of each product, sharing the product's stock out evenly"""
+    Product = apps.get_model('shop', 'Product')
+    ProductVariant = apps.get_model('shop', 'ProductVariant')
+
+    last_pk = 0
+    while True:
+        products = list(
+            Product.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'colors', 'sizes', 'stock')[:BATCH_SIZE]
+        )
+        if not products:
+            break
+        last_pk = products[-1][0]
+        variants = []
+        for pk, colors, sizes, stock in products:
+            pairs = list(dict.fromkeys(
+                (color, size) for color in _options(colors) or [''] for size in _options(sizes) or ['']
+            ))
+            base, extra = divmod(stock, len(pairs))
+            variants += [
+                ProductVariant(product_id=pk, color=color, size=size, stock=base + (1 if n < extra else 0))
+                for n, (color, size) in enumerate(pairs)
+            ]
+        ProductVariant.objects.bulk_create(variants)
+
+
+def remove_product_variants(apps, schema_editor):
+    apps.get_model('shop', 'ProductVariant').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_product_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_variants, remove_product_variants),
+    ]
@@ -1,11 +1,14 @@
+from functools import partial
+
 from django.db import models
 from django.urls import reverse
 from accounts.models import CustomUser
+from .slugs import save_with_unique_slug
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
-    slug = models.SlugField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=100, unique=True, blank=True, help_text='Leave blank to generate from the name')
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -20,12 +23,17 @@ class Category(models.Model):
     def get_absolute_url(self):
         return reverse('shop:category', kwargs={'slug': self.slug})
 
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            return save_with_unique_slug(self, self.name, partial(super().save, *args, **kwargs), fallback='category')
+        super().save(*args, **kwargs)
+
 
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     seller = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='products', null=True, blank=True, limit_choices_to={'user_type': 'seller'})
     name = models.CharField(max_length=200)
-    slug = models.SlugField(max_length=200, unique=True)
+    slug = models.SlugField(max_length=200, unique=True, blank=True, help_text='Leave blank to generate from the name')
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
@@ -39,6 +47,12 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # home/product_list: available=True [AND featured=True] ORDER BY -created_at
+            models.Index(fields=['available', 'featured', '-created_at'], name='product_listing_idx'),
+            models.Index(fields=['category', 'available'], name='product_category_idx'),
+            models.Index(fields=['-created_at'], name='product_available_new_idx', condition=models.Q(available=True)),
+        ]
 
     def __str__(self):
         return self.name
@@ -46,6 +60,11 @@ class Product(models.Model):
     def get_absolute_url(self):
         return reverse('shop:product_detail', kwargs={'slug': self.slug})
 
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            return save_with_unique_slug(self, self.name, partial(super().save, *args, **kwargs), fallback='product')
+        super().save(*args, **kwargs)
+
     @property
     def in_stock(self):
         return self.stock > 0
@@ -61,6 +80,78 @@ class Product(models.Model):
         return []
 
 
+class ProductVariant(models.Model):
+    """
+    One buyable color x size of a product with its own stock. Products
+    without colors or sizes have a single variant with both blank.
+    Product.stock is kept as the sum of its variants' stock.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='variants')
+    color = models.CharField(max_length=50, blank=True)
+    size = models.CharField(max_length=50, blank=True)
+    stock = models.PositiveIntegerField(default=0)
+    price_delta = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['pk']
+        constraints = [
+            # Also the index for "variants of a product" and (product, color, size) lookups
+            models.UniqueConstraint(fields=['product', 'color', 'size'], name='unique_product_variant'),
+        ]
+
+    def __str__(self):
+        options = ' / '.join(option for option in (self.color, self.size) if option)
+        return f'{self.product.name} ({options})' if options else self.product.name
+
+    @property
+    def label(self):
+        return ' / '.join(option for option in (self.color, self.size) if option)
+
+    @property
+    def price(self):
+        return self.product.price + self.price_delta
+
+    @property
+    def in_stock(self):
+        return self.stock > 0
+
+
+class AttributeValue(models.Model):
+    """A normalized color or size, shared by every product that lists it"""
+    KIND_CHOICES = [
+        ('color', 'Color'),
+        ('size', 'Size'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=60)
+
+    class Meta:
+        ordering = ['kind', 'name']
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'slug'], name='unique_attribute_value'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.name}'
+
+
+class ProductAttribute(models.Model):
+    """Links a product to its colors and sizes; kept in step with Product.colors/sizes"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='attribute_links')
+    value = models.ForeignKey(AttributeValue, on_delete=models.CASCADE, related_name='product_links')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'value'], name='unique_product_attribute'),
+        ]
+        indexes = [
+            # Facet filters and counts: value_id IN (...) -> product_id without touching the table
+            models.Index(fields=['value', 'product'], name='product_attribute_value_idx'),
+        ]
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='products/')
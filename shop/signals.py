@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import bump_catalog_version
+from .facets import sync_attributes
+from .models import Category, Product, ProductImage, ProductVariant, SellerReview
+from .variants import sync_variants
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+@receiver([post_save, post_delete], sender=ProductVariant)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SellerReview)
+def invalidate_storefront_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def sync_product_attributes(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'colors', 'sizes'} & set(update_fields):
+        sync_attributes([instance])
+
+
+@receiver(post_save, sender=Product)
+def sync_product_variants(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'colors', 'sizes', 'stock'} & set(update_fields):
+        sync_variants([instance])
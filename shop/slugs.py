@@ -0,0 +1,76 @@
+"""
+Unique slug allocation.
+
+Instead of probing ``slug``, ``slug-1``, ``slug-2``... with one query each,
+existing slugs sharing the base are fetched with a single prefix query and
+the next free suffix is taken after the highest one in use.
+"""
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+# Would be shadowed by the products/import/ and products/export/ URLs
+RESERVED_SLUGS = {'import', 'export'}
+
+# Leaves room for a "-<n>" suffix within the column
+SUFFIX_ROOM = 10
+
+
+def slug_base(model, source, fallback='item'):
+    max_length = model._meta.get_field('slug').max_length - SUFFIX_ROOM
+    return slugify(source)[:max_length].strip('-') or fallback
+
+
+def allocate_slugs(model, sources, fallback='item', reserved=RESERVED_SLUGS):
+    """Return a unique slug for each source string, using one query for the whole list"""
+    bases = [slug_base(model, source, fallback) for source in sources]
+    if not bases:
+        return []
+
+    lookup = Q()
+    for base in set(bases):
+        # The prefix LIKE can use the slug index; the regex discards longer slugs that merely share the prefix
+        lookup |= Q(slug=base) | Q(slug__startswith=f'{base}-', slug__regex=rf'^{re.escape(base)}-[0-9]+$')
+    taken = set(model._default_manager.filter(lookup).values_list('slug', flat=True)) | set(reserved)
+
+    next_suffix = {}
+    for slug in taken:
+        base, _, suffix = slug.rpartition('-')
+        if suffix.isdigit():
+            next_suffix[base] = max(next_suffix.get(base, 1), int(suffix) + 1)
+
+    slugs = []
+    for base in bases:
+        if base in taken:
+            suffix = next_suffix.get(base, 1)
+            next_suffix[base] = suffix + 1
+            slug = f'{base}-{suffix}'
+        else:
+            slug = base
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def allocate_slug(model, source, fallback='item'):
+    return allocate_slugs(model, [source], fallback)[0]
+
+
+def save_with_unique_slug(instance, source, save, attempts=3, fallback='item'):
+    """
+    Assign a free slug and call ``save()``, allocating a new slug and retrying
+    if another request took the same one between the lookup and the insert.
+    """
+    model = type(instance)
+    for attempt in range(attempts):
+        instance.slug = allocate_slug(model, source, fallback)
+        try:
+            with transaction.atomic():
+                save()
+            return instance
+        except IntegrityError:
+            taken = model._default_manager.filter(slug=instance.slug).exists()
+            if not taken or attempt == attempts - 1:
+                raise
@@ -1,3 +1,498 @@
-from django.test import TestCase
+import re
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from crochet_shop.testing import QueryBudgetMixin, QueryPlanAssertionsMixin
+from orders.models import Order, OrderItem
+from .caching import get_catalog_version
+from .facets import facet_counts, parse_filters
+from .models import AttributeValue, Category, Product, ProductAttribute, ProductImage, ProductVariant, SellerReview
+
+
+class ProductIndexTestCase(QueryPlanAssertionsMixin, TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Bags', slug='bags')
+
+    def test_featured_products_use_index(self):
+        self.assertUsesIndex(Product.objects.filter(featured=True, available=True)[:8])
+
+    def test_new_arrivals_use_index(self):
+        self.assertUsesIndex(Product.objects.filter(available=True).order_by('-created_at')[:8])
+
+    def test_category_products_use_index(self):
+        self.assertUsesIndex(Product.objects.filter(category=self.category, available=True))
+
+    def test_attribute_filter_uses_index(self):
+        self.assertUsesIndex(ProductAttribute.objects.filter(value_id__in=[1, 2]).values('product_id'))
+
+
+class StorefrontQueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        for c in range(3):
+            category = Category.objects.create(name=f'Category {c}', slug=f'category-{c}')
+            for p in range(4):
+                Product.objects.create(
+                    category=category, seller=seller, name=f'Product {c}-{p}', slug=f'product-{c}-{p}',
+                    description='Handmade', price='1000.00', stock=5, featured=p % 2 == 0,
+                    image=f'products/product-{c}-{p}.jpg',
+                )
+
+    def test_home_query_budget(self):
+        self.assertQueryBudget(4, reverse('shop:home'))
+
+    def test_product_list_query_budget(self):
+        self.assertQueryBudget(4, reverse('shop:product_list'))
+
+    @override_settings(QUERY_INSTRUMENTATION=True, QUERY_TIMING_HEADER=True)
+    def test_query_stats_in_server_timing_header(self):
+        response = self.client.get(reverse('shop:home'))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    @override_settings(QUERY_INSTRUMENTATION=True, QUERY_TIMING_HEADER=False)
+    def test_query_stats_logged_without_public_header(self):
+        with self.assertLogs('crochet_shop.queries', 'INFO') as logs:
+            response = self.client.get(reverse('shop:home'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('"event": "request_queries"', logs.output[0])
+
+
+@override_settings(SHARED_CACHE=True)
+class StorefrontCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        self.category = Category.objects.create(name='Bags', slug='bags')
+        self.product = Product.objects.create(
+            category=self.category, seller=self.seller, name='Tote', slug='tote',
+            description='Handmade', price='1000.00', stock=5, image='products/tote.jpg',
+        )
+
+    def test_anonymous_page_served_from_cache(self):
+        url = reverse('shop:product_detail', args=['tote'])
+        self.assertEqual(self.client.get(url)['X-Storefront-Cache'], 'miss')
+        # Only the ETag's updated_at lookup
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Storefront-Cache'], 'hit')
+        self.assertContains(response, 'Tote')
+
+    def test_query_string_order_does_not_matter(self):
+        url = reverse('shop:product_list')
+        self.client.get(url + '?category=bags&availability=in_stock')
+        response = self.client.get(url + '?availability=in_stock&category=bags')
+        self.assertEqual(response['X-Storefront-Cache'], 'hit')
+        self.assertEqual(self.client.get(url)['X-Storefront-Cache'], 'miss')
+
+    def test_catalog_changes_invalidate_pages(self):
+        url = reverse('shop:product_detail', args=['tote'])
+        self.client.get(url)
+        version = get_catalog_version()
+        self.product.name = 'Sunflower Tote'
+        self.product.save()
+        self.assertGreater(get_catalog_version(), version)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Storefront-Cache'], 'miss')
+        self.assertContains(response, 'Sunflower Tote')
+
+        version = get_catalog_version()
+        buyer = CustomUser.objects.create_user(email='buyer@example.com', password='testpass123')
+        SellerReview.objects.create(seller=self.seller, customer=buyer, rating=5)
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_varies_on_cart_count(self):
+        url = reverse('shop:home')
+        self.client.get(url)
+        self.client.post(reverse('shop:add_to_cart', args=[self.product.pk]), {'quantity': 2})
+        # The add-to-cart flash message is pending, so this render bypasses the cache
+        self.assertNotIn('X-Storefront-Cache', self.client.get(url))
+        response = self.client.get(url)
+        self.assertEqual(response['X-Storefront-Cache'], 'miss')
+        self.assertEqual(self.client.get(url)['X-Storefront-Cache'], 'hit')
+
+    def test_cached_page_carries_visitors_csrf_token(self):
+        url = reverse('shop:product_detail', args=['tote'])
+        self.client.get(url)
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.get(url)
+        self.assertEqual(response['X-Storefront-Cache'], 'hit')
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        response = client.post(
+            reverse('shop:add_to_cart', args=[self.product.pk]), {'quantity': 1, 'csrfmiddlewaretoken': token}
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_repeat_visitor_gets_not_modified(self):
+        url = reverse('shop:product_detail', args=['tote'])
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Queryset updates send no signal; updated_at still changes the ETag
+        Product.objects.filter(pk=self.product.pk).update(description='Updated', updated_at=timezone.now())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        category_url = reverse('shop:category', args=['bags'])
+        etag = self.client.get(category_url)['ETag']
+        self.assertEqual(self.client.get(category_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Category.objects.create(name='Hats', slug='hats')
+        self.assertEqual(self.client.get(category_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_no_etag_without_shared_cache(self):
+        # Another worker's catalog version could be stale indefinitely
+        for url in (reverse('shop:product_detail', args=['tote']), reverse('shop:category', args=['bags'])):
+            self.assertNotIn('ETag', self.client.get(url))
+
+    @override_settings(SHARED_CACHE=False)
+    def test_no_page_or_fragment_cache_without_shared_cache(self):
+        # Another worker would keep serving them after an edit it never saw
+        url = reverse('shop:home')
+        self.client.get(url)
+        self.assertNotIn('X-Storefront-Cache', self.client.get(url))
+        Category.objects.filter(pk=self.category.pk).update(name='Baskets')
+        self.assertContains(self.client.get(url), 'Baskets')
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.force_login(self.seller)
+        url = reverse('shop:product_detail', args=['tote'])
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertNotIn('X-Storefront-Cache', response)
+        self.assertNotIn('ETag', response)
+
+
+class FacetedBrowseTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        bags = Category.objects.create(name='Bags', slug='bags')
+        hats = Category.objects.create(name='Hats', slug='hats')
+        for name, category, colors, sizes in [
+            ('Tote', bags, 'Red, Blue', 'M, L'),
+            ('Clutch', bags, 'Red', ''),
+            ('Beanie', hats, 'Blue, Green', 'S, M'),
+        ]:
+            Product.objects.create(category=category, seller=seller, name=name, description='x', price='1000.00',
+                                   stock=5, image='products/x.jpg', colors=colors, sizes=sizes)
+
+    def counts(self, query=''):
+        from django.http import QueryDict
+        return {facet: {slug: count for slug, _, count in rows}
+                for facet, rows in facet_counts(parse_filters(QueryDict(query))).items()}
+
+    def test_colors_and_sizes_are_normalized(self):
+        self.assertEqual(AttributeValue.objects.filter(kind='color').count(), 3)
+        tote = Product.objects.get(name='Tote')
+        tote.colors = 'Green'
+        tote.save()
+        self.assertEqual(
+            sorted(tote.attribute_links.values_list('value__kind', 'value__slug')),
+            [('color', 'green'), ('size', 'l'), ('size', 'm')],
+        )
+
+    def test_counts_ignore_own_facet_selection(self):
+        self.assertEqual(self.counts()['color'], {'red': 2, 'blue': 2, 'green': 1})
+        counts = self.counts('color=red&color=green')
+        # Other colors still show what adding them would match
+        self.assertEqual(counts['color'], {'red': 2, 'blue': 2, 'green': 1})
+        self.assertEqual(counts['category'], {'bags': 2, 'hats': 1})
+        self.assertEqual(counts['size'], {'m': 2, 'l': 1, 's': 1})
+
+        counts = self.counts('color=red&category=bags&size=l')
+        self.assertEqual(counts['color'], {'red': 1, 'blue': 1})
+        self.assertEqual(counts['category'], {'bags': 1})
+
+    def test_multi_select_filters_products(self):
+        url = reverse('shop:product_list')
+        response = self.client.get(url, {'color': ['red', 'green'], 'size': 'm'})
+        self.assertEqual(sorted(p.name for p in response.context['products']), ['Beanie', 'Tote'])
+
+    @override_settings(SHARED_CACHE=True)
+    def test_counts_cached_until_catalog_changes(self):
+        self.counts('color=blue')
+        with self.assertNumQueries(0):
+            self.counts('color=blue')
+        Product.objects.filter(name='Clutch').get().delete()
+        self.assertEqual(self.counts('color=blue')['color']['red'], 1)
+
+
+class ProductVariantTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        category = Category.objects.create(name='Hats', slug='hats')
+        self.product = Product.objects.create(
+            category=category, seller=seller, name='Beanie', slug='beanie', description='x', price='800.00',
+            stock=5, image='products/beanie.jpg', colors='Red, Blue', sizes='S, M',
+        )
+
+    def variant(self, color, size):
+        return self.product.variants.get(color=color, size=size)
+
+    def test_variants_follow_colors_and_sizes(self):
+        self.assertEqual(
+            list(self.product.variants.values_list('color', 'size', 'stock')),
+            [('Red', 'S', 2), ('Red', 'M', 1), ('Blue', 'S', 1), ('Blue', 'M', 1)],
+        )
+        # Stock of dropped variants is shared out over new ones
+        self.product.colors = 'Red, Green'
+        self.product.save()
+        self.product.refresh_from_db()
+        self.assertEqual(
+            list(self.product.variants.values_list('color', 'size', 'stock')),
+            [('Red', 'S', 2), ('Red', 'M', 1), ('Green', 'S', 1), ('Green', 'M', 1)],
+        )
+        self.assertEqual(self.product.stock, 5)
+
+    def test_product_stock_changes_are_spread_over_variants(self):
+        from .variants import sync_variants
+
+        self.product.stock = 13
+        self.product.save()
+        self.assertEqual(list(self.product.variants.values_list('stock', flat=True)), [4, 3, 3, 3])
+        self.product.stock = 3
+        self.product.save()
+        self.assertEqual(list(self.product.variants.values_list('stock', flat=True)), [1, 0, 1, 1])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+        # Admin inline edits: the variants are right and the product follows them
+        ProductVariant.objects.filter(pk=self.variant('Red', 'S').pk).update(stock=7)
+        sync_variants([self.product], spread_stock=False)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+        self.assertEqual(self.variant('Red', 'S').stock, 7)
+
+    def test_sold_out_variant_cannot_be_added(self):
+        ProductVariant.objects.filter(pk=self.variant('Blue', 'M').pk).update(stock=0)
+        url = reverse('shop:add_to_cart', args=[self.product.pk])
+        self.client.post(url, {'variant': self.variant('Blue', 'M').pk})
+        self.assertEqual(self.client.session.get('cart', {}), {})
+
+        self.client.post(url, {'color': 'Red', 'size': 'S', 'quantity': 2})
+        self.assertEqual(self.client.session['cart'], {str(self.variant('Red', 'S').pk): {'product': self.product.pk, 'quantity': 2}})
+
+    def test_cart_quantities_are_validated(self):
+        red = self.variant('Red', 'S')
+        url = reverse('shop:add_to_cart', args=[self.product.pk])
+        for quantity in ('-5', '0', 'two', '3'):
+            response = self.client.post(url, {'variant': red.pk, 'quantity': quantity})
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.session.get('cart', {}), {})
+
+        self.client.post(url, {'variant': red.pk, 'quantity': 1})
+        update_url = reverse('shop:update_cart', args=[red.pk])
+        for quantity in ('-5', 'two', '3'):
+            response = self.client.post(update_url, {'quantity': quantity}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.session['cart'][str(red.pk)]['quantity'], 1)
+        self.client.post(update_url, {'quantity': 2})
+        self.assertEqual(self.client.session['cart'][str(red.pk)]['quantity'], 2)
+
+    def test_checkout_takes_stock_from_variant(self):
+        red = self.variant('Red', 'S')
+        red.price_delta = Decimal('100.00')
+        red.save()
+        self.client.post(reverse('shop:add_to_cart', args=[self.product.pk]), {'variant': red.pk, 'quantity': 2})
+        response = self.client.post(reverse('shop:checkout'), {
+            'customer_name': 'Amina', 'customer_phone': '0712345678', 'customer_address': 'Nairobi',
+        })
+        self.assertEqual(response.status_code, 302)
+
+        item = OrderItem.objects.get()
+        self.assertEqual((item.variant, item.color, item.size, item.product_price), (red, 'Red', 'S', Decimal('900.00')))
+        red.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual((red.stock, self.product.stock), (0, 3))
+
+    def test_checkout_refuses_to_oversell(self):
+        red = self.variant('Red', 'S')
+        self.client.post(reverse('shop:add_to_cart', args=[self.product.pk]), {'variant': red.pk, 'quantity': 2})
+        ProductVariant.objects.filter(pk=red.pk).update(stock=1)
+        response = self.client.post(reverse('shop:checkout'), {
+            'customer_name': 'Amina', 'customer_phone': '0712345678', 'customer_address': 'Nairobi',
+        })
+        self.assertRedirects(response, reverse('shop:cart'))
+        self.assertFalse(Order.objects.exists())
+
+    def test_cart_saved_before_variants_is_upgraded(self):
+        session = self.client.session
+        session['cart'] = {str(self.product.pk): {'quantity': 1, 'color': 'Blue', 'size': 'S'}}
+        session.save()
+        response = self.client.get(reverse('shop:cart'))
+        self.assertEqual([line['variant'] for line in response.context['cart_items']], [self.variant('Blue', 'S')])
+
+
+class GenerateBulkDataCommandTestCase(TestCase):
+    def test_generates_requested_volumes(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from chat.models import Message
+        from orders.models import Order, Payment
+
+        call_command(
+            'generate_bulk_data', sellers=2, customers=5, products=20, orders=30, reviews=5, messages=10,
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(CustomUser.objects.filter(user_type='seller').count(), 2)
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(Order.objects.count(), 30)
+        self.assertEqual(Payment.objects.count(), 30)
+        self.assertEqual(Message.objects.count(), 10)
+        self.assertEqual(ProductImage.objects.count(), 40)
+        self.assertEqual(SellerReview.objects.count(), 5)
+        self.assertFalse(SellerReview.objects.exclude(order__status='delivered').exists())
+
+    def test_same_seed_produces_same_rows(self):
+        from io import StringIO
+        from django.core.management import CommandError, call_command
+        from orders.models import Order
+
+        options = dict(sellers=2, customers=3, products=10, orders=15, reviews=2, messages=4,
+                       batch_size=4, seed=7, anchor_date='2025-01-01', stdout=StringIO())
+        call_command('generate_bulk_data', prefix='a', **options)
+        call_command('generate_bulk_data', prefix='b', **options)
+
+        def rows(prefix):
+            products = Product.objects.filter(slug__startswith=f'{prefix}-').order_by('pk')
+            orders = Order.objects.filter(order_code__startswith=f'CR-{prefix}-').order_by('pk')
+            return (
+                list(products.values_list('name', 'price', 'stock', 'created_at')),
+                list(orders.values_list('total_amount', 'status', 'created_at')),
+            )
+
+        self.assertEqual(rows('a'), rows('b'))
+
+        with self.assertRaises(CommandError):
+            call_command('generate_bulk_data', prefix='a', **options)
+
+    def test_rejects_prefix_that_overflows_order_code(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command('generate_bulk_data', prefix='a-very-long-prefix', stdout=StringIO())
+
+
+class ProductImportExportTestCase(TestCase):
+    def setUp(self):
+        self.seller = CustomUser.objects.create_user(email='seller@example.com', password='testpass123', user_type='seller')
+        self.other = CustomUser.objects.create_user(email='other@example.com', password='testpass123', user_type='seller')
+        self.category = Category.objects.create(name='Bags', slug='bags')
+        Product.objects.create(
+            category=self.category, seller=self.other, name='Tote Bag', slug='tote-bag',
+            description='Handmade', price='1000.00', stock=5, image='products/tote.jpg',
+        )
+
+    def import_file(self, content, fmt='csv'):
+        from io import BytesIO
+        from .catalog_io import ProductImporter, read_rows
+        return ProductImporter(self.seller, batch_size=2).run(read_rows(BytesIO(content.encode()), fmt))
+
+    def test_csv_import_creates_products_and_reports_bad_rows(self):
+        result = self.import_file(
+            'name,description,category,price,stock,image\n'
+            'Tote Bag,Big bag,bags,1500,3,products/a.jpg\n'
+            'Tote Bag,Small bag,Bags,900,1,products/b.jpg\n'
+            'Beanie,Warm,hats,500,2,products/c.jpg\n'
+            'Scarf,Long,bags,abc,2,products/d.jpg\n'
+            'Shawl,Light,bags,700,2,\n'
+        )
+
+        self.assertEqual((result.created, result.updated, result.error_count), (2, 0, 3))
+        self.assertEqual([row for row, _ in result.errors], [4, 5, 6])
+        self.assertEqual(
+            sorted(Product.objects.filter(seller=self.seller).values_list('slug', flat=True)),
+            ['tote-bag-1', 'tote-bag-2'],
+        )
+
+    def test_json_import_updates_own_products_only(self):
+        Product.objects.create(
+            category=self.category, seller=self.seller, name='Mini Bag', slug='mini-bag',
+            description='Handmade', price='800.00', stock=5, image='products/mini.jpg',
+        )
+        result = self.import_file(
+            '[{"slug": "mini-bag", "name": "Mini Bag", "description": "New", "category": "bags", "price": "850", "stock": 9},\n'
+            ' {"slug": "tote-bag", "name": "Stolen", "description": "x", "category": "bags", "price": "1", "stock": 1}]',
+            fmt='json',
+        )
+
+        self.assertEqual((result.created, result.updated, result.error_count), (0, 1, 1))
+        mini = Product.objects.get(slug='mini-bag')
+        self.assertEqual((mini.stock, mini.description, mini.image.name), (9, 'New', 'products/mini.jpg'))
+        self.assertEqual(Product.objects.get(slug='tote-bag').name, 'Tote Bag')
+
+    def test_json_lines_reader_streams_records(self):
+        from io import BytesIO
+        from .catalog_io import read_json_rows
+        data = '\n'.join('{"name": "P%d", "description": "%s"}' % (i, 'x' * 50) for i in range(100))
+        rows = list(read_json_rows(BytesIO(data.encode()), chunk_size=64))
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(rows[-1], (100, {'name': 'P99', 'description': 'x' * 50}))
+
+    def test_export_round_trips_through_import(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('export_products', seller='other@example.com', format='json', stdout=out)
+
+        self.seller = self.other
+        result = self.import_file(out.getvalue(), fmt='json')
+        self.assertEqual((result.created, result.updated, result.error_count), (0, 1, 0))
+
+    def test_seller_upload_and_export_views(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.force_login(self.seller)
+        upload = SimpleUploadedFile('catalog.csv', b'name,description,category,price,stock,image\n'
+                                                  b'Beanie,Warm,bags,500,2,products/c.jpg\n')
+        response = self.client.post(reverse('shop:import_products'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Product.objects.filter(slug='beanie', seller=self.seller).exists())
+
+        response = self.client.get(reverse('shop:export_products'))
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('beanie,Beanie,Warm,bags,500.00,2,True,False', body)
+        self.assertNotIn('tote-bag', body)
+
+
+class SlugAllocatorTestCase(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Bags', slug='bags')
+        for slug in ['tote-bag', 'tote-bag-1', 'tote-bag-7', 'tote-bag-charm']:
+            Product.objects.create(
+                category=self.category, name='Tote Bag', slug=slug, description='Handmade',
+                price='1000.00', stock=1, image='products/tote.jpg',
+            )
+
+    def test_next_suffix_found_with_one_query(self):
+        from .slugs import allocate_slugs
+        with self.assertNumQueries(1):
+            slugs = allocate_slugs(Product, ['Tote Bag', 'Tote Bag', 'Crochet Hat'])
+        self.assertEqual(slugs, ['tote-bag-8', 'tote-bag-9', 'crochet-hat'])
+
+    def test_models_generate_slug_when_blank(self):
+        product = Product.objects.create(
+            category=self.category, name='Tote Bag', description='Handmade',
+            price='1000.00', stock=1, image='products/tote.jpg',
+        )
+        self.assertEqual(product.slug, 'tote-bag-8')
+        self.assertEqual(Category.objects.create(name='Bags').slug, 'bags-1')
+        self.assertEqual(Category.objects.create(name='!!!').slug, 'category')
+
+    def test_retries_when_slug_is_taken_concurrently(self):
+        from unittest import mock
+        # The first lookup misses a concurrent insert of "tote-bag"
+        with mock.patch('shop.slugs.allocate_slugs', side_effect=[['tote-bag'], ['tote-bag-8']]):
+            product = Product.objects.create(
+                category=self.category, name='Tote Bag', description='Handmade',
+                price='1000.00', stock=1, image='products/tote.jpg',
+            )
+        self.assertEqual(product.slug, 'tote-bag-8')
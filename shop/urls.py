@@ -6,14 +6,17 @@ app_name = 'shop'
 urlpatterns = [
     path('', views.home, name='home'),
     path('products/', views.product_list, name='product_list'),
+    path('products/import/', views.import_products, name='import_products'),
+    path('products/export/', views.export_products, name='export_products'),
     path('products/<slug:slug>/', views.product_detail, name='product_detail'),
     path('category/<slug:slug>/', views.category, name='category'),
     path('search/', views.search, name='search'),
     path('cart/', views.cart, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
-    path('cart/update/<int:product_id>/', views.update_cart, name='update_cart'),
-    path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
+    path('cart/update/<int:variant_id>/', views.update_cart, name='update_cart'),
+    path('cart/remove/<int:variant_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('checkout/', views.checkout, name='checkout'),
+    path('checkout/quote/', views.delivery_quote, name='delivery_quote'),
     path('add-product/', views.add_product, name='add_product'),
     path('edit-product/<int:product_id>/', views.edit_product, name='edit_product'),
     path('delete-product/<int:product_id>/', views.delete_product, name='delete_product'),
@@ -0,0 +1,149 @@
+"""
+Product variants and the session cart.
+
+Variants are derived from a product's comma-separated colors and sizes by
+``sync_variants``: every color x size pair gets a row, pairs no longer listed
+are removed and their stock is shared out over newly listed ones. A product
+with a single variant takes its stock from Product.stock; otherwise
+Product.stock is the sum of its variants, and a change saved to it (admin
+list or form, seller form, importer) is spread over them: added evenly, or
+taken evenly without going below zero.
+
+The cart is kept in the session as {variant_id: {'product': id, 'quantity': n}}.
+"""
+from collections import defaultdict
+
+from django.db.models import F, OuterRef, Subquery, Sum
+
+from .models import Product, ProductVariant
+
+
+def combinations(product):
+    """(color, size) pairs a product is sold in, in listing order"""
+    colors = [color[:50] for color in product.get_colors_list() if color] or ['']
+    sizes = [size[:50] for size in product.get_sizes_list() if size] or ['']
+    return list(dict.fromkeys((color, size) for color in colors for size in sizes))
+
+
+def _split(total, parts):
+    base, extra = divmod(max(total, 0), parts)
+    return [base + (1 if n < extra else 0) for n in range(parts)]
+
+
+def _spread(variants, change):
+    """Add ``change`` units of stock to ``variants``, or take them off; returns the variants changed"""
+    if change > 0:
+        for variant, extra in zip(variants, _split(change, len(variants))):
+            variant.stock += extra
+    remaining = -change
+    stocked = [variant for variant in variants if variant.stock > 0]
+    while remaining > 0 and stocked:
+        for variant, take in zip(stocked, _split(remaining, len(stocked))):
+            taken = min(take, variant.stock)
+            variant.stock -= taken
+            remaining -= taken
+        stocked = [variant for variant in stocked if variant.stock > 0]
+    return list(variants) if change else []
+
+
+def sync_variants(products, spread_stock=True):
+    """
+    Bring the variants of saved ``products`` in line with their colors, sizes
+    and stock. Without ``spread_stock`` the variants' stock is left as it is
+    and Product.stock becomes their total.
+    """
+    products = list(products)
+    current = defaultdict(dict)
+    for variant in ProductVariant.objects.filter(product__in=products):
+        current[variant.product_id][variant.color, variant.size] = variant
+
+    create, stale, update = [], [], []
+    for product in products:
+        wanted = combinations(product)
+        variants = current[product.pk]
+        stale += [variant.pk for key, variant in variants.items() if key not in wanted]
+        kept = [variants[key] for key in wanted if key in variants]
+        missing = [key for key in wanted if key not in variants]
+        if len(wanted) == 1 and kept and spread_stock:
+            if kept[0].stock != product.stock:
+                kept[0].stock = product.stock
+                update.append(kept[0])
+            continue
+        shares = _split(product.stock - sum(variant.stock for variant in kept), len(missing)) if missing else []
+        if not missing and spread_stock:
+            # Product.stock matched the variants before this save, so any difference is the change
+            update += _spread(kept, product.stock - sum(variant.stock for variant in variants.values()))
+        product.stock = sum(variant.stock for variant in kept) + sum(shares)
+        create += [
+            ProductVariant(product=product, color=color, size=size, stock=stock)
+            for (color, size), stock in zip(missing, shares)
+        ]
+
+    ProductVariant.objects.filter(pk__in=stale).delete()
+    ProductVariant.objects.bulk_create(create)
+    ProductVariant.objects.bulk_update(update, ['stock'])
+    totals = ProductVariant.objects.filter(product=OuterRef('pk')).values('product').annotate(total=Sum('stock'))
+    Product.objects.filter(pk__in=[product.pk for product in products]).update(
+        stock=Subquery(totals.values('total'))
+    )
+
+
+def reserve_stock(variant_id, product_id, quantity):
+    """Take ``quantity`` off a variant and its product; False if not enough is left"""
+    if not ProductVariant.objects.filter(pk=variant_id, stock__gte=quantity).update(stock=F('stock') - quantity):
+        return False
+    Product.objects.filter(pk=product_id).update(stock=F('stock') - quantity)
+    return True
+
+
+def pick_variant(product, variant_id=None, color='', size=''):
+    """The variant a customer chose, or the first one in stock when they did not choose"""
+    variants = ProductVariant.objects.filter(product=product)
+    if variant_id:
+        return variants.filter(pk=variant_id).first()
+    if color or size:
+        return variants.filter(color=color, size=size).first()
+    return variants.filter(stock__gt=0).first() or variants.first()
+
+
+def get_cart(request):
+    """The session cart, upgrading entries saved per product before variants existed"""
+    cart = request.session.get('cart', {})
+    legacy = {key: item for key, item in cart.items() if 'product' not in item}
+    if legacy:
+        for key, item in legacy.items():
+            del cart[key]
+            variant = pick_variant(key, color=item.get('color', ''), size=item.get('size', '')) or pick_variant(key)
+            if variant:
+                entry = cart.setdefault(str(variant.pk), {'product': variant.product_id, 'quantity': 0})
+                entry['quantity'] += item['quantity']
+        save_cart(request, cart)
+    return cart
+
+
+def save_cart(request, cart):
+    request.session['cart'] = cart
+    request.session.modified = True
+
+
+def cart_lines(cart):
+    """Cart rows with their variant and product loaded in one query, plus the total"""
+    variants = ProductVariant.objects.filter(pk__in=[int(key) for key in cart]).select_related('product__category')
+    lines, total = [], 0
+    for variant in variants:
+        quantity = cart[str(variant.pk)]['quantity']
+        if quantity < 1:
+            # Carts saved before quantities were validated
+            continue
+        subtotal = variant.price * quantity
+        lines.append({
+            'variant': variant,
+            'product': variant.product,
+            'quantity': quantity,
+            'color': variant.color,
+            'size': variant.size,
+            'price': variant.price,
+            'subtotal': subtotal,
+        })
+        total += subtotal
+    return lines, total
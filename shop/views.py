@@ -1,14 +1,26 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.db.models import Q, Avg
-from django.views.decorators.http import require_POST
-from .models import Product, Category, SellerReview
+from django.views.decorators.http import condition, require_POST
+from crochet_shop.replicas import use_replica
+from .caching import bump_catalog_version, cache_storefront_page, catalog_etag, product_etag
+from .catalog_io import FIELDS, ProductImporter, csv_lines, detect_format, export_rows, json_lines, read_rows
+from .facets import facet_counts, facet_options, filter_products, parse_filters
+from .models import Product, Category, ProductVariant, SellerReview
+from .variants import cart_lines, get_cart, pick_variant, reserve_stock, save_cart
+from orders.delivery import quote
+from orders.fulfilment import split_order
 from orders.models import Order, OrderItem, OrderStatusHistory, Payment
-from decimal import Decimal
+from analytics.recommendations import record_order, related_products
+from analytics.rollups import record_order_placed
+from decimal import Decimal, InvalidOperation
 
 
+@condition(etag_func=catalog_etag)
+@cache_storefront_page
 def home(request):
     featured_products = Product.objects.filter(featured=True, available=True)[:8]
     new_arrivals = Product.objects.filter(available=True).order_by('-created_at')[:8]
@@ -22,37 +34,28 @@ def home(request):
     return render(request, 'shop/home.html', context)
 
 
+@condition(etag_func=catalog_etag)
+@cache_storefront_page
 def product_list(request):
-    products = Product.objects.filter(available=True)
-    categories = Category.objects.all()
-    
-    category_slug = request.GET.get('category')
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    availability = request.GET.get('availability')
-    
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
-    if min_price:
-        products = products.filter(price__gte=min_price)
-    if max_price:
-        products = products.filter(price__lte=max_price)
-    if availability == 'in_stock':
-        products = products.filter(stock__gt=0)
+    filters = parse_filters(request.GET)
+    products = filter_products(
+        Product.objects.filter(available=True).select_related('category', 'seller'), filters
+    )
     
     context = {
         'products': products,
-        'categories': categories,
-        'selected_category': category_slug,
+        'facets': facet_options(filters, facet_counts(filters)),
+        'filters': filters,
     }
     return render(request, 'shop/product_list.html', context)
 
 
+@condition(etag_func=product_etag)
+@cache_storefront_page
 def product_detail(request, slug):
-    product = get_object_or_404(Product, slug=slug, available=True)
-    related_products = Product.objects.filter(
-        category=product.category, available=True
-    ).exclude(id=product.id)[:4]
+    product = get_object_or_404(
+        Product.objects.select_related('category', 'seller__seller_profile'), slug=slug, available=True
+    )
     
     # Get seller rating and review count
     seller_reviews = SellerReview.objects.filter(seller=product.seller)
@@ -61,13 +64,16 @@ def product_detail(request, slug):
     
     context = {
         'product': product,
-        'related_products': related_products,
+        'variants': list(product.variants.all()),
+        'related_products': related_products(product),
         'seller_rating': avg_rating,
         'review_count': review_count,
     }
     return render(request, 'shop/product_detail.html', context)
 
 
+@condition(etag_func=catalog_etag)
+@cache_storefront_page
 def category(request, slug):
     category = get_object_or_404(Category, slug=slug)
     products = Product.objects.filter(category=category, available=True)
@@ -79,9 +85,10 @@ def category(request, slug):
     return render(request, 'shop/category.html', context)
 
 
+@use_replica
 def search(request):
     query = request.GET.get('q', '')
-    products = Product.objects.filter(available=True)
+    products = Product.objects.filter(available=True).select_related('category')
     
     if query:
         products = products.filter(
@@ -95,34 +102,8 @@ def search(request):
     return render(request, 'shop/search.html', context)
 
 
-def get_cart(request):
-    return request.session.get('cart', {})
-
-
-def save_cart(request, cart):
-    request.session['cart'] = cart
-    request.session.modified = True
-
-
 def cart(request):
-    cart = get_cart(request)
-    cart_items = []
-    total = 0
-    
-    for product_id, item in cart.items():
-        try:
-            product = Product.objects.get(id=product_id)
-            subtotal = product.price * item['quantity']
-            cart_items.append({
-                'product': product,
-                'quantity': item['quantity'],
-                'color': item.get('color', ''),
-                'size': item.get('size', ''),
-                'subtotal': subtotal,
-            })
-            total += subtotal
-        except Product.DoesNotExist:
-            pass
+    cart_items, total = cart_lines(get_cart(request))
     
     context = {
         'cart_items': cart_items,
@@ -131,24 +112,54 @@ def cart(request):
     return render(request, 'shop/cart.html', context)
 
 
+def _cart_error(request, message):
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'success': False, 'error': message}, status=400)
+    messages.error(request, message)
+    return redirect(request.META.get('HTTP_REFERER') or 'shop:cart')
+
+
+def _quantity(value):
+    """A posted quantity as an int, or None if it is not a whole number"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _stock_error(request, variant):
+    product = variant.product
+    name = f'{product.name} ({variant.label})' if variant.label else product.name
+    return _cart_error(request, f'Only {variant.stock} of {name} left in stock.')
+
+
 @require_POST
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id, available=True)
     cart = get_cart(request)
     
-    quantity = int(request.POST.get('quantity', 1))
-    color = request.POST.get('color', '')
-    size = request.POST.get('size', '')
-    
-    product_key = str(product_id)
-    
-    if product_key in cart:
-        cart[product_key]['quantity'] += quantity
+    quantity = _quantity(request.POST.get('quantity', 1))
+    if quantity is None or quantity < 1:
+        return _cart_error(request, 'Please enter a quantity of at least 1.')
+    variant_id = request.POST.get('variant', '')
+    variant = pick_variant(
+        product, variant_id=variant_id if variant_id.isdigit() else None,
+        color=request.POST.get('color', ''), size=request.POST.get('size', ''),
+    )
+    if variant is None:
+        return _cart_error(request, f'Please choose an available option for {product.name}.')
+    
+    variant_key = str(variant.pk)
+    in_cart = cart.get(variant_key, {}).get('quantity', 0)
+    if in_cart + quantity > variant.stock:
+        return _stock_error(request, variant)
+    
+    if variant_key in cart:
+        cart[variant_key]['quantity'] += quantity
     else:
-        cart[product_key] = {
+        cart[variant_key] = {
+            'product': product.pk,
             'quantity': quantity,
-            'color': color,
-            'size': size,
         }
     
     save_cart(request, cart)
@@ -164,16 +175,21 @@ def add_to_cart(request, product_id):
 
 
 @require_POST
-def update_cart(request, product_id):
+def update_cart(request, variant_id):
     cart = get_cart(request)
-    product_key = str(product_id)
-    
-    if product_key in cart:
-        quantity = int(request.POST.get('quantity', 1))
-        if quantity > 0:
-            cart[product_key]['quantity'] = quantity
+    variant_key = str(variant_id)
+    
+    if variant_key in cart:
+        quantity = _quantity(request.POST.get('quantity', 1))
+        if quantity is None or quantity < 0:
+            return _cart_error(request, 'Please enter a quantity of 0 or more.')
+        variant = ProductVariant.objects.select_related('product').filter(pk=variant_id).first()
+        if quantity == 0 or variant is None:
+            del cart[variant_key]
+        elif quantity > variant.stock:
+            return _stock_error(request, variant)
         else:
-            del cart[product_key]
+            cart[variant_key]['quantity'] = quantity
         save_cart(request, cart)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -183,12 +199,12 @@ def update_cart(request, product_id):
 
 
 @require_POST
-def remove_from_cart(request, product_id):
+def remove_from_cart(request, variant_id):
     cart = get_cart(request)
-    product_key = str(product_id)
+    variant_key = str(variant_id)
     
-    if product_key in cart:
-        del cart[product_key]
+    if variant_key in cart:
+        del cart[variant_key]
         save_cart(request, cart)
         messages.success(request, 'Item removed from cart.')
     
@@ -198,93 +214,145 @@ def remove_from_cart(request, product_id):
     return redirect('shop:cart')
 
 
-@login_required(login_url='accounts:login')
+def _coordinate(value, limit):
+    """A posted latitude/longitude as a Decimal, or None if missing or out of range"""
+    try:
+        value = Decimal(value).quantize(Decimal('0.000001'))
+    except (TypeError, InvalidOperation):
+        return None
+    return value if value.is_finite() and -limit <= value <= limit else None
+
+
+def _checkout_context(cart_items, total, initial_data, delivery_zone=None, delivery_fee=Decimal('0')):
+    """Checkout page context with the amounts checkout charges for this delivery quote"""
+    order_total = Decimal(str(total)) + delivery_fee
+    return {
+        'cart_items': cart_items,
+        'total': total,
+        'delivery_zone': delivery_zone,
+        'delivery_fee': delivery_fee,
+        'order_total': order_total,
+        'deposit_amount': order_total * Decimal('0.20'),
+        'balance_amount': order_total * Decimal('0.80'),
+        'initial_data': initial_data,
+    }
+
+
+def delivery_quote(request):
+    """Delivery fee and order amounts for the cart at the given coordinates, as checkout will charge them"""
+    cart_items, total = cart_lines(get_cart(request))
+    latitude = _coordinate(request.GET.get('latitude'), 90)
+    longitude = _coordinate(request.GET.get('longitude'), 180)
+    if latitude is None or longitude is None:
+        return JsonResponse({'error': 'latitude and longitude are required'}, status=400)
+    
+    zone, fee = quote(latitude, longitude)
+    context = _checkout_context(cart_items, total, {}, zone, fee)
+    cents = Decimal('0.01')
+    return JsonResponse({
+        'zone': zone.name if zone else None,
+        'delivery_fee': str(fee),
+        'total': str(context['order_total'].quantize(cents)),
+        'deposit': str(context['deposit_amount'].quantize(cents)),
+        'balance': str(context['balance_amount'].quantize(cents)),
+    })
+
+
 def checkout(request):
-    cart = get_cart(request)
+    cart_items, total = cart_lines(get_cart(request))
     
-    if not cart:
+    if not cart_items:
         messages.warning(request, 'Your cart is empty.')
         return redirect('shop:cart')
     
-    cart_items = []
-    total = 0
-    
-    for product_id, item in cart.items():
-        try:
-            product = Product.objects.get(id=product_id)
-            subtotal = product.price * item['quantity']
-            cart_items.append({
-                'product': product,
-                'quantity': item['quantity'],
-                'color': item.get('color', ''),
-                'size': item.get('size', ''),
-                'subtotal': subtotal,
-            })
-            total += subtotal
-        except Product.DoesNotExist:
-            pass
-    
     if request.method == 'POST':
         customer_name = request.POST.get('customer_name')
         customer_phone = request.POST.get('customer_phone')
         customer_email = request.POST.get('customer_email', '')
         customer_address = request.POST.get('customer_address')
         payment_method = request.POST.get('payment_method', 'mpesa')
-        customer_latitude = request.POST.get('customer_latitude')
-        customer_longitude = request.POST.get('customer_longitude')
+        customer_latitude = _coordinate(request.POST.get('customer_latitude'), 90)
+        customer_longitude = _coordinate(request.POST.get('customer_longitude'), 180)
+        
+        # Zone and fee come from the in-memory zone index, no query per zone
+        delivery_zone, delivery_fee = quote(customer_latitude, customer_longitude)
         
         if not all([customer_name, customer_phone, customer_address]):
             messages.error(request, 'Please fill in all required fields.')
-            return render(request, 'shop/checkout.html', {
-                'cart_items': cart_items,
-                'total': total,
-            })
+            return render(request, 'shop/checkout.html', _checkout_context(
+                cart_items, total, request.POST, delivery_zone, delivery_fee
+            ))
         
-        order = Order.objects.create(
-            customer=request.user if request.user.is_authenticated else None,
-            customer_name=customer_name,
-            customer_phone=customer_phone,
-            customer_email=customer_email,
-            customer_address=customer_address,
-            total_amount=Decimal(str(total)),
-            customer_latitude=customer_latitude if customer_latitude else None,
-            customer_longitude=customer_longitude if customer_longitude else None,
-        )
+        # Only charge the fee the customer was shown; a zone edited since the
+        # page quoted it (or a quote that never arrived) shows the new amount first
+        try:
+            quoted_fee = Decimal(request.POST.get('delivery_fee_quote', '0'))
+        except InvalidOperation:
+            quoted_fee = None
+        if quoted_fee != delivery_fee:
+            messages.warning(request, f'The delivery fee for your location is KES {delivery_fee}. Please review your order total and place your order again.')
+            return render(request, 'shop/checkout.html', _checkout_context(
+                cart_items, total, request.POST, delivery_zone, delivery_fee
+            ))
         
-        for product_id, item in cart.items():
-            try:
-                product = Product.objects.get(id=product_id)
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    product_name=product.name,
-                    product_price=product.price,
+        order_total = Decimal(str(total)) + delivery_fee
+        
+        # The order, its seller groups, items and payment are created together
+        with transaction.atomic():
+            order = Order.objects.create(
+                customer=request.user if request.user.is_authenticated else None,
+                customer_name=customer_name,
+                customer_phone=customer_phone,
+                customer_email=customer_email,
+                customer_address=customer_address,
+                total_amount=order_total,
+                customer_latitude=customer_latitude,
+                customer_longitude=customer_longitude,
+                delivery_zone=delivery_zone,
+                delivery_fee=delivery_fee,
+            )
+        
+            order_items = []
+            for item in cart_items:
+                variant = item['variant']
+                # Conditional UPDATE on the variant row: fails instead of overselling
+                if not reserve_stock(variant.pk, variant.product_id, item['quantity']):
+                    transaction.set_rollback(True)
+                    messages.error(request, f'Sorry, {variant} sold out while you were checking out. Please review your cart.')
+                    return redirect('shop:cart')
+                order_items.append(OrderItem(
+                    product=variant.product,
+                    variant=variant,
+                    product_name=variant.product.name,
+                    product_price=variant.price,
                     quantity=item['quantity'],
-                    color=item.get('color', ''),
-                    size=item.get('size', ''),
-                )
-                product.stock -= item['quantity']
-                product.save()
-            except Product.DoesNotExist:
-                pass
+                    color=variant.color,
+                    size=variant.size,
+                ))
+            # One fulfilment group per seller in the cart
+            split_order(order, order_items)
         
-        # Create Payment record with 20% deposit
-        deposit_amount = Decimal(str(total)) * Decimal('0.20')
-        balance_amount = Decimal(str(total)) * Decimal('0.80')
+            # Create Payment record with 20% deposit
+            deposit_amount = order_total * Decimal('0.20')
+            balance_amount = order_total * Decimal('0.80')
         
-        payment = Payment.objects.create(
-            order=order,
-            deposit_amount=deposit_amount,
-            balance_amount=balance_amount,
-            deposit_payment_method=payment_method,
-            status='pending',
-        )
+            payment = Payment.objects.create(
+                order=order,
+                deposit_amount=deposit_amount,
+                balance_amount=balance_amount,
+                deposit_payment_method=payment_method,
+                status='pending',
+            )
         
-        OrderStatusHistory.objects.create(
-            order=order,
-            status='pending',
-            note=f'Order placed successfully. 20% deposit (KES {deposit_amount}) required.'
-        )
+            OrderStatusHistory.objects.create(
+                order=order,
+                status='pending',
+                note=f'Order placed successfully. 20% deposit (KES {deposit_amount}) required.'
+            )
+            record_order_placed(order)
+            record_order(order)
+            # Stock moved through queryset updates, which send no signals
+            transaction.on_commit(bump_catalog_version)
         
         request.session['cart'] = {}
         request.session.modified = True
@@ -304,18 +372,7 @@ def checkout(request):
         'customer_email': request.user.email if request.user.is_authenticated else '',
     }
     
-    total_decimal = Decimal(str(total))
-    deposit_amount = total_decimal * Decimal('0.20')
-    balance_amount = total_decimal * Decimal('0.80')
-    
-    context = {
-        'cart_items': cart_items,
-        'total': total,
-        'deposit_amount': deposit_amount,
-        'balance_amount': balance_amount,
-        'initial_data': initial_data,
-    }
-    return render(request, 'shop/checkout.html', context)
+    return render(request, 'shop/checkout.html', _checkout_context(cart_items, total, initial_data))
 
 
 @login_required
@@ -341,21 +398,10 @@ def add_product(request):
             messages.error(request, 'Please fill in all required fields.')
             return render(request, 'shop/add_product.html', {'categories': categories})
         
-        # Generate slug from product name
-        from django.utils.text import slugify
-        slug = slugify(name)
-        
-        # Check if slug already exists
-        counter = 1
-        original_slug = slug
-        while Product.objects.filter(slug=slug).exists():
-            slug = f'{original_slug}-{counter}'
-            counter += 1
-        
         try:
+            # Product.save() allocates a unique slug from the name
             product = Product.objects.create(
                 name=name,
-                slug=slug,
                 description=description,
                 category_id=category_id,
                 price=Decimal(price),
@@ -407,6 +453,7 @@ def edit_product(request, product_id):
             return render(request, 'shop/edit_product.html', {
                 'product': product,
                 'categories': categories,
+                'variants': product.variants.all(),
             })
         
         try:
@@ -421,6 +468,15 @@ def edit_product(request, product_id):
             if image:
                 product.image = image
             
+            # Per-variant stock and price; saving the product re-syncs variants and its total stock
+            variants = list(product.variants.all())
+            if len(variants) > 1:
+                for variant in variants:
+                    variant.stock = int(request.POST.get(f'variant-{variant.pk}-stock', variant.stock))
+                    variant.price_delta = Decimal(request.POST.get(f'variant-{variant.pk}-price_delta', variant.price_delta))
+                ProductVariant.objects.bulk_update(variants, ['stock', 'price_delta'])
+                product.stock = sum(variant.stock for variant in variants)
+            
             product.save()
             
             messages.success(request, f'Product "{product.name}" updated successfully!')
@@ -431,11 +487,13 @@ def edit_product(request, product_id):
             return render(request, 'shop/edit_product.html', {
                 'product': product,
                 'categories': categories,
+                'variants': product.variants.all(),
             })
     
     context = {
         'product': product,
         'categories': categories,
+        'variants': product.variants.all(),
     }
     return render(request, 'shop/edit_product.html', context)
 
@@ -455,3 +513,53 @@ def delete_product(request, product_id):
     
     messages.success(request, f'Product "{product_name}" has been deleted successfully!')
     return redirect('accounts:seller_dashboard')
+
+
+@login_required
+def import_products(request):
+    """Let sellers create or update many products from a CSV/JSON file"""
+    if request.user.user_type != 'seller':
+        messages.error(request, 'Only sellers can import products.')
+        return redirect('shop:home')
+
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Please choose a CSV or JSON file to import.')
+        else:
+            fmt = detect_format(upload.name, default=request.POST.get('format', 'csv'))
+            try:
+                result = ProductImporter(request.user).run(read_rows(upload.file, fmt))
+            except (ValueError, UnicodeDecodeError) as e:
+                messages.error(request, f'Could not read file: {e}')
+            else:
+                level = messages.success if not result.error_count else messages.warning
+                level(request, f'{result.created} products created, {result.updated} updated, '
+                               f'{result.error_count} rows rejected.')
+
+    context = {
+        'result': result,
+        'fields': FIELDS,
+        'categories': Category.objects.all(),
+    }
+    return render(request, 'shop/import_products.html', context)
+
+
+@use_replica
+@login_required
+def export_products(request):
+    """Stream the seller's catalog in the import format"""
+    if request.user.user_type != 'seller':
+        messages.error(request, 'Only sellers can export products.')
+        return redirect('shop:home')
+
+    rows = export_rows(Product.objects.filter(seller=request.user))
+    if request.GET.get('format') == 'json':
+        response = StreamingHttpResponse(json_lines(rows), content_type='application/json')
+        filename = 'products.json'
+    else:
+        response = StreamingHttpResponse(csv_lines(rows), content_type='text/csv')
+        filename = 'products.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response